@@ -0,0 +1,234 @@
+"""
+存储服务基准测试
+
+用法:
+    python benchmarks/storage_benchmark.py journal --sizes 1000 10000 100000 1000000
+    python benchmarks/storage_benchmark.py loop-latency --size 100000 --writes 50
+    python benchmarks/storage_benchmark.py format --size 1000000
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from contracts.storage_service import StorageConfig, StorageBackend
+from services.storage_service import FileStorageService
+from services.storage_format import RecordFileFormat, find_record_file, read_records
+
+
+# ============ 数据生成 ============
+
+def make_message(index: int, sessions: int = 1000) -> Dict[str, Any]:
+    """生成一条模拟消息记录"""
+    return {
+        "message_id": f"msg-{index}",
+        "session_id": f"session-{index % sessions}",
+        "role": "user" if index % 2 == 0 else "assistant",
+        "content": f"这是第{index}条基准测试消息，用于模拟真实对话内容。",
+        "timestamp": datetime.fromtimestamp(1_700_000_000 + index).isoformat(),
+        "token_count": index % 500,
+        "metadata": {},
+        "attachments": [],
+        "parent_message_id": None,
+        "is_deleted": False,
+    }
+
+
+def make_records(count: int) -> Dict[str, Dict[str, Any]]:
+    """生成带存储元数据的消息集合"""
+    now = datetime.now().isoformat()
+    records = {}
+    for i in range(count):
+        record = make_message(i)
+        records[record["message_id"]] = {
+            **record,
+            "_id": record["message_id"],
+            "_created_at": now,
+            "_updated_at": now,
+        }
+    return records
+
+
+def seed_collection(data_dir: Path, collection: str, count: int) -> None:
+    """直接写出集合文件，跳过逐条写入以快速构造大数据集"""
+    records = make_records(count)
+    with open(data_dir / f"{collection}.json", "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False, indent=2)
+
+
+def summarize(samples: List[float]) -> str:
+    """格式化耗时样本（毫秒）"""
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    return f"mean={statistics.mean(samples):8.3f}ms  p99={p99:8.3f}ms"
+
+
+# ============ 日志模式写入基准 ============
+
+async def measure_writes(
+    data_dir: Path,
+    config: StorageConfig,
+    writes: int,
+    offset: int
+) -> List[float]:
+    """测量单条写入耗时"""
+    storage = FileStorageService()
+    await storage.initialize(config)
+
+    samples = []
+    for i in range(writes):
+        record = make_message(offset + i)
+        start = time.perf_counter()
+        await storage.store_data("messages", record, record["message_id"])
+        samples.append((time.perf_counter() - start) * 1000)
+
+    await storage.close()
+    return samples
+
+
+async def bench_journal(args: argparse.Namespace) -> None:
+    """对比日志模式与整文件重写模式下单条写入耗时随集合规模的变化"""
+    print(f"{'records':>10}  {'mode':<10}  per-write cost ({args.writes} writes)")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            data_dir = Path(tmp)
+            seed_collection(data_dir, "messages", size)
+
+            config = StorageConfig(
+                backend=StorageBackend.FILE,
+                connection_string=tmp,
+                journal_enabled=True,
+                checkpoint_threshold=args.checkpoint_threshold,
+            )
+            samples = await measure_writes(data_dir, config, args.writes, size)
+            print(f"{size:>10}  {'journal':<10}  {summarize(samples)}")
+
+            if size <= args.rewrite_max:
+                config = StorageConfig(
+                    backend=StorageBackend.FILE,
+                    connection_string=tmp,
+                )
+                samples = await measure_writes(
+                    data_dir, config, args.writes, size + args.writes
+                )
+                print(f"{size:>10}  {'rewrite':<10}  {summarize(samples)}")
+
+
+# ============ 事件循环延迟基准 ============
+
+async def heartbeat(interval: float, samples: List[float], stop: asyncio.Event) -> None:
+    """按固定间隔休眠，记录实际唤醒时间相对预期的延迟（毫秒）"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def measure_loop_latency(config: StorageConfig, writes: int, offset: int) -> List[float]:
+    """连续写入期间测量事件循环调度延迟"""
+    storage = FileStorageService()
+    await storage.initialize(config)
+
+    samples: List[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.ensure_future(heartbeat(0.001, samples, stop))
+    for i in range(writes):
+        record = make_message(offset + i)
+        await storage.store_data("messages", record, record["message_id"])
+        # 模拟请求之间的调度点，让心跳任务有机会运行
+        await asyncio.sleep(0)
+    stop.set()
+    await monitor
+
+    await storage.close()
+    return samples
+
+
+async def bench_loop_latency(args: argparse.Namespace) -> None:
+    """对比磁盘I/O在事件循环线程内执行与在I/O线程池中执行时的事件循环延迟"""
+    print(f"{'records':>10}  {'io':<10}  event-loop lag during {args.writes} writes")
+    for io_workers, label in ((0, "inline"), (args.io_workers, "executor")):
+        with tempfile.TemporaryDirectory() as tmp:
+            seed_collection(Path(tmp), "messages", args.size)
+            config = StorageConfig(
+                backend=StorageBackend.FILE,
+                connection_string=tmp,
+                io_workers=io_workers,
+            )
+            samples = await measure_loop_latency(config, args.writes, args.size)
+            print(
+                f"{args.size:>10}  {label:<10}  {summarize(samples)}  "
+                f"max={max(samples):8.3f}ms"
+            )
+
+
+# ============ 文件格式基准 ============
+
+async def bench_format(args: argparse.Namespace) -> None:
+    """对比各文件格式与压缩算法的磁盘占用与整集合写入、读取耗时"""
+    records = make_records(args.size)
+    print(f"{'format':<14}  {'bytes':>14}  {'save':>10}  {'load':>10}  ({args.size} records)")
+    for name in args.formats:
+        file_format, _, compression = name.partition("+")
+        target = RecordFileFormat(file_format, compression or None)
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            size = target.write(Path(tmp), "messages", records)
+            save = time.perf_counter() - start
+
+            start = time.perf_counter()
+            loaded = read_records(find_record_file(Path(tmp), "messages"))
+            load = time.perf_counter() - start
+            assert len(loaded) == len(records)
+
+            print(f"{name:<14}  {size:>14,}  {save:>9.2f}s  {load:>9.2f}s")
+
+
+# ============ 入口 ============
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="存储服务基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    journal = subparsers.add_parser("journal", help="日志模式单条写入耗时")
+    journal.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000]
+    )
+    journal.add_argument("--writes", type=int, default=200)
+    journal.add_argument("--checkpoint-threshold", type=int, default=10_000)
+    journal.add_argument(
+        "--rewrite-max", type=int, default=100_000,
+        help="整文件重写模式的最大集合规模（更大时单次写入耗时过长）"
+    )
+    journal.set_defaults(func=bench_journal)
+
+    latency = subparsers.add_parser("loop-latency", help="持续写入期间的事件循环延迟")
+    latency.add_argument("--size", type=int, default=100_000)
+    latency.add_argument("--writes", type=int, default=50)
+    latency.add_argument("--io-workers", type=int, default=2)
+    latency.set_defaults(func=bench_loop_latency)
+
+    file_format = subparsers.add_parser("format", help="文件格式的磁盘占用与读写耗时")
+    file_format.add_argument("--size", type=int, default=1_000_000)
+    file_format.add_argument(
+        "--formats", nargs="+", default=["json", "jsonl", "jsonl+zlib", "jsonl+lzma"],
+        help="格式[+压缩算法]"
+    )
+    file_format.set_defaults(func=bench_format)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+转换存储数据目录的文件格式
+
+应在存储服务停止时运行；集合文件与分区段文件转换为目标格式，日志文件与清单不受影响。
+
+用法:
+    python scripts/convert_storage_format.py ./data --format jsonl --compression zlib
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from services.storage_format import (
+    COMPRESSIONS, FILE_FORMATS, FORMAT_JSONL, RecordFileFormat, convert_directory
+)
+
+
+def main() -> None:
+    """命令行入口：转换数据目录的文件格式"""
+    parser = argparse.ArgumentParser(description="转换存储数据目录的文件格式")
+    parser.add_argument("data_dir", type=Path)
+    parser.add_argument("--format", choices=list(FILE_FORMATS), default=FORMAT_JSONL)
+    parser.add_argument(
+        "--compression", choices=[c for c in COMPRESSIONS if c], default=None
+    )
+    args = parser.parse_args()
+
+    converted = convert_directory(args.data_dir, RecordFileFormat(args.format, args.compression))
+    print(f"已转换 {converted} 个文件")
+
+
+if __name__ == "__main__":
+    main()
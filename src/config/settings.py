@@ -59,7 +59,24 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "connection_string": "./data/chatbot.db",
         "max_connections": 10,
         "auto_backup": True,
-        "backup_interval": 3600
+        "backup_interval": 3600,
+        "backup_path": None,
+        "backup_retention": 24,
+        "max_records": None,
+        "durability": "sync",  # "deferred" 时写入由后台每隔 flush_interval 秒合并落盘
+        "flush_interval": 1.0,
+        "flush_max_pending": 100,
+        "journal_enabled": False,  # 单文件集合的写入只追加日志，不适用于分区集合
+        "checkpoint_threshold": 1000,
+        "io_workers": 2,
+        "partitions": {"messages": "session_id"},
+        "partition_buckets": 0,
+        "lazy_loading": True,
+        "cache_budget_bytes": 64 * 1024 * 1024,
+        "file_format": "json",
+        "compression": None,
+        "shared_access": True,
+        "query_cache_size": 256
     },
     "ui": {
         "title": "🤖 智能聊天机器人", # Merged from old settings.py
@@ -96,8 +113,15 @@ DEFAULT_CONFIG: Dict[str, Any] = {
         "enable_web_search": False,
         "enable_code_execution": False
     },
+    "retention": {
+        # 各状态会话自最后更新起的保留秒数，未列出的状态永久保留
+        "sessions": {"deleted": 0, "archived": 90 * 86400},
+        "compaction_interval": 86400  # 秒，压缩间隔（到期后由下一次新建会话在后台触发），0表示不压缩
+    },
     "conversation": { # Merged from old settings.py
         "max_history": 20,
+        "recent_messages": 50,  # 每个活跃会话在内存中缓冲的最近消息数
+        "active_sessions": 100,  # 缓冲最近消息的会话数上限，超出时淘汰最久未使用的会话
         "system_message": "你是一个友好的中文助手，可以回答各种问题并进行对话。请保持回答简洁明了。"
     }
 }
@@ -192,7 +216,15 @@ class ConfigManager:
             "OPENAI_TIMEOUT": "model.timeout",
             "MODEL_TEMPERATURE": "model.temperature",
             "MODEL_MAX_TOKENS": "model.max_tokens",
+            "DATABASE_BACKEND": "database.backend",
             "DATABASE_URL": "database.connection_string",
+            "DATABASE_MAX_RECORDS": "database.max_records",
+            "DATABASE_CACHE_BUDGET_BYTES": "database.cache_budget_bytes",
+            "DATABASE_QUERY_CACHE_SIZE": "database.query_cache_size",
+            "DATABASE_JOURNAL_ENABLED": "database.journal_enabled",
+            "DATABASE_CHECKPOINT_THRESHOLD": "database.checkpoint_threshold",
+            "DATABASE_IO_WORKERS": "database.io_workers",
+            "DATABASE_FLUSH_MAX_PENDING": "database.flush_max_pending",
             "LOG_LEVEL": "logging.level",
             "OPENAI_LOG_LEVEL": "logging.openai_log_level",
             "OPENAI_REQUEST_LOGGING": "logging.openai_request_logging",
@@ -378,7 +410,11 @@ class ConfigManager:
     def _convert_env_value(self, env_value: str, key_path: str) -> Any:
         """转换环境变量值类型"""
         # 根据配置键路径推断类型
-        if key_path.endswith(('.timeout', '.max_tokens', '.max_connections', '.port')):
+        if key_path.endswith((
+            '.timeout', '.max_tokens', '.max_connections', '.port', '.max_records',
+            '.cache_budget_bytes', '.query_cache_size', '.checkpoint_threshold',
+            '.io_workers', '.flush_max_pending'
+        )):
             return int(env_value)
         elif key_path.endswith(('.temperature', '.top_p')):
             return float(env_value)
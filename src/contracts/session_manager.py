@@ -3,7 +3,8 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, Union
+from datetime import datetime
 
 from core.models import ChatSession, Message
 
@@ -69,10 +70,24 @@ class ISessionManager(ABC):
         """
         pass
     
+    @abstractmethod
+    async def patch_session(self, session_id: str, changes: Dict[str, Any]) -> bool:
+        """
+        只写入会话变化的字段
+        
+        Args:
+            session_id: 会话ID
+            changes: 字段 -> 新值，格式与 ChatSession.to_dict 相同
+            
+        Returns:
+            bool: 更新是否成功
+        """
+        pass
+    
     @abstractmethod
     async def delete_session(self, session_id: str) -> bool:
         """
-        删除会话
+        删除会话及其全部消息
         
         Args:
             session_id: 会话ID
@@ -102,13 +117,34 @@ class ISessionManager(ABC):
         """
         pass
     
+    @abstractmethod
+    async def get_user_sessions_page(
+        self,
+        user_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[ChatSession], Optional[str]]:
+        """
+        按游标分页获取用户的会话列表，最新创建的在前
+        
+        Args:
+            user_id: 用户ID
+            limit: 每页数量
+            cursor: 上一页返回的游标，None表示第一页
+            
+        Returns:
+            Tuple[List[ChatSession], Optional[str]]: 本页会话与下一页的游标，没有更多时游标为None
+        """
+        pass
+    
     @abstractmethod
     async def add_message(
         self,
         session_id: str,
         role: str,
         content: str,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        count: bool = True
     ) -> Message:
         """
         添加消息到会话
@@ -118,12 +154,46 @@ class ISessionManager(ABC):
             role: 消息角色
             content: 消息内容
             metadata: 消息元数据
+            count: 是否同时累加会话计数，为False时由 record_turn 或 count_messages 计入
             
         Returns:
             Message: 新添加的消息
         """
         pass
     
+    @abstractmethod
+    async def count_messages(self, session_id: str, messages: List[Message]) -> None:
+        """
+        将已由 add_message(count=False) 保存的消息计入会话的消息数与token数
+        
+        Args:
+            session_id: 会话ID
+            messages: 已保存的消息，按时间顺序
+        """
+        pass
+    
+    @abstractmethod
+    async def record_turn(
+        self,
+        session_id: str,
+        user_msg: Union[str, Message],
+        assistant_msg: str,
+        usage: Optional[Dict[str, int]] = None
+    ) -> Tuple[Message, Message]:
+        """
+        保存一轮对话：用户消息与助手回复一次写入，并累加会话计数
+        
+        Args:
+            session_id: 会话ID
+            user_msg: 用户消息内容，或调用模型之前已由 add_message(count=False) 保存的用户消息
+            assistant_msg: 助手回复内容
+            usage: 模型返回的token用量: prompt_tokens, completion_tokens, total_tokens
+            
+        Returns:
+            Tuple[Message, Message]: 保存的用户消息与助手消息
+        """
+        pass
+    
     @abstractmethod
     async def get_session_messages(
         self,
@@ -144,15 +214,76 @@ class ISessionManager(ABC):
         """
         pass
     
+    @abstractmethod
+    async def get_session_messages_page(
+        self,
+        session_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Message], Optional[str]]:
+        """
+        按游标分页获取会话的消息历史，按时间从旧到新
+        
+        Args:
+            session_id: 会话ID
+            limit: 每页数量
+            cursor: 上一页返回的游标，None表示第一页
+            
+        Returns:
+            Tuple[List[Message], Optional[str]]: 本页消息与下一页的游标，没有更多时游标为None
+        """
+        pass
+    
+    @abstractmethod
+    async def get_recent_messages(
+        self,
+        session_id: str,
+        n: Optional[int] = None
+    ) -> List[Message]:
+        """
+        获取会话最近的消息，用于构建对话上下文
+        
+        Args:
+            session_id: 会话ID
+            n: 返回的消息数，None表示缓冲的全部消息
+            
+        Returns:
+            List[Message]: 按时间从旧到新排列的最近消息
+        """
+        pass
+    
     @abstractmethod
     async def clear_session_messages(self, session_id: str) -> bool:
         """
-        清空会话消息
+        清空会话消息，并重置会话的消息数与token数
         
         Args:
             session_id: 会话ID
             
         Returns:
-            bool: 清空是否成功
+            bool: 清空是否成功，会话不存在时为False
         """
-        pass 
\ No newline at end of file
+        pass 
+    
+    @abstractmethod
+    async def compact_storage(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        压缩会话存储：物理删除已标记删除的消息、超出保留时长的会话及其消息，
+        以及会话已不存在的孤立消息
+        
+        Args:
+            now: 计算保留时长的当前时间，None表示现在
+            
+        Returns:
+            Dict[str, int]: 删除的会话数、消息数、有孤立消息的会话数与回收的字节数
+        """
+        pass
+    
+    @abstractmethod
+    async def close(self) -> None:
+        """
+        关闭会话管理器，等待进行中的后台维护完成
+        
+        应在关闭存储服务之前调用。
+        """
+        pass
@@ -3,8 +3,8 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any, Union
-from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Any, Union
+from dataclasses import dataclass, field, replace
 from datetime import datetime
 from enum import Enum
 
@@ -25,7 +25,24 @@ class StorageConfig:
     max_connections: int = 10
     timeout: int = 30
     auto_backup: bool = True
-    backup_interval: int = 3600  # seconds
+    backup_interval: int = 3600  # seconds, auto_backup开启时定时增量备份的间隔
+    backup_path: Optional[str] = None  # 定时备份的根目录，None表示数据目录下的 backups
+    backup_retention: int = 24  # 保留的定时备份数量，0表示不清理
+    journal_enabled: bool = False  # 启用追加写日志，写入不再重写整个集合文件
+    checkpoint_threshold: int = 1000  # 日志累计记录数达到阈值后后台合并到集合文件
+    max_records: Optional[int] = None  # 内存后端的记录数上限，超出时淘汰最久未使用的记录
+    durability: str = "sync"  # "sync" 写入即持久化, "deferred" 由后台任务合并持久化
+    flush_interval: float = 1.0  # seconds, deferred模式下后台刷盘间隔
+    flush_max_pending: int = 100  # deferred模式下未持久化变更数达到阈值时立即刷盘
+    io_workers: int = 2  # 文件后端序列化与磁盘I/O线程数，0表示在事件循环线程中执行
+    partitions: Dict[str, str] = field(default_factory=dict)  # 分区集合: 集合名 -> 分区字段
+    partition_buckets: int = 0  # 分区哈希桶数量，0表示每个分区字段值一个段文件
+    lazy_loading: bool = False  # 单文件集合在首次访问时才加载，未访问的集合不解析
+    cache_budget_bytes: Optional[int] = None  # 已加载分区段的字节数上限，超出时淘汰最久未使用的段
+    file_format: str = "json"  # 集合与分区段文件格式: "json" 缩进JSON, "jsonl" 紧凑的JSON Lines
+    compression: Optional[str] = None  # 文件压缩: None, "zlib", "lzma"
+    shared_access: bool = False  # 多个进程共享数据目录：跨进程文件锁写盘，并重新加载其他进程的写入
+    query_cache_size: int = 0  # 查询结果缓存的条目数上限，0表示不缓存
 
 
 @dataclass
@@ -44,6 +61,15 @@ class QueryOptions:
     sort_order: str = "asc"  # "asc", "desc"
     limit: Optional[int] = None
     offset: int = 0
+    fields: Optional[List[str]] = None  # 字段投影，None表示返回全部字段
+    read_only: bool = False  # 返回不复制记录的只读映射，调用方不能修改结果
+
+
+@dataclass
+class QueryBatch:
+    """流式查询的一批结果"""
+    records: List[Dict[str, Any]]
+    continuation: Optional[str] = None  # 从这批之后继续查询的令牌，None表示没有更多结果
 
 
 class IStorageService(ABC):
@@ -89,7 +115,9 @@ class IStorageService(ABC):
     async def retrieve_data(
         self,
         collection: str,
-        key: str
+        key: str,
+        fields: Optional[List[str]] = None,
+        read_only: bool = False
     ) -> Optional[Dict[str, Any]]:
         """
         检索单条数据
@@ -97,6 +125,8 @@ class IStorageService(ABC):
         Args:
             collection: 集合/表名
             key: 数据唯一标识符
+            fields: 返回的字段，None表示全部字段
+            read_only: 是否返回只读映射（不复制记录）
             
         Returns:
             Dict[str, Any]或None: 检索到的数据
@@ -114,13 +144,70 @@ class IStorageService(ABC):
         
         Args:
             collection: 集合/表名
-            options: 查询选项
+            options: 查询选项，可指定字段投影与只读结果
             
         Returns:
             List[Dict[str, Any]]: 查询结果列表
         """
         pass
     
+    async def iter_query(
+        self,
+        collection: str,
+        options: Optional[QueryOptions] = None,
+        batch_size: int = 100,
+        continuation: Optional[str] = None
+    ) -> AsyncIterator[QueryBatch]:
+        """
+        流式查询：按批返回结果，调用方可以随时停止迭代
+        
+        默认实现按offset分页调用query_data，后端应覆盖为键集续读。
+        options.limit 限制本次迭代的总条数，options.offset 只在没有续读令牌时生效。
+        
+        Args:
+            collection: 集合/表名
+            options: 查询选项
+            batch_size: 每批的记录数
+            continuation: 上一次迭代最后一批的续读令牌，从该批之后继续
+            
+        Yields:
+            QueryBatch: 一批结果及其续读令牌
+        """
+        options = options or QueryOptions(filters=[])
+        offset = int(continuation) if continuation else options.offset
+        remaining = options.limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            records = await self.query_data(
+                collection, replace(options, limit=size, offset=offset)
+            )
+            offset += len(records)
+            if remaining is not None:
+                remaining -= len(records)
+            done = len(records) < size or remaining == 0
+            if records:
+                yield QueryBatch(records, None if done else str(offset))
+            if done:
+                return
+    
+    @abstractmethod
+    async def explain(
+        self,
+        collection: str,
+        options: Optional[QueryOptions] = None
+    ) -> Dict[str, Any]:
+        """
+        说明查询的执行计划
+        
+        Args:
+            collection: 集合/表名
+            options: 查询选项
+            
+        Returns:
+            Dict[str, Any]: 查询计划与扫描行数等诊断信息
+        """
+        pass
+    
     @abstractmethod
     async def update_data(
         self,
@@ -142,7 +229,31 @@ class IStorageService(ABC):
             bool: 更新是否成功
         """
         pass
-    
+
+    @abstractmethod
+    async def increment_data(
+        self,
+        collection: str,
+        key: str,
+        increments: Dict[str, Union[int, float]],
+        data: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        原子地增加数值字段，并在同一次写入中合并其他字段
+
+        增量基于存储中的当前值计算，并发的增加不会互相覆盖。
+
+        Args:
+            collection: 集合/表名
+            key: 数据唯一标识符
+            increments: 字段 -> 增量，缺少的字段从0开始
+            data: 同时合并写入的其他字段
+
+        Returns:
+            Optional[Dict[str, Any]]: 更新后的数据，记录不存在或更新失败时为None
+        """
+        pass
+
     @abstractmethod
     async def delete_data(
         self,
@@ -165,40 +276,197 @@ class IStorageService(ABC):
     async def bulk_insert(
         self,
         collection: str,
-        data_list: List[Dict[str, Any]]
+        data_list: List[Dict[str, Any]],
+        keys: Optional[List[str]] = None
     ) -> List[str]:
         """
-        批量插入数据
+        批量插入数据，全部记录一次性写入
         
         Args:
             collection: 集合/表名
             data_list: 数据列表
+            keys: 可选的唯一键列表，与data_list一一对应，不提供则自动生成
             
         Returns:
             List[str]: 插入数据的唯一标识符列表
         """
         pass
     
+    @abstractmethod
+    async def insert_and_increment(
+        self,
+        collection: str,
+        data_list: List[Dict[str, Any]],
+        keys: List[str],
+        counter_collection: str,
+        counter_key: str,
+        increments: Dict[str, Union[int, float]],
+        data: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        批量插入数据，并原子地增加另一集合中一条记录的数值字段
+        
+        支持事务的后端在同一事务中完成插入与增量更新；
+        不支持的后端先插入数据，再增量更新计数记录。
+        
+        Args:
+            collection: 插入数据的集合/表名
+            data_list: 数据列表
+            keys: 唯一键列表，与data_list一一对应
+            counter_collection: 计数记录所在的集合/表名
+            counter_key: 计数记录的唯一标识符
+            increments: 字段 -> 增量，缺少的字段从0开始
+            data: 同时合并写入计数记录的其他字段
+            
+        Returns:
+            Optional[Dict[str, Any]]: 更新后的计数记录，计数记录不存在时为None
+            
+        Raises:
+            SystemError: 插入数据失败
+        """
+        pass
+    
+    @abstractmethod
+    async def get_many(
+        self,
+        collection: str,
+        keys: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        批量检索数据
+        
+        Args:
+            collection: 集合/表名
+            keys: 数据唯一标识符列表
+            
+        Returns:
+            Dict[str, Dict[str, Any]]: 唯一标识符 -> 数据，不存在的键不包含在结果中
+        """
+        pass
+    
+    @abstractmethod
+    async def update_many(
+        self,
+        collection: str,
+        updates: Dict[str, Dict[str, Any]],
+        merge: bool = True
+    ) -> int:
+        """
+        批量更新数据，全部变更一次性写入
+        
+        Args:
+            collection: 集合/表名
+            updates: 唯一标识符 -> 更新的数据，不存在的键被忽略
+            merge: 是否合并现有数据
+            
+        Returns:
+            int: 实际更新的记录数
+        """
+        pass
+    
+    @abstractmethod
+    async def delete_many(
+        self,
+        collection: str,
+        keys: List[str]
+    ) -> int:
+        """
+        批量删除数据，全部变更一次性写入
+        
+        Args:
+            collection: 集合/表名
+            keys: 数据唯一标识符列表，不存在的键被忽略
+            
+        Returns:
+            int: 实际删除的记录数
+        """
+        pass
+    
+    async def compact(
+        self,
+        collection: str,
+        keys: List[str]
+    ) -> Dict[str, int]:
+        """
+        压缩集合：物理删除记录并回收存储空间
+        
+        默认实现只做批量删除，后端应覆盖为删除后重写存储并统计回收的字节数。
+        
+        Args:
+            collection: 集合/表名
+            keys: 要删除的数据唯一标识符列表，不存在的键被忽略
+            
+        Returns:
+            Dict[str, int]: records 删除的记录数，bytes 回收的字节数
+        """
+        removed = await self.delete_many(collection, keys)
+        return {"records": removed, "bytes": 0}
+    
     @abstractmethod
     async def create_index(
         self,
         collection: str,
-        field: str,
-        unique: bool = False
+        field: Union[str, List[str]],
+        unique: bool = False,
+        ordered: bool = False
     ) -> bool:
         """
         创建索引
         
         Args:
             collection: 集合/表名
-            field: 字段名
+            field: 字段名，传入字段列表时创建复合有序索引
             unique: 是否唯一索引
+            ordered: 是否创建有序索引（支持排序与范围查询）
             
         Returns:
             bool: 创建是否成功
         """
         pass
-    
+
+    @abstractmethod
+    async def create_aggregate(
+        self,
+        collection: str,
+        name: str,
+        group_by: str,
+        fields: Optional[List[str]] = None
+    ) -> bool:
+        """
+        注册按字段分组的聚合视图：每组的记录数，以及指定字段的求和、最小值、最大值
+
+        Args:
+            collection: 集合/表名
+            name: 视图名称，同名视图定义不同时被替换
+            group_by: 分组字段
+            fields: 求和与最值的字段
+
+        Returns:
+            bool: 注册是否成功
+        """
+        pass
+
+    @abstractmethod
+    async def get_aggregate(
+        self,
+        collection: str,
+        name: str,
+        groups: Optional[List[Any]] = None
+    ) -> Dict[Any, Dict[str, Any]]:
+        """
+        读取聚合视图
+
+        Args:
+            collection: 集合/表名
+            name: 视图名称
+            groups: 要读取的分组值，None表示全部分组
+
+        Returns:
+            Dict[Any, Dict[str, Any]]: 分组值 -> {"count", "sum", "min", "max"}，
+            sum/min/max 为 字段 -> 值；没有记录的分组不包含在结果中
+        """
+        pass
+
     @abstractmethod
     async def backup_data(
         self,
@@ -251,6 +519,16 @@ class IStorageService(ABC):
         """
         pass
     
+    @abstractmethod
+    async def flush(self) -> bool:
+        """
+        持久化屏障：等待此前的全部写入落盘
+        
+        Returns:
+            bool: 持久化是否成功
+        """
+        pass
+    
     @abstractmethod
     async def close(self) -> bool:
         """
@@ -3,6 +3,7 @@
 统一的数据结构，支持序列化和验证
 """
 
+import copy
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any, Union
 from datetime import datetime
@@ -86,12 +87,12 @@ class User:
             display_name=data.get("display_name", ""),
             role=UserRole(data.get("role", "user")),
             email=data.get("email"),
-            preferences=data.get("preferences", {}),
-            usage_stats=data.get("usage_stats", {}),
+            preferences=copy.deepcopy(data.get("preferences", {})),
+            usage_stats=copy.deepcopy(data.get("usage_stats", {})),
             created_at=datetime.fromisoformat(data.get("created_at", datetime.now().isoformat())),
             last_active=datetime.fromisoformat(data.get("last_active", datetime.now().isoformat())),
             is_active=data.get("is_active", True),
-            metadata=data.get("metadata", {})
+            metadata=copy.deepcopy(data.get("metadata", {}))
         )
 
 
@@ -137,7 +138,7 @@ class ModelConfiguration:
             presence_penalty=data.get("presence_penalty", 0.0),
             timeout=data.get("timeout", 30),
             stream=data.get("stream", False),
-            custom_params=data.get("custom_params", {})
+            custom_params=copy.deepcopy(data.get("custom_params", {}))
         )
 
 
@@ -180,8 +181,8 @@ class Message:
             content=data.get("content", ""),
             timestamp=datetime.fromisoformat(data.get("timestamp", datetime.now().isoformat())),
             token_count=data.get("token_count", 0),
-            metadata=data.get("metadata", {}),
-            attachments=data.get("attachments", []),
+            metadata=copy.deepcopy(data.get("metadata", {})),
+            attachments=copy.deepcopy(data.get("attachments", [])),
             parent_message_id=data.get("parent_message_id"),
             is_deleted=data.get("is_deleted", False)
         )
@@ -243,10 +244,29 @@ class ChatSession:
             message_count=data.get("message_count", 0),
             total_tokens=data.get("total_tokens", 0),
             model_config=ModelConfiguration.from_dict(data.get("model_config", {})),
-            settings=data.get("settings", {}),
-            tags=data.get("tags", []),
-            metadata=data.get("metadata", {})
+            settings=copy.deepcopy(data.get("settings", {})),
+            tags=list(data.get("tags", [])),
+            metadata=copy.deepcopy(data.get("metadata", {}))
         )
+    
+    def clone(self) -> 'ChatSession':
+        """复制会话，模型配置、设置、标签与元数据不与原对象共享"""
+        return copy.deepcopy(self)
+    
+    def apply_changes(self, changes: Dict[str, Any]) -> None:
+        """按 to_dict 格式的部分字段更新会话，未列出的字段不变"""
+        for name, value in changes.items():
+            if name in ("created_at", "updated_at"):
+                value = datetime.fromisoformat(value)
+            elif name == "last_message_at":
+                value = datetime.fromisoformat(value) if value else None
+            elif name == "status":
+                value = SessionStatus(value)
+            elif name == "model_config":
+                value = ModelConfiguration.from_dict(value)
+            elif isinstance(value, (dict, list)):
+                value = copy.deepcopy(value)
+            setattr(self, name, value)
 
 
 @dataclass
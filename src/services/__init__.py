@@ -4,6 +4,8 @@
 """
 
 from .storage_service import FileStorageService
+from .sqlite_storage_service import SqliteStorageService
+from .memory_storage_service import MemoryStorageService
 from .session_manager import SessionManager
 from .message_handler import MessageHandler
 from .model_providers import OpenAIProvider, ModelProviderRegistry
@@ -11,6 +13,8 @@ from .service_container import ServiceContainer, ServiceConfig
 
 __all__ = [
     "FileStorageService",
+    "SqliteStorageService",
+    "MemoryStorageService",
     "SessionManager", 
     "MessageHandler",
     "OpenAIProvider",
@@ -0,0 +1,239 @@
+"""
+内存存储服务实现
+数据只保存在进程内存中，用于基准测试、测试环境与无需持久化的临时数据
+"""
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Tuple
+import logging
+
+from contracts.storage_service import StorageConfig, StorageBackend
+from core.errors import ConfigError, ErrorCode
+from .storage_service import FileStorageService
+from .storage_format import (
+    FILE_FORMATS, COMPRESSIONS, RecordFileFormat, list_record_files, read_records
+)
+
+
+class MemoryStorageService(FileStorageService):
+    """
+    内存存储服务实现
+
+    与文件存储共用内存集合、索引维护、查询规划与批量操作，只去掉持久化。
+    配置 max_records 后按最近最少使用(LRU)淘汰超出上限的记录，
+    写入与按键读取都会刷新记录的使用时间。
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        super().__init__(logger)
+        self.max_records: Optional[int] = None
+        self._recency: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self.evicted_count = 0
+
+    async def initialize(self, config: StorageConfig) -> bool:
+        """
+        初始化内存存储服务
+
+        Args:
+            config: 存储配置，connection_string 不使用
+
+        Returns:
+            bool: 初始化是否成功
+        """
+        async with self._lock:
+            try:
+                if config.backend != StorageBackend.MEMORY:
+                    raise ConfigError(
+                        f"不支持的存储后端: {config.backend}",
+                        ErrorCode.CONFIG_VALUE_INVALID
+                    )
+                if config.file_format not in FILE_FORMATS or config.compression not in COMPRESSIONS:
+                    raise ConfigError(
+                        f"不支持的文件格式: {config.file_format}, 压缩: {config.compression}",
+                        ErrorCode.CONFIG_VALUE_INVALID
+                    )
+
+                self.config = config
+                self.file_format = RecordFileFormat(config.file_format, config.compression)
+                self.max_records = config.max_records or None
+                self._initialized = True
+                self.logger.info(
+                    f"内存存储服务初始化成功: 记录上限={self.max_records or '无'}"
+                )
+                return True
+
+            except Exception as e:
+                self.logger.error(f"内存存储服务初始化失败: {e}")
+                return False
+
+    async def retrieve_data(
+        self,
+        collection: str,
+        key: str,
+        fields: Optional[List[str]] = None,
+        read_only: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        检索单条数据，命中时刷新记录的使用时间
+
+        Args:
+            collection: 集合名称
+            key: 数据唯一标识符
+            fields: 返回的字段，None表示全部字段
+            read_only: 是否返回只读视图（不复制记录）
+
+        Returns:
+            Dict[str, Any]或None: 检索到的数据
+        """
+        result = await super().retrieve_data(collection, key, fields, read_only)
+        if result is not None and self.max_records:
+            self._recency.move_to_end((collection, key))
+        return result
+
+    async def get_many(
+        self,
+        collection: str,
+        keys: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        批量检索数据，刷新命中记录的使用时间
+
+        Args:
+            collection: 集合名称
+            keys: 数据唯一标识符列表
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 唯一标识符 -> 数据，不存在的键不包含在结果中
+        """
+        result = await super().get_many(collection, keys)
+        if self.max_records:
+            for key in result:
+                self._recency.move_to_end((collection, key))
+        return result
+
+    async def backup_data(
+        self,
+        backup_path: str,
+        collections: Optional[List[str]] = None
+    ) -> bool:
+        """
+        将内存数据快照写为集合文件，按配置的 file_format 与 compression 写入，与文件存储相同
+
+        Args:
+            backup_path: 备份目录路径
+            collections: 要备份的集合列表，None表示全部
+
+        Returns:
+            bool: 备份是否成功
+        """
+        try:
+            backup_dir = Path(backup_path)
+            backup_dir.mkdir(parents=True, exist_ok=True)
+
+            for collection in collections or list(self.collections.keys()):
+                if collection in self.collections:
+                    snapshot = self._snapshot(collection)
+                    await self._run_io(self.file_format.write, backup_dir, collection, snapshot)
+
+            self.logger.info(f"数据备份成功: {backup_path}")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"数据备份失败: {e}")
+            return False
+
+    async def restore_data(
+        self,
+        backup_path: str,
+        collections: Optional[List[str]] = None
+    ) -> bool:
+        """
+        从集合文件恢复数据，可恢复文件存储的备份
+
+        Args:
+            backup_path: 备份目录路径
+            collections: 要恢复的集合列表，None表示全部
+
+        Returns:
+            bool: 恢复是否成功
+        """
+        try:
+            backup_dir = Path(backup_path)
+            if not backup_dir.exists():
+                return False
+
+            backup_files = list_record_files(backup_dir)
+            collections_to_restore = collections or sorted(backup_files)
+
+            for collection in collections_to_restore:
+                backup_file = backup_files.get(collection)
+                if backup_file is None:
+                    continue
+                records = read_records(backup_file)
+
+                async with self._collection_lock(collection):
+                    for key in list(self.collections.get(collection, {})):
+                        self._apply_change(collection, key, None)
+                    for key, record in records.items():
+                        self._apply_change(collection, key, record)
+
+            self.logger.info(f"数据恢复成功: {backup_path}")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"数据恢复失败: {e}")
+            return False
+
+    async def close(self) -> bool:
+        """
+        关闭存储服务并释放内存数据
+
+        Returns:
+            bool: 关闭是否成功
+        """
+        self._recency.clear()
+        return await super().close()
+
+    def get_backend_type(self) -> StorageBackend:
+        """
+        获取存储后端类型
+
+        Returns:
+            StorageBackend: 后端类型
+        """
+        return StorageBackend.MEMORY
+
+    # ============ 私有方法 ============
+
+    def _apply_change(
+        self,
+        collection: str,
+        key: str,
+        record: Optional[Dict[str, Any]]
+    ):
+        """在内存中应用记录变更，并按记录数上限淘汰最久未使用的记录"""
+        super()._apply_change(collection, key, record)
+        if not self.max_records:
+            return
+
+        if record is None:
+            self._recency.pop((collection, key), None)
+            return
+
+        self._recency[(collection, key)] = None
+        self._recency.move_to_end((collection, key))
+        while len(self._recency) > self.max_records:
+            (evicted_collection, evicted_key), _ = self._recency.popitem(last=False)
+            super()._apply_change(evicted_collection, evicted_key, None)
+            self.evicted_count += 1
+
+    def _stage(self, collection: str, entries: List[Dict[str, Any]]) -> Optional[int]:
+        """内存存储无需持久化"""
+        return None
+
+    async def _save_index_definitions(self):
+        """索引定义随进程存在，无需持久化"""
+
+    async def _save_aggregate_definitions(self):
+        """聚合视图定义随进程存在，无需持久化"""
@@ -4,22 +4,39 @@
 """
 
 from typing import Dict, Any, Optional, Type, TypeVar
+from datetime import timedelta
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os
 
 from contracts.storage_service import IStorageService, StorageConfig, StorageBackend
 from contracts.session_manager import ISessionManager
 from contracts.message_handler import IMessageHandler
 from contracts.model_provider import IModelProvider
+from core.models import SessionStatus
 
+from config.settings import global_config_manager, DEFAULT_CONFIG
 from .storage_service import FileStorageService
+from .sqlite_storage_service import SqliteStorageService
+from .memory_storage_service import MemoryStorageService
 from .session_manager import SessionManager
 from .message_handler import MessageHandler
 from .model_providers import OpenAIProvider, ModelProviderRegistry
 
 T = TypeVar('T')
 
+# 存储后端实现
+STORAGE_BACKENDS: Dict[StorageBackend, Type[IStorageService]] = {
+    StorageBackend.FILE: FileStorageService,
+    StorageBackend.SQLITE: SqliteStorageService,
+    StorageBackend.MEMORY: MemoryStorageService,
+}
+
+
+def _default_config_section(section: str) -> Dict[str, Any]:
+    """配置段：优先使用已加载的全局配置，否则使用默认配置"""
+    return dict(global_config_manager.config.get(section) or DEFAULT_CONFIG[section])
+
 
 @dataclass
 class ServiceConfig:
@@ -28,6 +45,11 @@ class ServiceConfig:
     openai_api_key: Optional[str] = None
     log_level: str = "INFO"
     enable_cache: bool = True
+    database: Dict[str, Any] = field(default_factory=lambda: _default_config_section("database"))
+    retention: Dict[str, Any] = field(default_factory=lambda: _default_config_section("retention"))
+    conversation: Dict[str, Any] = field(
+        default_factory=lambda: _default_config_section("conversation")
+    )
 
 
 class ServiceContainer:
@@ -112,6 +134,11 @@ class ServiceContainer:
         try:
             self.logger.info("开始关闭服务容器...")
             
+            # 等待会话管理器的后台维护，之后再关闭存储服务
+            session_manager = self.get_session_manager()
+            if session_manager:
+                await session_manager.close()
+            
             # 关闭存储服务
             storage_service = self.get_storage_service()
             if storage_service:
@@ -139,6 +166,7 @@ class ServiceContainer:
             'services': self.get_service_status(),
             'config': {
                 'storage_path': self.config.storage_path,
+                'storage_backend': self.config.database.get("backend"),
                 'log_level': self.config.log_level,
                 'enable_cache': self.config.enable_cache
             }
@@ -146,18 +174,63 @@ class ServiceContainer:
     
     # ============ 私有方法 ============
     
+    def _create_storage_config(self) -> StorageConfig:
+        """根据 database 配置创建存储配置"""
+        database = self.config.database
+        backend = StorageBackend(database.get("backend", StorageBackend.FILE.value))
+        
+        # 文件存储使用数据目录，其他后端使用数据库连接串
+        if backend == StorageBackend.FILE:
+            connection_string = self.config.storage_path
+        else:
+            connection_string = database.get("connection_string", self.config.storage_path)
+        
+        return StorageConfig(
+            backend=backend,
+            connection_string=connection_string,
+            max_connections=database.get("max_connections", 10),
+            auto_backup=database.get("auto_backup", True),
+            backup_interval=database.get("backup_interval", 3600),
+            backup_path=database.get("backup_path"),
+            backup_retention=database.get("backup_retention", 24),
+            max_records=database.get("max_records"),
+            durability=database.get("durability", "sync"),
+            flush_interval=database.get("flush_interval", 1.0),
+            flush_max_pending=database.get("flush_max_pending", 100),
+            journal_enabled=database.get("journal_enabled", False),
+            checkpoint_threshold=database.get("checkpoint_threshold", 1000),
+            io_workers=database.get("io_workers", 2),
+            partitions=dict(database.get("partitions") or {}),
+            partition_buckets=database.get("partition_buckets", 0),
+            lazy_loading=database.get("lazy_loading", False),
+            cache_budget_bytes=database.get("cache_budget_bytes"),
+            file_format=database.get("file_format", "json"),
+            compression=database.get("compression"),
+            shared_access=database.get("shared_access", False),
+            query_cache_size=database.get("query_cache_size", 0)
+        )
+    
+    def _create_session_retention(self) -> Dict[SessionStatus, timedelta]:
+        """根据 retention.sessions 配置创建各会话状态的保留时长"""
+        sessions = self.config.retention.get("sessions") or {}
+        return {
+            SessionStatus(status): timedelta(seconds=seconds)
+            for status, seconds in sessions.items()
+            if seconds is not None
+        }
+    
     async def _initialize_storage_service(self):
         """初始化存储服务"""
         self.logger.debug("初始化存储服务...")
         
         # 创建存储配置
-        storage_config = StorageConfig(
-            backend=StorageBackend.FILE,
-            connection_string=self.config.storage_path
-        )
+        storage_config = self._create_storage_config()
         
-        # 创建文件存储服务
-        storage_service = FileStorageService(logger=self.logger)
+        # 按后端类型创建存储服务
+        service_class = STORAGE_BACKENDS.get(storage_config.backend)
+        if service_class is None:
+            raise RuntimeError(f"不支持的存储后端: {storage_config.backend.value}")
+        storage_service = service_class(logger=self.logger)
         
         # 初始化
         success = await storage_service.initialize(storage_config)
@@ -165,7 +238,9 @@ class ServiceContainer:
             raise RuntimeError("存储服务初始化失败")
         
         self._services["IStorageService"] = storage_service
-        self.logger.info(f"文件存储服务初始化成功: {self.config.storage_path}")
+        self.logger.info(
+            f"存储服务初始化成功: {storage_config.backend.value} ({storage_config.connection_string})"
+        )
     
     async def _initialize_session_manager(self):
         """初始化会话管理器"""
@@ -177,8 +252,17 @@ class ServiceContainer:
         
         session_manager = SessionManager(
             storage_service=storage_service,
-            logger=self.logger
+            logger=self.logger,
+            retention=self._create_session_retention(),
+            recent_messages=self.config.conversation.get(
+                "recent_messages", SessionManager.DEFAULT_RECENT_MESSAGES
+            ),
+            active_sessions=self.config.conversation.get(
+                "active_sessions", SessionManager.DEFAULT_ACTIVE_SESSIONS
+            ),
+            compaction_interval=self.config.retention.get("compaction_interval", 0)
         )
+        await session_manager.ensure_indexes()
         
         self._services["ISessionManager"] = session_manager
         self.logger.debug("会话管理器初始化成功")
@@ -2,22 +2,98 @@
 会话管理服务实现
 """
 
-from typing import Dict, List, Optional, Any
-from datetime import datetime
+import asyncio
+import copy
+from collections import OrderedDict, deque
+from dataclasses import replace
+from itertools import islice
+from typing import Deque, Dict, List, Optional, Any, Tuple, Union
+from datetime import datetime, timedelta
 import logging
 
 from contracts.session_manager import ISessionManager
-from core.models import ChatSession, Message, create_new_session
+from core.models import (
+    ChatSession, Message, SessionStatus,
+    create_new_session, create_user_message, create_assistant_message
+)
 from contracts.storage_service import IStorageService, QueryOptions, QueryFilter
-from core.errors import ValidationError, ErrorCode
+from core.errors import ValidationError, SystemError, ErrorCode
 
 
 class SessionManager(ISessionManager):
     """会话管理服务实现"""
     
-    def __init__(self, storage_service: IStorageService, logger: Optional[logging.Logger] = None):
+    # 会话管理依赖的存储索引: (集合, 字段)
+    # 复合有序索引同时服务于前导字段的等值查找和按时间排序的分页查询
+    REQUIRED_INDEXES = [
+        ("sessions", ["user_id", "created_at"]),
+        ("messages", ["session_id", "timestamp"]),
+    ]
+    
+    # 仪表盘使用的增量聚合视图: (集合, 视图名称, 分组字段, 求和与最值字段)
+    REQUIRED_AGGREGATES = [
+        ("sessions", "sessions_by_user", "user_id", ["updated_at"]),
+        ("messages", "messages_by_session", "session_id", ["token_count", "timestamp"]),
+    ]
+    
+    # 各状态会话自最后更新起的保留时长，未列出的状态永久保留
+    DEFAULT_RETENTION = {SessionStatus.DELETED: timedelta(0)}
+    
+    # 每个活跃会话缓冲的最近消息数，以及缓存会话对象与最近消息的会话数上限
+    DEFAULT_RECENT_MESSAGES = 50
+    DEFAULT_ACTIVE_SESSIONS = 100
+    
+    # 上一次压缩时间的存储位置: (集合, 键)，压缩间隔因此跨进程重启保持
+    COMPACTION_RECORD = ("maintenance", "session_compaction")
+    
+    # patch_session 可以更新的字段
+    PATCHABLE_FIELDS = set(ChatSession.__dataclass_fields__) - {"session_id"}
+    
+    def __init__(
+        self,
+        storage_service: IStorageService,
+        logger: Optional[logging.Logger] = None,
+        retention: Optional[Dict[SessionStatus, timedelta]] = None,
+        recent_messages: int = DEFAULT_RECENT_MESSAGES,
+        active_sessions: int = DEFAULT_ACTIVE_SESSIONS,
+        compaction_interval: float = 0
+    ):
         self.storage = storage_service
         self.logger = logger or logging.getLogger(__name__)
+        self.required_indexes = list(self.REQUIRED_INDEXES)
+        self.required_aggregates = list(self.REQUIRED_AGGREGATES)
+        self.retention = dict(self.DEFAULT_RETENTION if retention is None else retention)
+        self.recent_messages = recent_messages
+        self.active_sessions = active_sessions
+        self.compaction_interval = compaction_interval
+        self._indexes_ready = False
+        self._compacting = False
+        self._compaction_task: Optional["asyncio.Task[Optional[Dict[str, int]]]"] = None
+        # 会话ID -> 会话对象，按最近使用排序
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        # 会话ID -> 最近消息的环形缓冲，按最近使用排序
+        self._recent: "OrderedDict[str, Deque[Message]]" = OrderedDict()
+        # 正在从存储预热的会话，预热期间新增的消息暂存在这里
+        self._warming: Dict[str, List[List[Message]]] = {}
+    
+    async def ensure_indexes(self) -> bool:
+        """创建会话查询所需的索引与聚合视图，重复调用只在首次生效"""
+        if self._indexes_ready:
+            return True
+        
+        results = [
+            await self.storage.create_index(collection, field)
+            for collection, field in self.required_indexes
+        ]
+        results.extend([
+            await self.storage.create_aggregate(collection, name, group_by, fields)
+            for collection, name, group_by, fields in self.required_aggregates
+        ])
+        self._indexes_ready = True
+        if not all(results):
+            self.logger.warning("部分会话索引创建失败，查询将回退为全量扫描")
+            return False
+        return True
     
     async def create_session(
         self,
@@ -33,13 +109,30 @@ class SessionManager(ISessionManager):
         session_data = session.to_dict()
         await self.storage.store_data("sessions", session_data, session.session_id)
         
-        return session
+        self._cache_session(session)
+        # 新会话没有历史消息，缓冲无需预热
+        self._buffer_recent(session.session_id, [])
+        self._schedule_compaction()
+        return session.clone()
     
     async def get_session(self, session_id: str) -> Optional[ChatSession]:
-        """获取会话"""
+        """
+        获取会话
+        
+        最近使用的会话对象缓存在内存中，命中时不读取存储也不反序列化。
+        返回的是缓存对象的副本，调用方修改它不影响缓存；持久化修改应通过
+        update_session 或 patch_session。
+        """
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.move_to_end(session_id)
+            return session.clone()
+        
         session_data = await self.storage.retrieve_data("sessions", session_id)
         if session_data:
-            return ChatSession.from_dict(session_data)
+            session = ChatSession.from_dict(session_data)
+            self._cache_session(session)
+            return session.clone()
         return None
     
     async def update_session(
@@ -49,21 +142,66 @@ class SessionManager(ISessionManager):
         model_config: Optional[Dict[str, Any]] = None,
         metadata: Optional[Dict[str, Any]] = None
     ) -> bool:
-        """更新会话"""
-        session = await self.get_session(session_id)
-        if not session:
-            return False
-        
+        """更新会话，只写入变化的字段"""
+        changes: Dict[str, Any] = {}
         if title:
-            session.title = title
+            changes["title"] = title
         if metadata:
-            session.metadata.update(metadata)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                current = session.metadata
+            else:
+                # 存储只做浅合并，嵌套的元数据需要先读出当前值
+                data = await self.storage.retrieve_data(
+                    "sessions", session_id, fields=["metadata"], read_only=True
+                )
+                if data is None:
+                    return False
+                current = data.get("metadata") or {}
+            changes["metadata"] = {**current, **metadata}
         
-        session.updated_at = datetime.now()
-        return await self.storage.update_data("sessions", session_id, session.to_dict())
+        changes["updated_at"] = datetime.now().isoformat()
+        return await self.patch_session(session_id, changes)
+    
+    async def patch_session(self, session_id: str, changes: Dict[str, Any]) -> bool:
+        """
+        只写入会话变化的字段，并同步更新缓存的会话对象
+        
+        Args:
+            session_id: 会话ID
+            changes: 字段 -> 新值，格式与 ChatSession.to_dict 相同
+            
+        Returns:
+            bool: 更新是否成功，会话不存在时为False
+        """
+        unknown = set(changes) - self.PATCHABLE_FIELDS
+        if unknown:
+            raise ValidationError(
+                f"不能更新的会话字段: {', '.join(sorted(unknown))}",
+                ErrorCode.VALIDATION_INVALID_FORMAT
+            )
+        
+        try:
+            updated = await self.storage.update_data("sessions", session_id, changes, merge=True)
+        except Exception:
+            self._sessions.pop(session_id, None)
+            raise
+        
+        session = self._sessions.get(session_id)
+        if not updated:
+            self._sessions.pop(session_id, None)
+        elif session is not None:
+            # 嵌套的字典与列表已交给存储，缓存的对象使用副本
+            session.apply_changes(copy.deepcopy(changes))
+            self._sessions.move_to_end(session_id)
+        return updated
     
     async def delete_session(self, session_id: str) -> bool:
-        """删除会话"""
+        """删除会话及其全部消息"""
+        self._sessions.pop(session_id, None)
+        self._recent.pop(session_id, None)
+        # 先删除消息，中途失败时不会留下没有会话的消息
+        await self._delete_session_messages(session_id)
         return await self.storage.delete_data("sessions", session_id)
     
     async def get_user_sessions(
@@ -73,26 +211,53 @@ class SessionManager(ISessionManager):
         offset: int = 0
     ) -> List[ChatSession]:
         """获取用户会话列表"""
+        await self.ensure_indexes()
         options = QueryOptions(
             filters=[QueryFilter(field="user_id", operator="eq", value=user_id)],
             sort_by="created_at",
             sort_order="desc",
             limit=limit,
-            offset=offset
+            offset=offset,
+            read_only=True
         )
         sessions_data = await self.storage.query_data("sessions", options)
         return [ChatSession.from_dict(data) for data in sessions_data]
     
+    async def get_user_sessions_page(
+        self,
+        user_id: str,
+        limit: int = 20,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[ChatSession], Optional[str]]:
+        """
+        按游标分页获取用户会话列表
+        
+        游标记录上一页最后一条的 (created_at, 会话ID)，在 (user_id, created_at) 索引上
+        从游标处继续，翻到任意一页的代价都与页大小成正比。
+        """
+        options = QueryOptions(
+            filters=[QueryFilter(field="user_id", operator="eq", value=user_id)],
+            sort_by="created_at",
+            sort_order="desc",
+            read_only=True
+        )
+        records, next_cursor = await self._page("sessions", options, limit, cursor)
+        return [ChatSession.from_dict(data) for data in records], next_cursor
+    
     async def add_message(
         self,
         session_id: str,
         role: str,
         content: str,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        count: bool = True
     ) -> Message:
-        """添加消息"""
-        from core.models import create_user_message, create_assistant_message
+        """
+        添加消息，并在会话记录上原子地累加消息数与token数
         
+        count 为False时只保存消息，由之后的 record_turn 或 count_messages 计入会话，
+        一轮对话的计数只写一次。
+        """
         if role == "user":
             message = create_user_message(session_id, content)
         else:
@@ -100,9 +265,61 @@ class SessionManager(ISessionManager):
         
         message_data = message.to_dict()
         await self.storage.store_data("messages", message_data, message.message_id)
-        
+        self._remember_messages(session_id, [message])
+        if count:
+            await self.count_messages(session_id, [message])
         return message
     
+    async def count_messages(self, session_id: str, messages: List[Message]):
+        """将已保存但未计数的消息计入会话"""
+        updated = await self.storage.increment_data(
+            "sessions", session_id, *self._counters(messages, sum(m.token_count for m in messages))
+        )
+        self._apply_counters(session_id, updated)
+    
+    async def record_turn(
+        self,
+        session_id: str,
+        user_msg: Union[str, Message],
+        assistant_msg: str,
+        usage: Optional[Dict[str, int]] = None
+    ) -> Tuple[Message, Message]:
+        """
+        保存一轮对话
+        
+        消息写入与会话计数器、最后消息时间的增量更新通过一次 insert_and_increment 完成，
+        SQLite 后端在同一事务中执行。
+        prompt_tokens 记在用户消息上，completion_tokens 记在助手消息上。
+        
+        user_msg 为调用模型之前已由 add_message(count=False) 保存的消息时，只写入助手消息，
+        会话计数仍一次累加两条消息与本轮的全部token。
+        """
+        usage = usage or {}
+        assistant_message = create_assistant_message(
+            session_id, assistant_msg, usage.get("completion_tokens", 0)
+        )
+        if isinstance(user_msg, Message):
+            user_message = user_msg
+            new_messages = [assistant_message]
+        else:
+            user_message = create_user_message(session_id, user_msg)
+            user_message.token_count = usage.get("prompt_tokens", 0)
+            new_messages = [user_message, assistant_message]
+        
+        messages = [user_message, assistant_message]
+        tokens = usage.get("total_tokens", user_message.token_count + assistant_message.token_count)
+        updated = await self.storage.insert_and_increment(
+            "messages",
+            [message.to_dict() for message in new_messages],
+            [message.message_id for message in new_messages],
+            "sessions",
+            session_id,
+            *self._counters(messages, tokens)
+        )
+        self._remember_messages(session_id, new_messages)
+        self._apply_counters(session_id, updated)
+        return user_message, assistant_message
+    
     async def get_session_messages(
         self,
         session_id: str,
@@ -110,16 +327,339 @@ class SessionManager(ISessionManager):
         offset: int = 0
     ) -> List[Message]:
         """获取会话消息"""
+        await self.ensure_indexes()
         options = QueryOptions(
             filters=[QueryFilter(field="session_id", operator="eq", value=session_id)],
             sort_by="timestamp",
             sort_order="asc",
             limit=limit,
-            offset=offset
+            offset=offset,
+            read_only=True
         )
         messages_data = await self.storage.query_data("messages", options)
         return [Message.from_dict(data) for data in messages_data]
     
+    async def get_session_messages_page(
+        self,
+        session_id: str,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Message], Optional[str]]:
+        """按游标分页获取会话消息，在 (session_id, timestamp) 索引上从游标处继续"""
+        options = QueryOptions(
+            filters=[QueryFilter(field="session_id", operator="eq", value=session_id)],
+            sort_by="timestamp",
+            sort_order="asc",
+            read_only=True
+        )
+        records, next_cursor = await self._page("messages", options, limit, cursor)
+        return [Message.from_dict(data) for data in records], next_cursor
+    
+    async def get_recent_messages(
+        self,
+        session_id: str,
+        n: Optional[int] = None
+    ) -> List[Message]:
+        """
+        获取会话最近的消息
+        
+        活跃会话的最近 recent_messages 条消息缓冲在内存中，首次读取时从存储预热，
+        之后 add_message 与 record_turn 直接追加；超出缓冲容量的请求直接查询存储。
+        返回的消息对象与缓冲共享，调用方不应修改。
+        """
+        n = self.recent_messages if n is None else n
+        if n <= 0:
+            return []
+        if n > self.recent_messages:
+            return await self._query_recent(session_id, n)
+        
+        buffer = self._recent.get(session_id)
+        if buffer is None:
+            buffer = await self._warm_recent(session_id)
+        else:
+            self._recent.move_to_end(session_id)
+        
+        recent = list(islice(reversed(buffer), n))
+        recent.reverse()
+        return recent
+    
     async def clear_session_messages(self, session_id: str) -> bool:
-        """清空会话消息"""
-        return True
+        """清空会话消息，并重置会话的消息计数"""
+        self._recent.pop(session_id, None)
+        await self._delete_session_messages(session_id)
+        return await self.patch_session(
+            session_id, {"message_count": 0, "total_tokens": 0, "last_message_at": None}
+        )
+    
+    async def compact_storage(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        压缩会话存储：删除已标记删除的消息、超出保留时长的会话（连同其消息），
+        以及会话已不存在的孤立消息
+        """
+        now = now or datetime.now()
+        
+        expired_sessions: List[str] = []
+        for status, window in self.retention.items():
+            options = QueryOptions(
+                filters=[
+                    QueryFilter(field="status", operator="eq", value=status.value),
+                    QueryFilter(field="updated_at", operator="lt", value=(now - window).isoformat()),
+                ],
+                fields=["session_id"],
+                read_only=True
+            )
+            expired_sessions.extend(
+                data["session_id"] for data in await self.storage.query_data("sessions", options)
+            )
+        
+        orphaned_sessions = await self._orphaned_session_ids()
+        message_filters = [[QueryFilter(field="is_deleted", operator="eq", value=True)]]
+        if expired_sessions or orphaned_sessions:
+            message_filters.append([QueryFilter(
+                field="session_id", operator="in", value=expired_sessions + orphaned_sessions
+            )])
+        expired_messages: Dict[str, None] = {}
+        for filters in message_filters:
+            options = QueryOptions(filters=filters, fields=["message_id"], read_only=True)
+            for data in await self.storage.query_data("messages", options):
+                expired_messages[data["message_id"]] = None
+        
+        # 先删除消息，中途失败时不会留下没有会话的消息；没有可删除的记录时不重写文件
+        nothing = {"records": 0, "bytes": 0}
+        messages = (
+            await self.storage.compact("messages", list(expired_messages))
+            if expired_messages else nothing
+        )
+        sessions = (
+            await self.storage.compact("sessions", expired_sessions)
+            if expired_sessions else nothing
+        )
+        for session_id in expired_sessions:
+            self._sessions.pop(session_id, None)
+        # 被删除的已标记消息可能在任一会话的缓冲中，全部重新预热
+        self._recent.clear()
+        
+        result = {
+            "sessions": sessions["records"],
+            "messages": messages["records"],
+            "orphaned_sessions": len(orphaned_sessions),
+            "bytes": sessions["bytes"] + messages["bytes"],
+        }
+        self.logger.info(
+            f"会话存储压缩完成: {result['sessions']}个会话, {result['messages']}条消息"
+            f"（其中{result['orphaned_sessions']}个已删除会话的孤立消息）, 回收{result['bytes']}字节"
+        )
+        return result
+    
+    async def compact_if_due(self, now: Optional[datetime] = None) -> Optional[Dict[str, int]]:
+        """
+        距上一次压缩超过 compaction_interval 秒时压缩会话存储
+        
+        create_session 在asyncio事件循环中把它作为后台任务启动，不等待它完成；
+        其他事件循环（如trio）中由调用方定期调用。上一次压缩的时间保存在存储中，
+        从未压缩过时从第一次调用开始计时。压缩失败只记录日志。
+        
+        Returns:
+            Optional[Dict[str, int]]: 压缩结果，未到时间或压缩失败时为None
+        """
+        if self.compaction_interval <= 0 or self._compacting:
+            return None
+        now = now or datetime.now()
+        collection, key = self.COMPACTION_RECORD
+        
+        self._compacting = True
+        try:
+            record = await self.storage.retrieve_data(collection, key)
+            if record is not None:
+                elapsed = now - datetime.fromisoformat(record["last_run"])
+                if elapsed < timedelta(seconds=self.compaction_interval):
+                    return None
+            # 先记录时间，压缩失败时也等到下一个间隔再重试
+            await self.storage.store_data(collection, {"last_run": now.isoformat()}, key)
+            if record is None:
+                return None
+            return await self.compact_storage(now)
+        except Exception as e:
+            self.logger.error(f"会话存储压缩失败: {e}")
+            return None
+        finally:
+            self._compacting = False
+    
+    async def close(self):
+        """等待进行中的后台压缩完成"""
+        task = self._compaction_task
+        if task is not None and self._compaction_running():
+            await asyncio.wait([task])
+    
+    # ============ 私有方法 ============
+    
+    def _schedule_compaction(self):
+        """
+        在后台检查并执行到期的压缩，新建会话不等待压缩
+        
+        只在asyncio事件循环中启动后台任务，同一时间最多一个。任务所在的事件循环
+        已经结束（如每次操作各自 asyncio.run，或 Streamlit 重新运行脚本）时，
+        旧任务不会再完成，下一次新建会话时在当前事件循环中重新启动。
+        """
+        if self.compaction_interval <= 0:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._compaction_running():
+            return
+        task = self._compaction_task
+        if task is not None and not task.done():
+            # 旧任务被遗弃在已结束的事件循环中，不会再执行 compact_if_due 的 finally
+            self._compacting = False
+        self._compaction_task = loop.create_task(self.compact_if_due())
+    
+    def _compaction_running(self) -> bool:
+        """后台压缩任务是否在当前事件循环中运行"""
+        task = self._compaction_task
+        if task is None or task.done():
+            return False
+        try:
+            return task.get_loop() is asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+    
+    async def _page(
+        self,
+        collection: str,
+        options: QueryOptions,
+        limit: int,
+        cursor: Optional[str]
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        读取键集分页的一页，游标即存储流式查询的续读令牌
+        
+        多取一条判断是否还有下一页：批大小为 limit 时，只有后面还有记录才返回续读令牌。
+        """
+        if limit <= 0:
+            raise ValidationError(
+                "每页数量必须大于0", ErrorCode.VALIDATION_INVALID_FORMAT, field_name="limit"
+            )
+        await self.ensure_indexes()
+        batches = self.storage.iter_query(
+            collection, replace(options, limit=limit + 1), batch_size=limit, continuation=cursor
+        )
+        try:
+            async for batch in batches:
+                return batch.records, batch.continuation
+        finally:
+            await batches.aclose()
+        return [], None
+    
+    async def _query_recent(self, session_id: str, n: int) -> List[Message]:
+        """从存储读取会话最近的 n 条消息，按时间从旧到新排列"""
+        await self.ensure_indexes()
+        options = QueryOptions(
+            filters=[QueryFilter(field="session_id", operator="eq", value=session_id)],
+            sort_by="timestamp",
+            sort_order="desc",
+            limit=n,
+            read_only=True
+        )
+        messages_data = await self.storage.query_data("messages", options)
+        return [Message.from_dict(data) for data in reversed(messages_data)]
+    
+    async def _delete_session_messages(self, session_id: str) -> int:
+        """按会话索引找出会话的全部消息，一次批量删除，代价与该会话的消息数成正比"""
+        await self.ensure_indexes()
+        options = QueryOptions(
+            filters=[QueryFilter(field="session_id", operator="eq", value=session_id)],
+            fields=["message_id"],
+            read_only=True
+        )
+        keys = [data["message_id"] for data in await self.storage.query_data("messages", options)]
+        if not keys:
+            return 0
+        return await self.storage.delete_many("messages", keys)
+    
+    async def _orphaned_session_ids(self) -> List[str]:
+        """
+        找出仍有消息但会话记录已不存在的会话ID
+        
+        消息所属的会话取自按会话分组的聚合视图，不扫描消息本身。
+        """
+        await self.ensure_indexes()
+        groups = await self.storage.get_aggregate("messages", "messages_by_session")
+        session_ids = [session_id for session_id in groups if isinstance(session_id, str)]
+        if not session_ids:
+            return []
+        existing = await self.storage.get_many("sessions", session_ids)
+        return [session_id for session_id in session_ids if session_id not in existing]
+    
+    async def _warm_recent(self, session_id: str) -> Deque[Message]:
+        """从存储预热会话的消息缓冲，合并预热期间新增的消息"""
+        pending: List[Message] = []
+        self._warming.setdefault(session_id, []).append(pending)
+        try:
+            messages = await self._query_recent(session_id, self.recent_messages)
+        finally:
+            waiting = self._warming[session_id]
+            waiting.remove(pending)
+            if not waiting:
+                del self._warming[session_id]
+        
+        known = {message.message_id for message in messages}
+        messages.extend(message for message in pending if message.message_id not in known)
+        return self._buffer_recent(session_id, messages)
+    
+    def _counters(
+        self, messages: List[Message], tokens: int
+    ) -> Tuple[Dict[str, int], Dict[str, Any]]:
+        """
+        会话计数的增量与一同写入的最后消息时间
+        
+        计数基于存储中的当前值增加，并发添加消息时不会丢失；
+        updated_at 不变，会话保留时长不受新消息影响。
+        """
+        return (
+            {"message_count": len(messages), "total_tokens": tokens},
+            {"last_message_at": messages[-1].timestamp.isoformat()}
+        )
+    
+    def _apply_counters(self, session_id: str, updated: Optional[Dict[str, Any]]):
+        """缓存的会话对象使用存储返回的计数"""
+        if updated is None:
+            self.logger.warning(f"会话计数更新失败: {session_id}")
+            self._sessions.pop(session_id, None)
+            return
+        
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.apply_changes({
+                name: updated[name]
+                for name in ("message_count", "total_tokens", "last_message_at")
+            })
+    
+    def _remember_messages(self, session_id: str, messages: List[Message]):
+        """把新写入的消息追加到会话的消息缓冲与正在进行的预热"""
+        # 写入期间完成的预热可能已经从存储读到这些消息
+        buffer = self._recent.get(session_id)
+        if buffer is not None:
+            for message in messages:
+                if all(item.message_id != message.message_id for item in reversed(buffer)):
+                    buffer.append(message)
+            self._recent.move_to_end(session_id)
+        for pending in self._warming.get(session_id, ()):
+            pending.extend(messages)
+    
+    def _cache_session(self, session: ChatSession):
+        """缓存会话对象，超出活跃会话上限时淘汰最久未使用的会话"""
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        while len(self._sessions) > self.active_sessions:
+            self._sessions.popitem(last=False)
+    
+    def _buffer_recent(self, session_id: str, messages: List[Message]) -> Deque[Message]:
+        """登记会话的消息缓冲，超出活跃会话上限时淘汰最久未使用的会话"""
+        buffer: Deque[Message] = deque(messages, maxlen=self.recent_messages)
+        self._recent[session_id] = buffer
+        self._recent.move_to_end(session_id)
+        while len(self._recent) > self.active_sessions:
+            self._recent.popitem(last=False)
+        return buffer
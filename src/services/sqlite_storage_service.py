@@ -0,0 +1,1336 @@
+"""
+SQLite存储服务实现
+基于标准库sqlite3的数据持久化服务，每个集合对应一张表，记录以JSON文本保存
+"""
+
+import anyio
+import json
+import queue
+import re
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    AsyncIterator, Dict, List, Optional, Any, Callable, Iterator, Tuple, TypeVar, Union, cast
+)
+import logging
+
+from contracts.storage_service import (
+    IStorageService, StorageConfig, StorageBackend,
+    QueryOptions, QueryFilter, QueryBatch
+)
+from core.errors import (
+    SystemError, ConfigError, BusinessError, ValidationError, ErrorCode
+)
+from .storage_query import SUPPORTED_OPERATORS, encode_continuation, decode_continuation
+from .storage_view import RecordView
+
+T = TypeVar('T')
+
+# 集合名即表名，只允许安全的标识符
+_COLLECTION_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# 集合表结构
+_TABLE_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS {schema}"{table}" ('
+    'key TEXT PRIMARY KEY, '
+    'data TEXT NOT NULL, '
+    'created_at TEXT, '
+    'updated_at TEXT)'
+)
+
+# 聚合视图定义表，不作为集合
+_AGGREGATE_TABLE = "_aggregate_views"
+
+# 比较操作符到SQL的映射
+_SQL_OPERATORS = {
+    "eq": "=",
+    "ne": "IS NOT",
+    "gt": ">",
+    "lt": "<",
+    "ge": ">=",
+    "le": "<=",
+    "like": "LIKE",
+}
+
+# 单条语句绑定的参数数量上限（旧版SQLite默认限制为999）
+_MAX_SQL_PARAMS = 900
+
+
+def _field_path(field: str) -> str:
+    """字段的JSON路径"""
+    return '$."' + field.replace('"', '""') + '"'
+
+
+def _field_expr(field: str) -> str:
+    """字段对应的JSON提取表达式，查询与索引必须使用完全相同的表达式"""
+    return "json_extract(data, '" + _field_path(field).replace("'", "''") + "')"
+
+
+def _type_expr(field: str) -> str:
+    """字段的JSON类型表达式，字段不存在时为NULL"""
+    return "json_type(data, '" + _field_path(field).replace("'", "''") + "')"
+
+
+def _data_expr(fields: Optional[List[str]]) -> str:
+    """
+    返回数据列的表达式，指定字段时在SQLite中完成投影，只把需要的字段传回Python
+
+    json_each 把布尔值展开为整数，需要还原为JSON的true/false。
+    """
+    if fields is None:
+        return "data"
+    names = [field for field in fields if not field.startswith("_")]
+    if not names:
+        return "'{}'"
+    literals = ", ".join("'" + name.replace("'", "''") + "'" for name in names)
+    return (
+        "(SELECT json_group_object(key, CASE type WHEN 'true' THEN json('true') "
+        "WHEN 'false' THEN json('false') ELSE value END) "
+        f"FROM json_each(data) WHERE key IN ({literals}))"
+    )
+
+
+def _sql_value(value: Any) -> Any:
+    """将过滤值转换为SQL参数，复合值按JSON文本比较"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    return value
+
+
+def _chunks(items: List[Any]) -> Iterator[List[Any]]:
+    """按SQLite单条语句的参数数量上限切分"""
+    for start in range(0, len(items), _MAX_SQL_PARAMS):
+        yield items[start:start + _MAX_SQL_PARAMS]
+
+
+class SqliteStorageService(IStorageService):
+    """
+    SQLite存储服务实现
+
+    数据库以WAL模式运行，读写互不阻塞；连接池中的连接只在专用线程池中使用，
+    事件循环不会被磁盘I/O阻塞。create_index 在JSON字段表达式上创建真实的B树索引。
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.config: Optional[StorageConfig] = None
+        self.db_path: Optional[Path] = None
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._connections: List[sqlite3.Connection] = []
+        self._limiter: Optional[anyio.CapacityLimiter] = None
+        self._tables: set = set()
+        self._aggregates: Dict[Tuple[str, str], Tuple[str, List[str]]] = {}
+        self._initialized = False
+
+    async def initialize(self, config: StorageConfig) -> bool:
+        """
+        初始化SQLite存储服务
+
+        Args:
+            config: 存储配置，connection_string为数据库文件路径
+
+        Returns:
+            bool: 初始化是否成功
+        """
+        try:
+            if config.backend != StorageBackend.SQLITE:
+                raise ConfigError(
+                    f"不支持的存储后端: {config.backend}",
+                    ErrorCode.CONFIG_VALUE_INVALID
+                )
+
+            self.config = config
+            self.db_path = Path(config.connection_string)
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+            pool_size = max(1, config.max_connections)
+            self._limiter = anyio.CapacityLimiter(pool_size)
+            for _ in range(pool_size):
+                connection = self._connect()
+                self._connections.append(connection)
+                self._pool.put(connection)
+
+            # 加载已有的表
+            rows = await self._run(lambda conn: conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall())
+            self._tables = {row[0] for row in rows} - {_AGGREGATE_TABLE}
+            await self._load_aggregate_definitions()
+
+            self._initialized = True
+            self.logger.info(f"SQLite存储服务初始化成功: {self.db_path} (连接数: {pool_size})")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"SQLite存储服务初始化失败: {e}")
+            await self.close()
+            return False
+
+    async def store_data(
+        self,
+        collection: str,
+        data: Dict[str, Any],
+        key: Optional[str] = None
+    ) -> str:
+        """
+        存储数据到集合
+
+        Args:
+            collection: 集合名称
+            data: 要存储的数据
+            key: 可选的唯一键，如果不提供则自动生成
+
+        Returns:
+            str: 数据的唯一标识符
+        """
+        self._ensure_initialized()
+        await self._ensure_table(collection)
+
+        if key is None:
+            import uuid
+            key = str(uuid.uuid4())
+
+        now = datetime.now().isoformat()
+        payload = json.dumps(data, ensure_ascii=False)
+        sql = (
+            f'INSERT INTO "{collection}" (key, data, created_at, updated_at) '
+            f'VALUES (?, ?, ?, ?) '
+            f'ON CONFLICT(key) DO UPDATE SET data = excluded.data, '
+            f'created_at = excluded.created_at, updated_at = excluded.updated_at'
+        )
+
+        try:
+            await self._run_write(lambda conn: conn.execute(sql, (key, payload, now, now)))
+            self.logger.debug(f"数据存储成功: {collection}/{key}")
+            return key
+
+        except sqlite3.IntegrityError as e:
+            raise BusinessError(f"唯一索引冲突: {e}", ErrorCode.BUSINESS_RESOURCE_CONFLICT)
+        except Exception as e:
+            self.logger.error(f"存储数据失败: {e}")
+            raise SystemError(f"存储数据失败: {str(e)}", ErrorCode.SYSTEM_INTERNAL_ERROR)
+
+    async def retrieve_data(
+        self,
+        collection: str,
+        key: str,
+        fields: Optional[List[str]] = None,
+        read_only: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        检索单条数据
+
+        Args:
+            collection: 集合名称
+            key: 数据唯一标识符
+            fields: 返回的字段，在SQLite中完成投影
+            read_only: 是否返回只读映射
+
+        Returns:
+            Dict[str, Any]或None: 检索到的数据
+        """
+        self._ensure_initialized()
+        if collection not in self._tables:
+            return None
+
+        try:
+            row = await self._run(lambda conn: conn.execute(
+                f'SELECT {_data_expr(fields)} FROM "{collection}" WHERE key = ?', (key,)
+            ).fetchone())
+            if not row:
+                return None
+            data = json.loads(row[0])
+            return cast(Dict[str, Any], RecordView(data)) if read_only else data
+
+        except Exception as e:
+            self.logger.error(f"检索数据失败: {e}")
+            return None
+
+    async def query_data(
+        self,
+        collection: str,
+        options: Optional[QueryOptions] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        查询多条数据
+
+        Args:
+            collection: 集合名称
+            options: 查询选项
+
+        Returns:
+            List[Dict[str, Any]]: 查询结果列表
+        """
+        self._ensure_initialized()
+        if collection not in self._tables:
+            return []
+
+        options = options or QueryOptions(filters=[])
+        sql, params = self._build_query(collection, options)
+
+        try:
+            rows = await self._run(lambda conn: conn.execute(sql, params).fetchall())
+            results = [json.loads(row[0]) for row in rows]
+            if options.read_only:
+                return [cast(Dict[str, Any], RecordView(data)) for data in results]
+            return results
+
+        except Exception as e:
+            self.logger.error(f"查询数据失败: {e}")
+            return []
+
+    async def iter_query(
+        self,
+        collection: str,
+        options: Optional[QueryOptions] = None,
+        batch_size: int = 100,
+        continuation: Optional[str] = None
+    ) -> AsyncIterator[QueryBatch]:
+        """
+        流式查询：每批一次键集分页查询，不使用OFFSET跳过已读的行
+
+        Args:
+            collection: 集合名称
+            options: 查询选项
+            batch_size: 每批的记录数
+            continuation: 续读令牌，从生成它的那一批之后继续
+
+        Yields:
+            QueryBatch: 一批结果及其续读令牌
+        """
+        self._ensure_initialized()
+        if batch_size <= 0:
+            raise ValidationError(
+                "batch_size必须大于0", ErrorCode.VALIDATION_INVALID_FORMAT, field_name="batch_size"
+            )
+        if collection not in self._tables:
+            return
+
+        options = options or QueryOptions(filters=[])
+        after = decode_continuation(continuation, options.sort_by) if continuation else None
+        offset = options.offset if after is None else 0
+        remaining = options.limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            sql, params = self._build_keyset_query(collection, options, after, size, offset)
+            rows = await self._run(lambda conn: conn.execute(sql, params).fetchall())
+            if not rows:
+                return
+
+            records = [json.loads(row[2]) for row in rows]
+            if options.read_only:
+                records = [cast(Dict[str, Any], RecordView(data)) for data in records]
+            key, value = rows[-1][0], rows[-1][1]
+            after, offset = (value, key), 0
+            if remaining is not None:
+                remaining -= len(rows)
+            done = len(rows) < size or remaining == 0
+            token = None if done else encode_continuation(options.sort_by, value, key)
+            yield QueryBatch(records, token)
+            if done:
+                return
+
+    async def explain(
+        self,
+        collection: str,
+        options: Optional[QueryOptions] = None
+    ) -> Dict[str, Any]:
+        """
+        返回SQLite的查询计划
+
+        Args:
+            collection: 集合名称
+            options: 查询选项
+
+        Returns:
+            Dict[str, Any]: EXPLAIN QUERY PLAN 输出与返回行数
+        """
+        self._ensure_initialized()
+        if collection not in self._tables:
+            return {"collection": collection, "access": "missing", "plan": [], "rows_returned": 0}
+
+        sql, params = self._build_query(collection, options or QueryOptions(filters=[]))
+
+        def explain_query(conn: sqlite3.Connection) -> Tuple[List[str], int]:
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            returned = len(conn.execute(sql, params).fetchall())
+            return plan, returned
+
+        plan, returned = await self._run(explain_query)
+        uses_index = any("USING INDEX" in step or "USING COVERING INDEX" in step for step in plan)
+        return {
+            "collection": collection,
+            "access": "index" if uses_index else "full_scan",
+            "plan": plan,
+            "rows_scanned": None,
+            "rows_returned": returned,
+            "sort": "temp_btree" if any("TEMP B-TREE" in step for step in plan) else "index",
+        }
+
+    async def update_data(
+        self,
+        collection: str,
+        key: str,
+        data: Dict[str, Any],
+        merge: bool = True
+    ) -> bool:
+        """
+        更新数据
+
+        Args:
+            collection: 集合名称
+            key: 数据唯一标识符
+            data: 更新的数据
+            merge: 是否合并现有数据
+
+        Returns:
+            bool: 更新是否成功
+        """
+        self._ensure_initialized()
+        if collection not in self._tables:
+            return False
+
+        now = datetime.now().isoformat()
+
+        def update(conn: sqlite3.Connection) -> bool:
+            row = conn.execute(
+                f'SELECT data FROM "{collection}" WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return False
+            updated = {**json.loads(row[0]), **data} if merge else data
+            conn.execute(
+                f'UPDATE "{collection}" SET data = ?, updated_at = ? WHERE key = ?',
+                (json.dumps(updated, ensure_ascii=False), now, key)
+            )
+            return True
+
+        try:
+            updated = await self._run_write(update)
+            if updated:
+                self.logger.debug(f"数据更新成功: {collection}/{key}")
+            return updated
+
+        except Exception as e:
+            self.logger.error(f"更新数据失败: {e}")
+            return False
+
+    async def increment_data(
+        self,
+        collection: str,
+        key: str,
+        increments: Dict[str, Union[int, float]],
+        data: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        原子地增加数值字段，并在同一次写入中合并其他字段
+
+        新值由一条 UPDATE 语句在SQLite中基于当前值计算，不经过Python读改写。
+
+        Args:
+            collection: 集合名称
+            key: 数据唯一标识符
+            increments: 字段 -> 增量，缺少的字段从0开始
+            data: 同时合并写入的其他字段
+
+        Returns:
+            Optional[Dict[str, Any]]: 更新后的数据，记录不存在或更新失败时为None
+        """
+        self._ensure_initialized()
+        increment = self._increment(collection, key, increments, data)
+        if collection not in self._tables:
+            return None
+
+        try:
+            updated = await self._run_write(increment)
+            if updated is not None:
+                self.logger.debug(f"数据增量更新成功: {collection}/{key}")
+            return updated
+
+        except Exception as e:
+            self.logger.error(f"增量更新数据失败: {e}")
+            return None
+
+    async def delete_data(
+        self,
+        collection: str,
+        key: str
+    ) -> bool:
+        """
+        删除数据
+
+        Args:
+            collection: 集合名称
+            key: 数据唯一标识符
+
+        Returns:
+            bool: 删除是否成功
+        """
+        self._ensure_initialized()
+        if collection not in self._tables:
+            return False
+
+        try:
+            cursor = await self._run_write(lambda conn: conn.execute(
+                f'DELETE FROM "{collection}" WHERE key = ?', (key,)
+            ))
+            if cursor.rowcount:
+                self.logger.debug(f"数据删除成功: {collection}/{key}")
+            return cursor.rowcount > 0
+
+        except Exception as e:
+            self.logger.error(f"删除数据失败: {e}")
+            return False
+
+    async def bulk_insert(
+        self,
+        collection: str,
+        data_list: List[Dict[str, Any]],
+        keys: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        批量插入数据，全部记录在同一事务中写入
+
+        Args:
+            collection: 集合名称
+            data_list: 数据列表
+            keys: 可选的唯一键列表，与data_list一一对应
+
+        Returns:
+            List[str]: 插入数据的唯一标识符列表
+        """
+        self._ensure_initialized()
+        insert = self._insert(collection, data_list, keys)
+        await self._ensure_table(collection)
+
+        try:
+            inserted = await self._run_write(insert)
+            self.logger.debug(f"批量插入成功: {collection}, {len(inserted)}条记录")
+            return inserted
+
+        except sqlite3.IntegrityError as e:
+            raise BusinessError(f"唯一索引冲突: {e}", ErrorCode.BUSINESS_RESOURCE_CONFLICT)
+        except Exception as e:
+            self.logger.error(f"批量插入失败: {e}")
+            return []
+
+    async def insert_and_increment(
+        self,
+        collection: str,
+        data_list: List[Dict[str, Any]],
+        keys: List[str],
+        counter_collection: str,
+        counter_key: str,
+        increments: Dict[str, Union[int, float]],
+        data: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        批量插入数据，并原子地增加另一集合中一条记录的数值字段
+
+        插入与增量更新在同一个 BEGIN IMMEDIATE 事务中执行，任一失败时整体回滚。
+
+        Returns:
+            Optional[Dict[str, Any]]: 更新后的计数记录，计数记录不存在时为None
+        """
+        self._ensure_initialized()
+        insert = self._insert(collection, data_list, keys)
+        increment = self._increment(counter_collection, counter_key, increments, data)
+        await self._ensure_table(collection)
+        await self._ensure_table(counter_collection)
+
+        def transaction(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            insert(conn)
+            return increment(conn)
+
+        try:
+            updated = await self._run_write(transaction)
+            self.logger.debug(
+                f"批量插入并增量更新成功: {collection}, {len(data_list)}条记录, "
+                f"{counter_collection}/{counter_key}"
+            )
+            return updated
+
+        except sqlite3.IntegrityError as e:
+            raise BusinessError(f"唯一索引冲突: {e}", ErrorCode.BUSINESS_RESOURCE_CONFLICT)
+        except Exception as e:
+            self.logger.error(f"批量插入并增量更新失败: {e}")
+            raise SystemError(f"批量插入失败: {collection}", ErrorCode.SYSTEM_INTERNAL_ERROR)
+
+    async def get_many(
+        self,
+        collection: str,
+        keys: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        批量检索数据，按SQLite参数数量上限分批查询
+
+        Args:
+            collection: 集合名称
+            keys: 数据唯一标识符列表
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 唯一标识符 -> 数据，不存在的键不包含在结果中
+        """
+        self._ensure_initialized()
+        if collection not in self._tables or not keys:
+            return {}
+
+        def fetch(conn: sqlite3.Connection) -> Dict[str, Dict[str, Any]]:
+            found = {}
+            for chunk in _chunks(list(dict.fromkeys(keys))):
+                placeholders = ", ".join("?" for _ in chunk)
+                for key, data in conn.execute(
+                    f'SELECT key, data FROM "{collection}" WHERE key IN ({placeholders})', chunk
+                ):
+                    found[key] = json.loads(data)
+            return found
+
+        try:
+            found = await self._run(fetch)
+            return {key: found[key] for key in keys if key in found}
+
+        except Exception as e:
+            self.logger.error(f"批量检索数据失败: {e}")
+            return {}
+
+    async def update_many(
+        self,
+        collection: str,
+        updates: Dict[str, Dict[str, Any]],
+        merge: bool = True
+    ) -> int:
+        """
+        批量更新数据，全部变更在同一事务中写入
+
+        Args:
+            collection: 集合名称
+            updates: 唯一标识符 -> 更新的数据，不存在的键被忽略
+            merge: 是否合并现有数据
+
+        Returns:
+            int: 实际更新的记录数
+        """
+        self._ensure_initialized()
+        if collection not in self._tables or not updates:
+            return 0
+
+        now = datetime.now().isoformat()
+
+        def update(conn: sqlite3.Connection) -> int:
+            existing = {}
+            if merge:
+                for chunk in _chunks(list(updates)):
+                    placeholders = ", ".join("?" for _ in chunk)
+                    for key, data in conn.execute(
+                        f'SELECT key, data FROM "{collection}" WHERE key IN ({placeholders})', chunk
+                    ):
+                        existing[key] = json.loads(data)
+            rows = [
+                (json.dumps({**existing[key], **data} if merge else data, ensure_ascii=False), now, key)
+                for key, data in updates.items()
+                if not merge or key in existing
+            ]
+            cursor = conn.executemany(
+                f'UPDATE "{collection}" SET data = ?, updated_at = ? WHERE key = ?', rows
+            )
+            return cursor.rowcount
+
+        try:
+            updated = await self._run_write(update)
+            self.logger.debug(f"批量更新成功: {collection}, {updated}条记录")
+            return updated
+
+        except Exception as e:
+            self.logger.error(f"批量更新失败: {e}")
+            return 0
+
+    async def delete_many(
+        self,
+        collection: str,
+        keys: List[str]
+    ) -> int:
+        """
+        批量删除数据，全部变更在同一事务中写入
+
+        Args:
+            collection: 集合名称
+            keys: 数据唯一标识符列表，不存在的键被忽略
+
+        Returns:
+            int: 实际删除的记录数
+        """
+        self._ensure_initialized()
+        if collection not in self._tables or not keys:
+            return 0
+
+        def delete(conn: sqlite3.Connection) -> int:
+            deleted = 0
+            for chunk in _chunks(list(dict.fromkeys(keys))):
+                placeholders = ", ".join("?" for _ in chunk)
+                deleted += conn.execute(
+                    f'DELETE FROM "{collection}" WHERE key IN ({placeholders})', chunk
+                ).rowcount
+            return deleted
+
+        try:
+            deleted = await self._run_write(delete)
+            self.logger.debug(f"批量删除成功: {collection}, {deleted}条记录")
+            return deleted
+
+        except Exception as e:
+            self.logger.error(f"批量删除失败: {e}")
+            return 0
+
+    async def compact(
+        self,
+        collection: str,
+        keys: List[str]
+    ) -> Dict[str, int]:
+        """
+        压缩集合：删除记录后执行VACUUM
+
+        VACUUM 将数据库重建到临时文件后原子替换，释放删除留下的空闲页；
+        它作用于整个数据库，回收的字节数按重建前后的页数计算。
+
+        Args:
+            collection: 集合名称
+            keys: 要删除的数据唯一标识符列表，不存在的键被忽略
+
+        Returns:
+            Dict[str, int]: records 删除的记录数，bytes 回收的字节数
+        """
+        removed = await self.delete_many(collection, keys)
+
+        def vacuum(conn: sqlite3.Connection) -> int:
+            def size() -> int:
+                page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                return page_count * page_size
+
+            before = size()
+            conn.execute("VACUUM")
+            return max(0, before - size())
+
+        try:
+            reclaimed = await self._run(vacuum)
+        except Exception as e:
+            self.logger.error(f"VACUUM失败: {e}")
+            reclaimed = 0
+
+        self.logger.info(f"集合压缩完成: {collection}, 删除{removed}条记录, 回收{reclaimed}字节")
+        return {"records": removed, "bytes": reclaimed}
+
+    async def create_index(
+        self,
+        collection: str,
+        field: Union[str, List[str]],
+        unique: bool = False,
+        ordered: bool = False
+    ) -> bool:
+        """
+        在JSON字段表达式上创建B树索引
+
+        B树索引天然有序，ordered参数无需特殊处理。
+
+        Args:
+            collection: 集合名称
+            field: 字段名，传入字段列表时创建复合索引
+            unique: 是否唯一索引
+            ordered: 是否创建有序索引
+
+        Returns:
+            bool: 创建是否成功
+        """
+        self._ensure_initialized()
+        await self._ensure_table(collection)
+
+        fields = [field] if isinstance(field, str) else list(field)
+        index_name = "idx_" + collection + "_" + "_".join(
+            re.sub(r"[^A-Za-z0-9_]", "_", name) for name in fields
+        )
+        columns = ", ".join(_field_expr(name) for name in fields)
+        sql = (
+            f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{index_name}" '
+            f'ON "{collection}" ({columns})'
+        )
+
+        try:
+            await self._run_write(lambda conn: conn.execute(sql))
+            # 创建索引前已加载schema的连接不会在规划中使用新的表达式索引
+            await self._recycle_connections()
+            self.logger.debug(f"索引创建成功: {index_name}")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"创建索引失败 {index_name}: {e}")
+            return False
+
+    async def create_aggregate(
+        self,
+        collection: str,
+        name: str,
+        group_by: str,
+        fields: Optional[List[str]] = None
+    ) -> bool:
+        """
+        注册聚合视图，并在分组字段上创建B树索引
+
+        SQLite后端不另外维护聚合结果：读取时按分组值走索引执行GROUP BY，
+        代价与分组内的记录数成正比。
+
+        Args:
+            collection: 集合名称
+            name: 视图名称
+            group_by: 分组字段
+            fields: 求和与最值的字段
+
+        Returns:
+            bool: 注册是否成功
+        """
+        self._ensure_initialized()
+        await self._ensure_table(collection)
+        fields = list(fields or [])
+
+        def save(conn: sqlite3.Connection):
+            conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{_AGGREGATE_TABLE}" ('
+                'collection TEXT, name TEXT, group_by TEXT, fields TEXT, '
+                'PRIMARY KEY (collection, name))'
+            )
+            conn.execute(
+                f'INSERT OR REPLACE INTO "{_AGGREGATE_TABLE}" VALUES (?, ?, ?, ?)',
+                (collection, name, group_by, json.dumps(fields, ensure_ascii=False))
+            )
+
+        try:
+            if not await self.create_index(collection, group_by):
+                return False
+            await self._run_write(save)
+            self._aggregates[(collection, name)] = (group_by, fields)
+            return True
+
+        except Exception as e:
+            self.logger.error(f"创建聚合视图失败 {collection}.{name}: {e}")
+            return False
+
+    async def get_aggregate(
+        self,
+        collection: str,
+        name: str,
+        groups: Optional[List[Any]] = None
+    ) -> Dict[Any, Dict[str, Any]]:
+        """
+        读取聚合视图
+
+        与文件存储一致：求和只统计数值，最值在数值与字符串之间比较（数值小于字符串）。
+
+        Args:
+            collection: 集合名称
+            name: 视图名称
+            groups: 要读取的分组值，None表示全部分组
+
+        Returns:
+            Dict[Any, Dict[str, Any]]: 分组值 -> 聚合值
+        """
+        self._ensure_initialized()
+        definition = self._aggregates.get((collection, name))
+        if definition is None:
+            raise ValidationError(
+                f"聚合视图不存在: {collection}.{name}",
+                ErrorCode.VALIDATION_INVALID_FORMAT,
+                field_name="name"
+            )
+        if collection not in self._tables:
+            return {}
+
+        group_by, fields = definition
+        group_expr = _field_expr(group_by)
+        columns = [f"{group_expr}", "COUNT(*)"]
+        for field in fields:
+            expr, kind = _field_expr(field), _type_expr(field)
+            number = f"CASE WHEN {kind} IN ('integer', 'real') THEN {expr} END"
+            comparable = f"CASE WHEN {kind} IN ('integer', 'real', 'text') THEN {expr} END"
+            columns += [f"COALESCE(SUM({number}), 0)", f"MIN({comparable})", f"MAX({comparable})"]
+
+        clauses = [f"{_type_expr(group_by)} IS NOT NULL"]
+        params: List[Any] = []
+        if groups is not None:
+            if not groups:
+                return {}
+            clauses.append(f"{group_expr} IN ({', '.join('?' for _ in groups)})")
+            params = [_sql_value(group) for group in groups]
+        sql = (
+            f'SELECT {", ".join(columns)} FROM "{collection}" '
+            f'WHERE {" AND ".join(clauses)} GROUP BY {group_expr}'
+        )
+
+        rows = await self._run(lambda conn: conn.execute(sql, params).fetchall())
+        result = {}
+        for row in rows:
+            stats: Dict[str, Any] = {"count": row[1], "sum": {}, "min": {}, "max": {}}
+            for i, field in enumerate(fields):
+                total, low, high = row[2 + 3 * i:5 + 3 * i]
+                stats["sum"][field] = total
+                stats["min"][field] = low
+                stats["max"][field] = high
+            result[row[0]] = stats
+        return result
+
+    async def backup_data(
+        self,
+        backup_path: str,
+        collections: Optional[List[str]] = None
+    ) -> bool:
+        """
+        使用SQLite在线备份接口备份数据库
+
+        Args:
+            backup_path: 备份目录路径
+            collections: 要备份的集合列表，None表示全部
+
+        Returns:
+            bool: 备份是否成功
+        """
+        self._ensure_initialized()
+
+        try:
+            backup_dir = Path(backup_path)
+            backup_dir.mkdir(parents=True, exist_ok=True)
+            target_path = backup_dir / cast(Path, self.db_path).name
+
+            def backup(conn: sqlite3.Connection):
+                target = sqlite3.connect(str(target_path))
+                try:
+                    conn.backup(target)
+                    if collections is not None:
+                        # 只保留指定集合
+                        for table in self._tables - set(collections):
+                            target.execute(f'DROP TABLE IF EXISTS "{table}"')
+                        target.commit()
+                finally:
+                    target.close()
+
+            await self._run(backup)
+            self.logger.info(f"数据备份成功: {backup_path}")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"数据备份失败: {e}")
+            return False
+
+    async def restore_data(
+        self,
+        backup_path: str,
+        collections: Optional[List[str]] = None
+    ) -> bool:
+        """
+        从备份恢复数据
+
+        Args:
+            backup_path: 备份目录路径
+            collections: 要恢复的集合列表，None表示全部
+
+        Returns:
+            bool: 恢复是否成功
+        """
+        self._ensure_initialized()
+
+        try:
+            source_path = Path(backup_path) / cast(Path, self.db_path).name
+            if not source_path.exists():
+                return False
+
+            def restore(conn: sqlite3.Connection) -> List[str]:
+                if collections is None:
+                    source = sqlite3.connect(str(source_path))
+                    try:
+                        source.backup(conn)
+                    finally:
+                        source.close()
+                else:
+                    conn.execute("ATTACH DATABASE ? AS backup", (str(source_path),))
+                    try:
+                        conn.execute("BEGIN IMMEDIATE")
+                        for table in collections:
+                            if not _COLLECTION_NAME.match(table):
+                                continue
+                            conn.execute(_TABLE_SCHEMA.format(schema="main.", table=table))
+                            conn.execute(f'DELETE FROM main."{table}"')
+                            conn.execute(f'INSERT INTO main."{table}" SELECT * FROM backup."{table}"')
+                        conn.execute("COMMIT")
+                    except Exception:
+                        conn.execute("ROLLBACK")
+                        raise
+                    finally:
+                        conn.execute("DETACH DATABASE backup")
+                return [row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )]
+
+            self._tables = set(await self._run(restore)) - {_AGGREGATE_TABLE}
+            await self._load_aggregate_definitions()
+            self.logger.info(f"数据恢复成功: {backup_path}")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"数据恢复失败: {e}")
+            return False
+
+    async def get_collection_stats(
+        self,
+        collection: str
+    ) -> Dict[str, Any]:
+        """
+        获取集合统计信息，注册了聚合视图时包含视图定义与分组数
+
+        Args:
+            collection: 集合名称
+
+        Returns:
+            Dict[str, Any]: 统计信息
+        """
+        if collection not in self._tables:
+            return {"exists": False}
+
+        row = await self._run(lambda conn: conn.execute(
+            f'SELECT COUNT(*) FROM "{collection}"'
+        ).fetchone())
+        stats: Dict[str, Any] = {
+            "exists": True,
+            "count": row[0]
+        }
+
+        views = {
+            name: definition for (table, name), definition in self._aggregates.items()
+            if table == collection
+        }
+        if views:
+            stats["aggregates"] = {}
+            for name, (group_by, fields) in views.items():
+                groups = await self._run(lambda conn: conn.execute(
+                    f'SELECT COUNT(DISTINCT {_field_expr(group_by)}) FROM "{collection}"'
+                ).fetchone())
+                stats["aggregates"][name] = {
+                    "name": name, "group_by": group_by, "fields": fields, "groups": groups[0]
+                }
+        return stats
+
+    async def flush(self) -> bool:
+        """
+        持久化屏障：每次写事务提交即已写入WAL，这里将WAL合并回数据库文件
+
+        Returns:
+            bool: 持久化是否成功
+        """
+        self._ensure_initialized()
+        try:
+            await self._run(lambda conn: conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall())
+            return True
+
+        except Exception as e:
+            self.logger.error(f"WAL检查点失败: {e}")
+            return False
+
+    async def close(self) -> bool:
+        """
+        关闭连接池
+
+        Returns:
+            bool: 关闭是否成功
+        """
+        try:
+            self._initialized = False
+            self._limiter = None
+            # 取回全部连接，等待执行中的查询归还连接后再关闭
+            connections = self._connections
+            await anyio.to_thread.run_sync(lambda: [self._pool.get() for _ in connections])
+            for connection in connections:
+                connection.close()
+            self._connections = []
+            self._pool = queue.Queue()
+            self._tables.clear()
+            self._aggregates.clear()
+            self.logger.info("SQLite存储服务已关闭")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"关闭存储服务失败: {e}")
+            return False
+
+    def get_backend_type(self) -> StorageBackend:
+        """
+        获取存储后端类型
+
+        Returns:
+            StorageBackend: 后端类型
+        """
+        return StorageBackend.SQLITE
+
+    # ============ 私有方法 ============
+
+    def _ensure_initialized(self):
+        """检查服务是否已初始化"""
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
+
+    def _connect(self) -> sqlite3.Connection:
+        """创建WAL模式的连接，显式管理事务"""
+        config = self.config
+        timeout = config.timeout if config else 30
+        connection = sqlite3.connect(
+            str(self.db_path),
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(f"PRAGMA busy_timeout={int(timeout * 1000)}")
+        return connection
+
+    async def _run(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """从连接池取出连接，在线程池中执行"""
+        def call() -> T:
+            connection = self._pool.get()
+            try:
+                return fn(connection)
+            finally:
+                self._pool.put(connection)
+
+        return await anyio.to_thread.run_sync(call, limiter=self._limiter)
+
+    def _insert(
+        self,
+        collection: str,
+        data_list: List[Dict[str, Any]],
+        keys: Optional[List[str]]
+    ) -> Callable[[sqlite3.Connection], List[str]]:
+        """生成在写事务中插入（键已存在时覆盖）一批记录的函数，返回插入的键"""
+        if keys is not None and len(keys) != len(data_list):
+            raise ValidationError(
+                f"键数量({len(keys)})与数据数量({len(data_list)})不一致",
+                ErrorCode.VALIDATION_INVALID_FORMAT,
+                field_name="keys"
+            )
+
+        import uuid
+        now = datetime.now().isoformat()
+        rows = [
+            (
+                keys[i] if keys is not None else str(uuid.uuid4()),
+                json.dumps(data, ensure_ascii=False), now, now
+            )
+            for i, data in enumerate(data_list)
+        ]
+
+        def insert(conn: sqlite3.Connection) -> List[str]:
+            conn.executemany(
+                f'INSERT INTO "{collection}" (key, data, created_at, updated_at) '
+                f'VALUES (?, ?, ?, ?) '
+                f'ON CONFLICT(key) DO UPDATE SET data = excluded.data, '
+                f'created_at = excluded.created_at, updated_at = excluded.updated_at',
+                rows
+            )
+            return [row[0] for row in rows]
+
+        return insert
+
+    def _increment(
+        self,
+        collection: str,
+        key: str,
+        increments: Dict[str, Union[int, float]],
+        data: Optional[Dict[str, Any]]
+    ) -> Callable[[sqlite3.Connection], Optional[Dict[str, Any]]]:
+        """
+        生成在写事务中增量更新一条记录的函数，返回更新后的数据
+
+        新值由一条 UPDATE 语句基于当前值计算，记录不存在时返回None。
+        """
+        for field, amount in increments.items():
+            if not isinstance(amount, (int, float)) or isinstance(amount, bool):
+                raise ValidationError(
+                    f"字段不能增量更新: {field}={amount!r}",
+                    ErrorCode.VALIDATION_INVALID_FORMAT,
+                    field_name=field
+                )
+
+        assignments: List[str] = []
+        params: List[Any] = []
+        for field, value in (data or {}).items():
+            assignments.append("?, json(?)")
+            params.extend([_field_path(field), json.dumps(value, ensure_ascii=False)])
+        for field, amount in increments.items():
+            assignments.append(f"?, COALESCE({_field_expr(field)}, 0) + ?")
+            params.extend([_field_path(field), amount])
+        now = datetime.now().isoformat()
+
+        def increment(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            if assignments:
+                conn.execute(
+                    f'UPDATE "{collection}" SET data = json_set(data, {", ".join(assignments)}), '
+                    'updated_at = ? WHERE key = ?',
+                    (*params, now, key)
+                )
+            row = conn.execute(
+                f'SELECT data FROM "{collection}" WHERE key = ?', (key,)
+            ).fetchone()
+            return json.loads(row[0]) if row else None
+
+        return increment
+
+    async def _run_write(self, fn: Callable[[sqlite3.Connection], T]) -> T:
+        """在写事务中执行，失败时回滚"""
+        def transaction(connection: sqlite3.Connection) -> T:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(connection)
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            return result
+
+        return await self._run(transaction)
+
+    async def _recycle_connections(self):
+        """取回连接池中的全部连接并用新连接替换"""
+        def recycle():
+            old = [self._pool.get() for _ in self._connections]
+            self._connections = [self._connect() for _ in old]
+            for connection in old:
+                connection.close()
+            for connection in self._connections:
+                self._pool.put(connection)
+
+        # 取回连接可能需要等待其他查询归还，不占用查询线程池
+        await anyio.to_thread.run_sync(recycle)
+
+    async def _load_aggregate_definitions(self):
+        """读取已注册的聚合视图定义"""
+        def load(conn: sqlite3.Connection) -> List[Tuple[str, str, str, str]]:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (_AGGREGATE_TABLE,)
+            ).fetchone()
+            if not exists:
+                return []
+            return conn.execute(
+                f'SELECT collection, name, group_by, fields FROM "{_AGGREGATE_TABLE}"'
+            ).fetchall()
+
+        self._aggregates = {
+            (collection, name): (group_by, json.loads(fields))
+            for collection, name, group_by, fields in await self._run(load)
+        }
+
+    async def _ensure_table(self, collection: str):
+        """集合对应的表不存在时创建"""
+        if collection in self._tables:
+            return
+        if not _COLLECTION_NAME.match(collection):
+            raise ValidationError(
+                f"集合名称不合法: {collection}",
+                ErrorCode.VALIDATION_INVALID_FORMAT,
+                field_name="collection"
+            )
+
+        await self._run(lambda conn: conn.execute(
+            _TABLE_SCHEMA.format(schema="", table=collection)
+        ))
+        self._tables.add(collection)
+
+    def _build_query(self, collection: str, options: QueryOptions) -> Tuple[str, List[Any]]:
+        """将查询选项编译为参数化SQL"""
+        clauses, params = self._build_where(options)
+
+        sql = f'SELECT {_data_expr(options.fields)} FROM "{collection}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if options.sort_by:
+            direction = "DESC" if options.sort_order == "desc" else "ASC"
+            sql += f" ORDER BY {_field_expr(options.sort_by)} {direction}"
+        if options.limit:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([options.limit, options.offset or 0])
+        elif options.offset:
+            sql += " LIMIT -1 OFFSET ?"
+            params.append(options.offset)
+
+        return sql, params
+
+    def _build_where(self, options: QueryOptions) -> Tuple[List[str], List[Any]]:
+        """编译全部过滤条件"""
+        clauses = []
+        params: List[Any] = []
+        for f in options.filters or []:
+            clause, values = self._build_filter(f)
+            clauses.append(clause)
+            params.extend(values)
+        return clauses, params
+
+    def _build_keyset_query(
+        self,
+        collection: str,
+        options: QueryOptions,
+        after: Optional[Tuple[Any, str]],
+        limit: int,
+        offset: int
+    ) -> Tuple[str, List[Any]]:
+        """
+        编译键集分页SQL：按 (排序字段, key) 排序，从续读位置之后取 limit 行
+
+        SQLite中NULL小于任何值，升序时排在最前、降序时排在最后，续读条件与之一致。
+        """
+        clauses, params = self._build_where(options)
+        descending = options.sort_order == "desc"
+        direction = "DESC" if descending else "ASC"
+        expr = _field_expr(options.sort_by) if options.sort_by else None
+
+        if after is not None:
+            value, key = after
+            compare = "<" if descending else ">"
+            if expr is None:
+                clauses.append(f"key {compare} ?")
+                params.append(key)
+            elif value is None and descending:
+                clauses.append(f"({expr} IS NULL AND key < ?)")
+                params.append(key)
+            elif value is None:
+                clauses.append(f"({expr} IS NOT NULL OR key > ?)")
+                params.append(key)
+            else:
+                clause = f"({expr} {compare} ? OR ({expr} = ? AND key {compare} ?)"
+                clauses.append(clause + (f" OR {expr} IS NULL)" if descending else ")"))
+                params.extend([value, value, key])
+
+        sql = f'SELECT key, {expr or "NULL"}, {_data_expr(options.fields)} FROM "{collection}"'
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        order = f"{expr} {direction}, " if expr else ""
+        sql += f" ORDER BY {order}key {direction} LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        return sql, params
+
+    def _build_filter(self, f: QueryFilter) -> Tuple[str, List[Any]]:
+        """编译单个过滤条件"""
+        expr = _field_expr(f.field)
+
+        if f.operator == "eq" and f.value is None:
+            return f"{expr} IS NULL", []
+        if f.operator == "in":
+            values = [_sql_value(v) for v in f.value]
+            if not values:
+                return "0", []
+            return f"{expr} IN ({', '.join('?' for _ in values)})", values
+        if f.operator in _SQL_OPERATORS:
+            return f"{expr} {_SQL_OPERATORS[f.operator]} ?", [_sql_value(f.value)]
+
+        raise ValidationError(
+            f"不支持的查询操作符: {f.operator}，可用操作符: {', '.join(SUPPORTED_OPERATORS)}",
+            ErrorCode.VALIDATION_INVALID_FORMAT,
+            field_name=f.field
+        )
+
@@ -0,0 +1,191 @@
+"""
+增量聚合视图
+按分组字段维护 记录数/求和/最小值/最大值，在记录写入、更新、删除时增量更新，
+按组读取的代价与集合大小无关
+"""
+
+import bisect
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+from .storage_index import index_value, sort_key
+
+
+class GroupStats:
+    """
+    一个分组的聚合值
+
+    求和只统计数值字段（不含布尔值）；最小/最大值在数值与字符串之间按
+    sort_key 的全序比较，每个字段保存有序的值列表，删除当前最值后无需重新扫描。
+    """
+
+    def __init__(self, fields: List[str]):
+        self.count = 0
+        self.sums: Dict[str, Any] = {field: 0 for field in fields}
+        self._values: Dict[str, List[Tuple[Any, ...]]] = {field: [] for field in fields}
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """将记录计入分组"""
+        self.count += 1
+        for field, values in self._values.items():
+            value = record.get(field)
+            if _is_number(value):
+                self.sums[field] += value
+            if _is_comparable(value):
+                bisect.insort(values, sort_key(value))
+
+    def remove(self, record: Dict[str, Any]) -> None:
+        """将记录移出分组"""
+        self.count -= 1
+        for field, values in self._values.items():
+            value = record.get(field)
+            if _is_number(value):
+                self.sums[field] -= value
+            if _is_comparable(value):
+                key = sort_key(value)
+                i = bisect.bisect_left(values, key)
+                if i < len(values) and values[i] == key:
+                    del values[i]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """聚合值: count, sum/min/max 为 字段 -> 值，没有可比较值的字段最值为None"""
+        return {
+            "count": self.count,
+            "sum": dict(self.sums),
+            "min": {field: values[0][1] if values else None for field, values in self._values.items()},
+            "max": {field: values[-1][1] if values else None for field, values in self._values.items()},
+        }
+
+
+class AggregateView:
+    """
+    按字段分组的聚合视图
+    缺少分组字段的记录不计入任何分组
+    """
+
+    def __init__(self, name: str, group_by: str, fields: Optional[List[str]] = None):
+        self.name = name
+        self.group_by = group_by
+        self.fields = list(fields or [])
+        self._groups: Dict[Any, GroupStats] = {}
+        self._labels: Dict[Any, Any] = {}  # 索引键 -> 原始分组值
+
+    def build(self, records: Iterable[Dict[str, Any]]) -> None:
+        """根据集合全部记录重建视图"""
+        self._groups.clear()
+        self._labels.clear()
+        for record in records:
+            self.add(record)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """将记录计入视图"""
+        if self.group_by not in record:
+            return
+        value = record[self.group_by]
+        group = index_value(value)
+        stats = self._groups.get(group)
+        if stats is None:
+            stats = self._groups[group] = GroupStats(self.fields)
+            self._labels[group] = value
+        stats.add(record)
+
+    def remove(self, record: Dict[str, Any]) -> None:
+        """将记录移出视图，分组为空时删除分组"""
+        if self.group_by not in record:
+            return
+        group = index_value(record[self.group_by])
+        stats = self._groups.get(group)
+        if stats is None:
+            return
+        stats.remove(record)
+        if stats.count <= 0:
+            del self._groups[group]
+            del self._labels[group]
+
+    def update(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """用新记录替换旧记录的聚合值"""
+        if old is not None:
+            self.remove(old)
+        if new is not None:
+            self.add(new)
+
+    def get(self, group: Any) -> Optional[Dict[str, Any]]:
+        """读取一个分组的聚合值，分组不存在时为None"""
+        stats = self._groups.get(index_value(group))
+        return stats.to_dict() if stats else None
+
+    def groups(self) -> Dict[Any, Dict[str, Any]]:
+        """全部分组的聚合值: 分组值 -> 聚合值"""
+        return {self._labels[group]: stats.to_dict() for group, stats in self._groups.items()}
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    def describe(self) -> Dict[str, Any]:
+        """视图定义，用于持久化"""
+        return {"name": self.name, "group_by": self.group_by, "fields": self.fields}
+
+
+class CollectionAggregates:
+    """
+    单个集合的聚合视图集合
+
+    视图只在 ready 时随写入增量维护；启动、恢复或合并其他进程的写入后
+    调用 invalidate，下一次读取前由存储服务从全部记录重建。
+    """
+
+    def __init__(self):
+        self.views: Dict[str, AggregateView] = {}
+        self.ready = False
+        self.epoch = 0  # 每次失效递增，重建期间失效过的结果不能标记为就绪
+
+    def __bool__(self) -> bool:
+        return bool(self.views)
+
+    def invalidate(self) -> None:
+        """标记视图需要重建"""
+        self.ready = False
+        self.epoch += 1
+
+    def reset(self) -> None:
+        """清空全部视图，开始重建"""
+        for view in self.views.values():
+            view.build(())
+
+    def include(self, records: Iterable[Dict[str, Any]]) -> None:
+        """重建时计入一批记录"""
+        views = list(self.views.values())
+        for record in records:
+            for view in views:
+                view.add(record)
+
+    def mark_built(self, epoch: int) -> None:
+        """
+        全部记录计入后标记重建完成
+
+        Args:
+            epoch: 开始读取记录时的 epoch，之后又失效过时保持未就绪
+        """
+        self.ready = epoch == self.epoch
+
+    def update(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> None:
+        """记录变更时维护全部视图，未就绪时跳过"""
+        if not self.ready:
+            return
+        for view in self.views.values():
+            view.update(old, new)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """全部视图定义"""
+        return [view.describe() for view in self.views.values()]
+
+
+# ============ 私有函数 ============
+
+def _is_number(value: Any) -> bool:
+    """是否计入求和的数值"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_comparable(value: Any) -> bool:
+    """是否参与最小/最大值比较"""
+    return _is_number(value) or isinstance(value, str)
@@ -0,0 +1,196 @@
+"""
+增量备份
+每次备份都是一个可以单独恢复的完整目录；数据目录中的文件总是整体替换写入（从不原地修改），
+因此未变化的文件以硬链接与数据目录及之前的备份共享，只有变化的文件占用新的空间
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+from .storage_format import MANIFEST_FILE, split_record_file_name
+
+# 备份清单文件（不使用.json后缀，避免被当作集合恢复），存在清单的目录才是完整的备份
+BACKUP_MANIFEST = "backup.meta"
+
+
+def new_backup_dir(root: Path) -> Path:
+    """在备份根目录下创建以时间命名的备份目录，名称按时间顺序排序"""
+    name = datetime.now().strftime("%Y%m%dT%H%M%S_%f")
+    backup_dir = root / name
+    suffix = 0
+    while backup_dir.exists():
+        suffix += 1
+        backup_dir = root / f"{name}_{suffix}"
+    backup_dir.mkdir(parents=True)
+    return backup_dir
+
+
+def list_backups(root: Path) -> List[Path]:
+    """备份根目录下全部已完成的备份，从旧到新"""
+    if not root.exists():
+        return []
+    return sorted(
+        path for path in root.iterdir()
+        if path.is_dir() and (path / BACKUP_MANIFEST).exists()
+    )
+
+
+def latest_backup(root: Path) -> Optional[Path]:
+    """最新的已完成备份"""
+    backups = list_backups(root)
+    return backups[-1] if backups else None
+
+
+def backup_schedule_base(root: Path) -> float:
+    """
+    定时备份的计时起点：最新的已完成备份的完成时间
+
+    还没有备份时为备份根目录的创建时间（根目录不存在时在这里创建），
+    因此运行时间短于备份间隔的多个进程也会在间隔到达后备份。
+    """
+    latest = latest_backup(root)
+    if latest is not None:
+        return (latest / BACKUP_MANIFEST).stat().st_mtime
+    root.mkdir(parents=True, exist_ok=True)
+    return root.stat().st_mtime
+
+
+def link_or_copy(source: Path, target: Path, previous: Optional[Path] = None) -> int:
+    """
+    以硬链接备份文件，不支持硬链接时（如跨文件系统）复制
+
+    复制时若上一次备份中的同名文件与源文件大小和修改时间相同，则链接上一次的备份。
+
+    Args:
+        source: 源文件
+        target: 目标路径，已存在时被替换
+        previous: 上一次备份中的对应文件
+
+    Returns:
+        int: 实际复制的字节数，链接时为0
+    """
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+        return 0
+    except OSError:
+        pass
+
+    if previous is not None and previous.exists():
+        source_stat, previous_stat = source.stat(), previous.stat()
+        if (source_stat.st_size, source_stat.st_mtime_ns) == (
+            previous_stat.st_size, previous_stat.st_mtime_ns
+        ):
+            try:
+                os.link(previous, target)
+                return 0
+            except OSError:
+                pass
+
+    shutil.copy2(source, target)
+    return source.stat().st_size
+
+
+def link_directory(source_dir: Path, target_dir: Path, previous_dir: Optional[Path] = None) -> int:
+    """
+    备份分区目录中的段文件与清单，目标目录中的旧文件被清除
+
+    Returns:
+        int: 实际复制的字节数
+    """
+    if target_dir.exists():
+        shutil.rmtree(target_dir)
+    target_dir.mkdir(parents=True)
+    copied = 0
+    for path in sorted(source_dir.iterdir()):
+        if not path.is_file():
+            continue
+        if path.name != MANIFEST_FILE and split_record_file_name(path.name) is None:
+            continue
+        copied += link_or_copy(
+            path, target_dir / path.name,
+            previous_dir / path.name if previous_dir else None
+        )
+    return copied
+
+
+def sync_file(source: Path, target: Path, link: bool = True) -> bool:
+    """
+    恢复单个文件：目标已经是同一个文件时跳过
+
+    Args:
+        source: 备份中的文件
+        target: 数据目录中的文件
+        link: 是否允许硬链接；会被原地追加的文件（如日志）必须复制，避免修改备份
+
+    Returns:
+        bool: 目标文件是否被替换
+    """
+    if target.exists() and os.path.samefile(source, target):
+        return False
+    if link:
+        link_or_copy(source, target)
+    else:
+        target.unlink(missing_ok=True)
+        shutil.copy2(source, target)
+    return True
+
+
+def sync_directory(source_dir: Path, target_dir: Path) -> bool:
+    """
+    恢复分区目录：只替换与备份不同的文件，并删除备份中没有的文件
+
+    Returns:
+        bool: 目录内容是否有变化
+    """
+    target_dir.mkdir(parents=True, exist_ok=True)
+    names = set()
+    changed = False
+    for path in sorted(source_dir.iterdir()):
+        if path.is_file():
+            names.add(path.name)
+            changed = sync_file(path, target_dir / path.name) or changed
+    for path in sorted(target_dir.iterdir()):
+        if path.is_file() and path.name not in names:
+            path.unlink()
+            changed = True
+    return changed
+
+
+def write_backup_manifest(backup_dir: Path, manifest: Dict[str, Any]) -> None:
+    """写入备份清单，写入后备份才被视为完成"""
+    tmp_path = backup_dir / f"{BACKUP_MANIFEST}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, backup_dir / BACKUP_MANIFEST)
+
+
+def read_backup_manifest(backup_dir: Path) -> Dict[str, Any]:
+    """读取备份清单，不存在时为空"""
+    path = backup_dir / BACKUP_MANIFEST
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def prune_backups(root: Path, keep: int) -> List[Path]:
+    """
+    删除最旧的备份，只保留最新的 keep 个
+
+    共享的文件由硬链接计数，删除旧备份不影响之后的备份。
+
+    Returns:
+        List[Path]: 被删除的备份目录
+    """
+    backups = list_backups(root)
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        shutil.rmtree(path, ignore_errors=True)
+    return removed
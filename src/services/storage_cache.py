@@ -0,0 +1,156 @@
+"""
+查询结果缓存
+按 (集合, 规范化的查询条件) 缓存匹配的记录，写入只失效条件与新旧记录之一匹配的缓存项
+"""
+
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Set, Tuple
+
+from contracts.storage_service import QueryOptions
+from .storage_index import index_value
+from .storage_query import Predicate, compile_predicate
+
+
+CacheKey = Tuple[str, str, Optional[str], str, Optional[int], int]
+
+
+@dataclass
+class _CacheEntry:
+    """缓存项：查询命中的存储原始记录（投影前）"""
+    collection: str
+    predicate: Predicate
+    bucket: Optional[Tuple[str, Any]]  # 用于失效查找的等值条件 (字段, 索引值)
+    records: List[Dict[str, Any]]
+
+
+class QueryCache:
+    """
+    查询结果的LRU缓存
+
+    缓存项保存存储中的原始记录引用。记录被修改时总是整体替换，
+    而修改一条命中的记录必然使旧记录满足条件、失效该缓存项，
+    因此未失效的缓存项中的记录总是当前值，命中时只需按查询选项投影。
+    字段投影与只读选项不影响命中的记录，不参与缓存键。
+
+    带等值条件的缓存项按 (字段, 值) 登记，写入时只检查与新旧记录的字段值相同的项。
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[CacheKey, _CacheEntry]" = OrderedDict()
+        self._buckets: Dict[str, Dict[str, Dict[Any, Set[CacheKey]]]] = {}  # 集合 -> 字段 -> 值 -> 缓存键
+        self._unbucketed: Dict[str, Set[CacheKey]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def get(self, collection: str, options: QueryOptions) -> Optional[List[Dict[str, Any]]]:
+        """
+        读取缓存的查询结果
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: 命中时为存储中的原始记录，未命中为None
+        """
+        key = _cache_key(collection, options)
+        entry = self._entries.get(key)
+        counters = self._counters.setdefault(collection, {"hits": 0, "misses": 0})
+        if entry is None:
+            counters["misses"] += 1
+            return None
+        counters["hits"] += 1
+        self._entries.move_to_end(key)
+        return entry.records
+
+    def put(self, collection: str, options: QueryOptions, records: List[Dict[str, Any]]) -> None:
+        """缓存查询结果，超出条目上限时淘汰最久未使用的项"""
+        if self.max_entries <= 0:
+            return
+        key = _cache_key(collection, options)
+        self._discard(key)
+
+        bucket = next(
+            ((f.field, index_value(f.value)) for f in options.filters or [] if f.operator == "eq"),
+            None
+        )
+        self._entries[key] = _CacheEntry(
+            collection, compile_predicate(options.filters or []), bucket, list(records)
+        )
+        if bucket is None:
+            self._unbucketed.setdefault(collection, set()).add(key)
+        else:
+            field, value = bucket
+            fields = self._buckets.setdefault(collection, {})
+            fields.setdefault(field, {}).setdefault(value, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    def invalidate(
+        self,
+        collection: str,
+        old: Optional[Dict[str, Any]],
+        new: Optional[Dict[str, Any]]
+    ) -> None:
+        """
+        记录变更时失效条件与新记录或旧记录匹配的缓存项
+
+        Args:
+            collection: 集合名称
+            old: 旧记录，新增时为None
+            new: 新记录，删除时为None
+        """
+        changed = [record for record in (old, new) if record is not None]
+        candidates = set(self._unbucketed.get(collection, ()))
+        for field, values in self._buckets.get(collection, {}).items():
+            for record in changed:
+                candidates.update(values.get(index_value(record.get(field)), ()))
+
+        for key in candidates:
+            entry = self._entries.get(key)
+            if entry is not None and any(entry.predicate(record) for record in changed):
+                self._discard(key)
+
+    def clear(self, collection: Optional[str] = None) -> None:
+        """清空一个集合或全部的缓存项，命中统计保留"""
+        for key in [key for key in self._entries if collection is None or key[0] == collection]:
+            self._discard(key)
+
+    def stats(self, collection: str) -> Dict[str, int]:
+        """集合的命中统计与缓存项数"""
+        counters = self._counters.get(collection, {"hits": 0, "misses": 0})
+        return {
+            **counters,
+            "entries": sum(1 for key in self._entries if key[0] == collection),
+        }
+
+    def _discard(self, key: CacheKey) -> None:
+        """删除缓存项及其失效登记"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        if entry.bucket is None:
+            self._unbucketed.get(entry.collection, set()).discard(key)
+            return
+        field, value = entry.bucket
+        values = self._buckets[entry.collection][field]
+        values[value].discard(key)
+        if not values[value]:
+            del values[value]
+
+
+# ============ 私有函数 ============
+
+def _cache_key(collection: str, options: QueryOptions) -> CacheKey:
+    """规范化的缓存键：过滤条件与顺序无关，值按JSON文本区分类型"""
+    filters = sorted(
+        json.dumps([f.field, f.operator, f.value], sort_keys=True, ensure_ascii=False, default=str)
+        for f in options.filters or []
+    )
+    return (
+        collection,
+        json.dumps(filters, ensure_ascii=False),
+        options.sort_by,
+        options.sort_order,
+        options.limit,
+        options.offset or 0,
+    )
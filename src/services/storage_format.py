@@ -0,0 +1,201 @@
+"""
+集合文件格式
+支持缩进JSON（兼容旧版本）与紧凑的JSON Lines两种格式，均可选 zlib/lzma 压缩；
+读取时按文件后缀识别格式，写入新格式后删除同名的旧格式文件
+"""
+
+import json
+import lzma
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, Optional, Any, Tuple
+
+
+# 文件格式
+FORMAT_JSON = "json"
+FORMAT_JSONL = "jsonl"
+
+# 压缩算法
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_LZMA = "lzma"
+
+FILE_FORMATS = {FORMAT_JSON: ".json", FORMAT_JSONL: ".jsonl"}
+COMPRESSIONS = {None: "", COMPRESSION_ZLIB: ".z", COMPRESSION_LZMA: ".xz"}
+
+# 分区清单文件，不属于数据文件
+MANIFEST_FILE = "manifest.json"
+
+# 全部数据文件后缀，长后缀在前，避免 .jsonl 被识别为 .json
+DATA_SUFFIXES = sorted(
+    (format_suffix + compression_suffix
+     for format_suffix in FILE_FORMATS.values()
+     for compression_suffix in COMPRESSIONS.values()),
+    key=len,
+    reverse=True
+)
+
+
+class RecordFileFormat:
+    """
+    集合文件的写入格式
+
+    JSON Lines 每行是一个 [记录键, 记录] 数组，记录为null表示删除，
+    同一个键以最后一行为准，因此文件可以直接追加和流式读取。
+    """
+
+    def __init__(self, file_format: str = FORMAT_JSON, compression: Optional[str] = None):
+        self.file_format = file_format
+        self.compression = compression
+
+    @property
+    def suffix(self) -> str:
+        """写入文件的后缀"""
+        return FILE_FORMATS[self.file_format] + COMPRESSIONS[self.compression]
+
+    def encode(self, records: Dict[str, Any]) -> bytes:
+        """按格式编码并压缩全部记录"""
+        if self.file_format == FORMAT_JSONL:
+            text = "".join(
+                json.dumps([key, record], ensure_ascii=False, separators=(",", ":")) + "\n"
+                for key, record in records.items()
+            )
+        else:
+            text = json.dumps(records, ensure_ascii=False, indent=2)
+        return _compress(text.encode("utf-8"), self.compression)
+
+    def write(self, directory: Path, name: str, records: Dict[str, Any]) -> int:
+        """
+        原子地写入记录文件，并删除同名的其他格式文件
+
+        Args:
+            directory: 所在目录
+            name: 集合名或段名
+            records: 记录键 -> 记录
+
+        Returns:
+            int: 写入的字节数
+        """
+        data = self.encode(records)
+        path = directory / f"{name}{self.suffix}"
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        remove_record_files(directory, name, keep=self.suffix)
+        return len(data)
+
+
+def split_record_file_name(file_name: str) -> Optional[Tuple[str, str]]:
+    """拆分数据文件名为 (名称, 后缀)，不是数据文件时返回None"""
+    for suffix in DATA_SUFFIXES:
+        if file_name.endswith(suffix) and len(file_name) > len(suffix):
+            return file_name[:-len(suffix)], suffix
+    return None
+
+
+def find_record_file(directory: Path, name: str) -> Optional[Path]:
+    """查找名称对应的数据文件，任意格式"""
+    for suffix in DATA_SUFFIXES:
+        path = directory / f"{name}{suffix}"
+        if path.exists():
+            return path
+    return None
+
+
+def list_record_files(directory: Path) -> Dict[str, Path]:
+    """目录中的全部数据文件：名称 -> 路径"""
+    files: Dict[str, Path] = {}
+    for path in sorted(directory.iterdir()) if directory.exists() else []:
+        parsed = split_record_file_name(path.name)
+        if parsed and path.is_file():
+            files.setdefault(parsed[0], path)
+    return files
+
+
+def remove_record_files(directory: Path, name: str, keep: Optional[str] = None) -> None:
+    """删除名称对应的数据文件，keep 指定保留的后缀"""
+    for suffix in DATA_SUFFIXES:
+        if suffix != keep:
+            (directory / f"{name}{suffix}").unlink(missing_ok=True)
+
+
+def read_records(path: Path) -> Dict[str, Any]:
+    """
+    读取数据文件，按后缀识别格式与压缩算法
+
+    Returns:
+        Dict[str, Any]: 记录键 -> 记录
+    """
+    parsed = split_record_file_name(path.name)
+    if parsed is None:
+        raise ValueError(f"不是数据文件: {path}")
+    suffix = parsed[1]
+
+    with open(path, "rb") as f:
+        data = f.read()
+    for compression, compression_suffix in COMPRESSIONS.items():
+        if compression and suffix.endswith(compression_suffix):
+            data = _decompress(data, compression)
+            suffix = suffix[:-len(compression_suffix)]
+            break
+
+    text = data.decode("utf-8")
+    if suffix != FILE_FORMATS[FORMAT_JSONL]:
+        return json.loads(text)
+
+    # 整个文件作为一个数组解析，避免逐行调用解析器
+    lines = [line for line in text.splitlines() if line.strip()]
+    records: Dict[str, Any] = {}
+    for key, record in json.loads("[" + ",".join(lines) + "]"):
+        if record is None:
+            records.pop(key, None)
+        else:
+            records[key] = record
+    return records
+
+
+def convert_directory(data_dir: Path, target: RecordFileFormat) -> int:
+    """
+    将数据目录中的集合文件与分区段文件转换为目标格式
+
+    应在存储服务停止时运行；日志文件与清单不受影响。
+
+    Args:
+        data_dir: 数据目录
+        target: 目标格式
+
+    Returns:
+        int: 转换的文件数
+    """
+    converted = 0
+    directories = [data_dir] + sorted(
+        path.parent for path in data_dir.glob(f"*/{MANIFEST_FILE}")
+    )
+    for directory in directories:
+        for name, path in list_record_files(directory).items():
+            if path.name in (f"{name}{target.suffix}", MANIFEST_FILE):
+                continue
+            target.write(directory, name, read_records(path))
+            converted += 1
+    return converted
+
+
+# ============ 私有函数 ============
+
+def _compress(data: bytes, compression: Optional[str]) -> bytes:
+    """按算法压缩"""
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(data)
+    if compression == COMPRESSION_LZMA:
+        return lzma.compress(data)
+    return data
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    """按算法解压"""
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    return lzma.decompress(data)
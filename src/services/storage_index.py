@@ -0,0 +1,395 @@
+"""
+存储索引实现
+为基于内存集合的存储服务提供二级索引
+"""
+
+import bisect
+import json
+from typing import Dict, List, Optional, Any, Iterable, Iterator, Tuple, Collection
+
+from core.errors import BusinessError, ErrorCode
+
+
+# 字段缺失标记
+_MISSING = object()
+
+# 排序键中高于任何字段值的上界，用于前缀范围查找
+_MAX_SORT_KEY = (9,)
+
+
+def index_value(value: Any) -> Any:
+    """
+    将字段值转换为可哈希的索引键
+
+    列表、字典等不可哈希的值按规范化JSON文本索引。
+    """
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def sort_key(value: Any) -> Tuple[Any, ...]:
+    """
+    将字段值转换为全序排序键
+
+    不同类型的值不能直接比较，先按类型分组: None < 布尔/数值 < 字符串 < 其他，
+    组内按值排序，其他类型按规范化JSON文本排序。
+    """
+    if value is None:
+        return (0,)
+    if isinstance(value, (bool, int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return (3, json.dumps(value, sort_keys=True, ensure_ascii=False, default=str))
+
+
+class HashIndex:
+    """
+    等值哈希索引
+    维护 字段值 -> 记录键集合 的映射，等值查找代价与结果集大小成正比
+    
+    记录键集合用字典保存，以保持记录加入索引的顺序。
+    """
+
+    kind = "hash"
+
+    def __init__(self, field: str, unique: bool = False):
+        self.field = field
+        self.unique = unique
+        self._entries: Dict[Any, Dict[str, None]] = {}
+
+    def build(self, records: Dict[str, Dict[str, Any]]) -> None:
+        """根据集合全部记录重建索引"""
+        self._entries.clear()
+        for key, record in records.items():
+            self.check(key, record)
+            self.add(key, record)
+
+    def check(self, key: str, record: Dict[str, Any]) -> None:
+        """检查写入是否违反唯一约束"""
+        if not self.unique or self.field not in record:
+            return
+        holders = self._entries.get(index_value(record[self.field]))
+        if holders and (len(holders) > 1 or key not in holders):
+            raise BusinessError(
+                f"唯一索引冲突: {self.field}={record[self.field]!r}",
+                ErrorCode.BUSINESS_RESOURCE_CONFLICT
+            )
+
+    def add(self, key: str, record: Dict[str, Any]) -> None:
+        """将记录加入索引"""
+        if self.field not in record:
+            return
+        self._entries.setdefault(index_value(record[self.field]), {})[key] = None
+
+    def remove(self, key: str, record: Dict[str, Any]) -> None:
+        """将记录移出索引"""
+        if self.field not in record:
+            return
+        value = index_value(record[self.field])
+        holders = self._entries.get(value)
+        if holders is None:
+            return
+        holders.pop(key, None)
+        if not holders:
+            del self._entries[value]
+
+    def update(
+        self,
+        key: str,
+        old: Optional[Dict[str, Any]],
+        new: Optional[Dict[str, Any]]
+    ) -> None:
+        """用新记录替换旧记录的索引项，字段值未变化时不做修改"""
+        if old is not None and new is not None:
+            old_value = index_value(old.get(self.field, _MISSING))
+            if old_value == index_value(new.get(self.field, _MISSING)):
+                return
+        if old is not None:
+            self.remove(key, old)
+        if new is not None:
+            self.add(key, new)
+
+    def lookup(self, value: Any) -> Collection[str]:
+        """等值查找，返回匹配的记录键集合（只读）"""
+        return self._entries.get(index_value(value), {}).keys()
+
+    @property
+    def name(self) -> str:
+        """索引名称"""
+        return f"hash({self.field})"
+
+    def describe(self) -> Dict[str, Any]:
+        """索引定义，用于持久化"""
+        return {"field": self.field, "unique": self.unique, "kind": self.kind}
+
+
+class OrderedIndex:
+    """
+    有序（复合）索引
+    按字段元组排序保存记录键，支持等值前缀上的有序范围遍历，
+    带排序与数量限制的查询只需遍历结果所在的区间
+    """
+
+    kind = "ordered"
+
+    def __init__(self, fields: List[str], unique: bool = False):
+        self.fields = list(fields)
+        self.unique = unique
+        self._entries: List[Tuple[Tuple[Any, ...], str]] = []
+
+    def _entry(self, key: str, record: Dict[str, Any]) -> Tuple[Tuple[Any, ...], str]:
+        """构造索引项: (各字段排序键, 记录键)"""
+        return tuple(sort_key(record.get(field)) for field in self.fields), key
+
+    def build(self, records: Dict[str, Dict[str, Any]]) -> None:
+        """根据集合全部记录重建索引"""
+        self._entries = sorted(self._entry(key, record) for key, record in records.items())
+        if self.unique:
+            for previous, current in zip(self._entries, self._entries[1:]):
+                if previous[0] == current[0]:
+                    raise BusinessError(
+                        f"唯一索引冲突: {self.fields}",
+                        ErrorCode.BUSINESS_RESOURCE_CONFLICT
+                    )
+
+    def check(self, key: str, record: Dict[str, Any]) -> None:
+        """检查写入是否违反唯一约束"""
+        if not self.unique:
+            return
+        values, _ = self._entry(key, record)
+        lo, hi = self._range(values)
+        if any(self._entries[i][1] != key for i in range(lo, hi)):
+            raise BusinessError(
+                f"唯一索引冲突: {self.fields}",
+                ErrorCode.BUSINESS_RESOURCE_CONFLICT
+            )
+
+    def add(self, key: str, record: Dict[str, Any]) -> None:
+        """将记录加入索引"""
+        bisect.insort(self._entries, self._entry(key, record))
+
+    def remove(self, key: str, record: Dict[str, Any]) -> None:
+        """将记录移出索引"""
+        entry = self._entry(key, record)
+        i = bisect.bisect_left(self._entries, entry)
+        if i < len(self._entries) and self._entries[i] == entry:
+            del self._entries[i]
+
+    def update(
+        self,
+        key: str,
+        old: Optional[Dict[str, Any]],
+        new: Optional[Dict[str, Any]]
+    ) -> None:
+        """用新记录替换旧记录的索引项，字段值未变化时不做修改"""
+        if old is not None and new is not None:
+            if self._entry(key, old) == self._entry(key, new):
+                return
+        if old is not None:
+            self.remove(key, old)
+        if new is not None:
+            self.add(key, new)
+
+    def _range(self, prefix: Tuple[Any, ...]) -> Tuple[int, int]:
+        """等值前缀对应的索引区间 [lo, hi)"""
+        lo = bisect.bisect_left(self._entries, (prefix,))
+        hi = bisect.bisect_left(self._entries, (prefix + (_MAX_SORT_KEY,),), lo)
+        return lo, hi
+
+    def bounds(
+        self,
+        values: Iterable[Any],
+        lower: Optional[Tuple[Any, bool]] = None,
+        upper: Optional[Tuple[Any, bool]] = None
+    ) -> Tuple[int, int]:
+        """
+        计算 等值前缀 + 下一字段范围 对应的索引区间 [lo, hi)
+
+        范围比较只在同类型值之间进行，区间限制在边界值的类型分组内。
+
+        Args:
+            values: 前导字段的等值条件
+            lower: 下一字段的下界 (值, 是否包含)
+            upper: 下一字段的上界 (值, 是否包含)
+        """
+        prefix = tuple(sort_key(v) for v in values)
+        if lower is None and upper is None:
+            return self._range(prefix)
+
+        low_key = sort_key(lower[0]) if lower else None
+        high_key = sort_key(upper[0]) if upper else None
+        if low_key and high_key and low_key[0] != high_key[0]:
+            return 0, 0
+        rank = (low_key or high_key)[0]
+
+        if low_key is None:
+            lo = bisect.bisect_left(self._entries, (prefix + ((rank,),),))
+        elif lower[1]:
+            lo = bisect.bisect_left(self._entries, (prefix + (low_key,),))
+        else:
+            lo = bisect.bisect_left(self._entries, (prefix + (low_key, _MAX_SORT_KEY),))
+
+        if high_key is None:
+            hi = bisect.bisect_left(self._entries, (prefix + ((rank + 1,),),), lo)
+        elif upper[1]:
+            hi = bisect.bisect_left(self._entries, (prefix + (high_key, _MAX_SORT_KEY),), lo)
+        else:
+            hi = bisect.bisect_left(self._entries, (prefix + (high_key,),), lo)
+        return lo, max(lo, hi)
+
+    def scan(self, lo: int, hi: int, descending: bool = False) -> Iterator[str]:
+        """按索引顺序遍历区间 [lo, hi) 内的记录键"""
+        positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+        for i in positions:
+            yield self._entries[i][1]
+
+    def count_prefix(self, values: Iterable[Any]) -> int:
+        """等值前缀匹配的记录数"""
+        lo, hi = self.bounds(values)
+        return hi - lo
+
+    def scan_prefix(self, values: Iterable[Any], descending: bool = False) -> Iterator[str]:
+        """
+        按索引顺序遍历等值前缀匹配的记录键
+
+        Args:
+            values: 前导字段的等值条件，可以为空表示遍历全部
+            descending: 是否倒序遍历
+        """
+        lo, hi = self.bounds(values)
+        return self.scan(lo, hi, descending)
+
+    def seek(
+        self,
+        values: Iterable[Any],
+        after: Optional[Tuple[Any, str]] = None,
+        descending: bool = False
+    ) -> Iterator[str]:
+        """
+        键集续读：遍历等值前缀匹配、按 (最后一个字段值, 记录键) 排在续读位置之后的记录键
+
+        前缀覆盖除最后一个字段外的全部字段时，索引项的顺序就是 (排序值, 记录键) 的全序，
+        定位续读位置只需一次二分查找。
+
+        Args:
+            values: 除最后一个字段外的全部字段的等值条件
+            after: 续读位置 (最后一个字段的值, 记录键)，None表示从头开始
+            descending: 是否倒序遍历
+        """
+        prefix = tuple(sort_key(v) for v in values)
+        lo, hi = self._range(prefix)
+        if after is not None:
+            marker = (prefix + (sort_key(after[0]),), after[1])
+            if descending:
+                hi = bisect.bisect_left(self._entries, marker, lo, hi)
+            else:
+                lo = bisect.bisect_right(self._entries, marker, lo, hi)
+        return self.scan(lo, hi, descending)
+
+    @property
+    def name(self) -> str:
+        """索引名称"""
+        return f"ordered({', '.join(self.fields)})"
+
+    def describe(self) -> Dict[str, Any]:
+        """索引定义，用于持久化"""
+        return {"fields": self.fields, "unique": self.unique, "kind": self.kind}
+
+
+class CollectionIndexes:
+    """
+    单个集合的索引集合
+    在记录写入、更新、删除时统一维护所有索引
+
+    同时为每条记录维护单调递增的插入序号，与集合字典中键的顺序一致，
+    未指定排序的索引查询按序号恢复插入顺序，代价与结果集大小成正比。
+    """
+
+    def __init__(self):
+        self.indexes: Dict[str, HashIndex] = {}
+        self.ordered: Dict[Tuple[str, ...], OrderedIndex] = {}
+        self._sequence: Dict[str, int] = {}
+        self._next_sequence = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.indexes) or bool(self.ordered)
+
+    def _all(self) -> List[Any]:
+        """全部索引"""
+        return [*self.indexes.values(), *self.ordered.values()]
+
+    def get(self, field: str) -> Optional[HashIndex]:
+        """获取字段上的哈希索引"""
+        return self.indexes.get(field)
+
+    def get_ordered(self, fields: Iterable[str]) -> Optional[OrderedIndex]:
+        """获取字段元组上的有序索引"""
+        return self.ordered.get(tuple(fields))
+
+    def add_index(self, index: Any, records: Dict[str, Dict[str, Any]]) -> None:
+        """添加索引并用现有记录构建"""
+        if not self:
+            # 没有索引时不维护插入序号，添加第一个索引时按集合顺序编号
+            self._number(records)
+        index.build(records)
+        if isinstance(index, OrderedIndex):
+            self.ordered[tuple(index.fields)] = index
+        else:
+            self.indexes[index.field] = index
+
+    def rebuild(self, records: Dict[str, Dict[str, Any]]) -> None:
+        """重建全部索引"""
+        self._number(records)
+        for index in self._all():
+            index.build(records)
+
+    def check(self, key: str, record: Dict[str, Any]) -> None:
+        """写入前检查唯一约束"""
+        for index in self._all():
+            index.check(key, record)
+
+    def replace(
+        self,
+        key: str,
+        old: Optional[Dict[str, Any]],
+        new: Optional[Dict[str, Any]]
+    ) -> None:
+        """
+        用新记录替换旧记录的索引项
+
+        Args:
+            key: 记录键
+            old: 旧记录，新增时为None
+            new: 新记录，删除时为None
+        """
+        for index in self._all():
+            index.update(key, old, new)
+        if new is None:
+            self._sequence.pop(key, None)
+        elif old is None:
+            self._sequence[key] = self._next_sequence
+            self._next_sequence += 1
+
+    def in_insertion_order(self, keys: Iterable[str]) -> List[str]:
+        """按记录加入集合的顺序排列记录键"""
+        return sorted(keys, key=self._sequence.__getitem__)
+
+    def _number(self, records: Dict[str, Dict[str, Any]]) -> None:
+        """按集合字典中键的顺序重新编号"""
+        self._sequence = {key: number for number, key in enumerate(records)}
+        self._next_sequence = len(self._sequence)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """全部索引定义"""
+        return [index.describe() for index in self._all()]
+
+
+def index_from_definition(definition: Dict[str, Any]) -> Any:
+    """根据持久化的索引定义创建索引"""
+    if definition.get("kind") == OrderedIndex.kind:
+        return OrderedIndex(definition["fields"], definition.get("unique", False))
+    return HashIndex(definition["field"], definition.get("unique", False))
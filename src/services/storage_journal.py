@@ -0,0 +1,148 @@
+"""
+存储日志（预写日志）实现
+为文件存储服务提供按集合的追加写日志，避免每次写入都重写整个集合文件
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Any, Iterator, Optional
+import logging
+
+
+# 日志文件后缀
+JOURNAL_SUFFIX = ".wal"
+# 检查点进行中时被轮转出去的日志后缀
+CHECKPOINT_SUFFIX = ".wal.ckpt"
+
+# 日志操作类型
+OP_PUT = "put"
+OP_DELETE = "del"
+
+
+def put_entry(key: str, value: Dict[str, Any]) -> Dict[str, Any]:
+    """构造写入记录"""
+    return {"op": OP_PUT, "key": key, "value": value}
+
+
+def delete_entry(key: str) -> Dict[str, Any]:
+    """构造删除记录"""
+    return {"op": OP_DELETE, "key": key}
+
+
+def apply_entry(records: Dict[str, Any], entry: Dict[str, Any]) -> None:
+    """
+    将单条日志记录应用到内存集合
+
+    写入记录保存的是完整数据，删除记录允许目标不存在，
+    因此重复重放同一段日志是幂等的。
+    """
+    op = entry.get("op")
+    if op == OP_PUT:
+        records[entry["key"]] = entry["value"]
+    elif op == OP_DELETE:
+        records.pop(entry["key"], None)
+
+
+def read_journal(
+    path: Path,
+    logger: Optional[logging.Logger] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    逐条读取日志文件
+
+    进程崩溃可能在文件末尾留下半行记录，读取到无法解析的行时停止，
+    之前已完整落盘的记录仍然有效。
+    """
+    if not path.exists():
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                if logger:
+                    logger.warning(f"日志记录损坏，停止重放: {path}:{line_no}")
+                return
+
+
+class CollectionJournal:
+    """
+    单个集合的追加写日志
+    每次追加一批记录只做一次 fsync
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.record_count = 0
+        self._file = None
+
+    @property
+    def checkpoint_path(self) -> Path:
+        """检查点期间旧日志的路径"""
+        return self.path.with_name(self.path.name[: -len(JOURNAL_SUFFIX)] + CHECKPOINT_SUFFIX)
+
+    def open(self) -> None:
+        """打开日志文件并统计已有记录数"""
+        if self._file is not None:
+            return
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.record_count = sum(1 for line in f if line.strip())
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, entries: List[Dict[str, Any]]) -> None:
+        """
+        追加日志记录并同步到磁盘
+
+        Args:
+            entries: 日志记录列表
+        """
+        if not entries:
+            return
+        if self._file is None:
+            self.open()
+
+        payload = "".join(
+            json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n"
+            for entry in entries
+        )
+        self._file.write(payload)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.record_count += len(entries)
+
+    def rotate(self) -> Path:
+        """
+        将当前日志轮转为检查点日志，并开始一个新的空日志
+
+        Returns:
+            Path: 轮转后的检查点日志路径
+        """
+        self.close()
+        checkpoint_path = self.checkpoint_path
+        if self.path.exists():
+            if checkpoint_path.exists():
+                # 上一次检查点未完成，旧日志必须保留，将当前日志续接在其后
+                with open(checkpoint_path, "a", encoding="utf-8") as dst, \
+                        open(self.path, "r", encoding="utf-8") as src:
+                    shutil.copyfileobj(src, dst)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                self.path.unlink()
+            else:
+                os.replace(self.path, checkpoint_path)
+        self.record_count = 0
+        self.open()
+        return checkpoint_path
+
+    def close(self) -> None:
+        """关闭日志文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
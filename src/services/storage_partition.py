@@ -0,0 +1,209 @@
+"""
+分区集合存储
+将集合按分区字段拆分为多个段文件，并用清单文件记录各段的记录数，
+打开或追加一个分区只需读写它所在的段
+"""
+
+import hashlib
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Iterable, Set, Tuple
+
+from contracts.storage_service import QueryFilter
+from .storage_format import (
+    MANIFEST_FILE, RecordFileFormat, find_record_file, read_records, remove_record_files
+)
+
+# 缺少分区字段的记录所在的段
+DEFAULT_SEGMENT = "default"
+
+
+class PartitionSpec:
+    """
+    分区规则
+
+    buckets 为0时每个分区字段值一个段（段名为值的哈希），
+    否则按哈希分配到固定数量的桶中。
+    """
+
+    def __init__(self, field: str, buckets: int = 0):
+        self.field = field
+        self.buckets = buckets
+
+    def segment_for_value(self, value: Any) -> str:
+        """分区字段值所在的段"""
+        if value is None:
+            return DEFAULT_SEGMENT
+        text = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+        if self.buckets > 0:
+            return f"b{zlib.crc32(text.encode('utf-8')) % self.buckets:04d}"
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+    def segment_of(self, record: Dict[str, Any]) -> str:
+        """记录所在的段"""
+        return self.segment_for_value(record.get(self.field))
+
+    def segments_for_filters(self, filters: Iterable[QueryFilter]) -> Optional[List[str]]:
+        """
+        查询条件涉及的段
+
+        Returns:
+            Optional[List[str]]: 分区字段上有等值或in条件时返回对应的段，否则为None表示全部段
+        """
+        for f in filters:
+            if f.field != self.field:
+                continue
+            if f.operator == "eq":
+                return [self.segment_for_value(f.value)]
+            if f.operator == "in":
+                return list(dict.fromkeys(self.segment_for_value(v) for v in f.value))
+        return None
+
+    def describe(self) -> Dict[str, Any]:
+        """分区规则定义，保存在清单中"""
+        return {"field": self.field, "buckets": self.buckets}
+
+
+class PartitionedCollection:
+    """
+    分区集合的段状态
+
+    记录已加载的段、每个段包含的记录键、未持久化的段以及各段记录数；
+    未加载的段的记录数来自清单。
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        spec: PartitionSpec,
+        file_format: Optional[RecordFileFormat] = None
+    ):
+        self.directory = directory
+        self.spec = spec
+        self.file_format = file_format or RecordFileFormat()
+        self.counts: Dict[str, int] = {}
+        self.loaded: Set[str] = set()
+        self.segment_keys: Dict[str, Dict[str, None]] = {}
+        self.dirty: Set[str] = set()
+
+    @property
+    def manifest_path(self) -> Path:
+        """清单文件路径"""
+        return self.directory / MANIFEST_FILE
+
+    @property
+    def fully_loaded(self) -> bool:
+        """是否已加载全部段"""
+        return set(self.counts) <= self.loaded
+
+    def total_count(self) -> int:
+        """集合记录总数"""
+        return sum(self.counts.values())
+
+    def open(self) -> None:
+        """读取清单，已有清单中的分区规则优先于配置"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if not self.manifest_path.exists():
+            return
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.spec = PartitionSpec(manifest["field"], manifest.get("buckets", 0))
+        self.counts = {segment: int(count) for segment, count in manifest["segments"].items()}
+
+    def read_manifest(self) -> Dict[str, int]:
+        """读取清单中各段的记录数，不修改当前状态；清单不存在时为空"""
+        if not self.manifest_path.exists():
+            return {}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return {segment: int(count) for segment, count in manifest["segments"].items()}
+
+    def read_segment(self, segment: str) -> Tuple[Dict[str, Any], int]:
+        """
+        读取段文件
+
+        Returns:
+            Tuple[Dict[str, Any], int]: 段内全部记录与文件字节数，段不存在时为空集合与0
+        """
+        path = find_record_file(self.directory, segment)
+        if path is None:
+            return {}, 0
+        return read_records(path), path.stat().st_size
+
+    def mark_loaded(self, segment: str, keys: Iterable[str]) -> None:
+        """登记已加载的段"""
+        self.loaded.add(segment)
+        self.segment_keys[segment] = dict.fromkeys(keys)
+        self.counts[segment] = len(self.segment_keys[segment])
+        if not self.counts[segment]:
+            del self.counts[segment]
+
+    def unload(self, segment: str) -> List[str]:
+        """
+        登记段已从内存中移出，记录数保留在清单中
+
+        Returns:
+            List[str]: 段内的记录键
+        """
+        self.loaded.discard(segment)
+        return list(self.segment_keys.pop(segment, {}))
+
+    def track(
+        self,
+        key: str,
+        old: Optional[Dict[str, Any]],
+        new: Optional[Dict[str, Any]]
+    ) -> None:
+        """登记一次记录变更涉及的段，调用前变更涉及的段必须已加载"""
+        for record, present in ((old, False), (new, True)):
+            if record is None:
+                continue
+            segment = self.spec.segment_of(record)
+            keys = self.segment_keys.setdefault(segment, {})
+            if present:
+                keys[key] = None
+            else:
+                keys.pop(key, None)
+            self.counts[segment] = len(keys)
+            if not keys:
+                del self.counts[segment]
+            self.dirty.add(segment)
+
+    def manifest(self) -> Dict[str, Any]:
+        """当前清单内容"""
+        return {**self.spec.describe(), "segments": dict(sorted(self.counts.items()))}
+
+    def write_segments(
+        self,
+        segments: Dict[str, Dict[str, Any]],
+        manifest: Dict[str, Any]
+    ) -> Dict[str, int]:
+        """
+        原子地写入段文件与清单，空段的文件被删除
+
+        Args:
+            segments: 段名 -> 段内全部记录
+            manifest: 写入后的清单内容
+
+        Returns:
+            Dict[str, int]: 段名 -> 写入后的文件字节数
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        sizes = {}
+        for segment, records in segments.items():
+            if not records:
+                remove_record_files(self.directory, segment)
+                sizes[segment] = 0
+                continue
+            sizes[segment] = self.file_format.write(self.directory, segment, records)
+
+        # 清单始终为缩进JSON
+        tmp_path = self.manifest_path.with_name(MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        return sizes
@@ -0,0 +1,489 @@
+"""
+查询规划器
+将 QueryOptions 编译为单次遍历的谓词，并为过滤条件选择扫描行数最少的索引访问路径
+"""
+
+import base64
+import bisect
+import heapq
+import itertools
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Any, Callable, Iterable, Iterator, Tuple, cast
+
+from contracts.storage_service import QueryOptions, QueryFilter
+from core.errors import ValidationError, ErrorCode
+from .storage_index import CollectionIndexes, index_value, sort_key
+
+
+# 支持的过滤操作符
+SUPPORTED_OPERATORS = ("eq", "ne", "gt", "lt", "ge", "le", "in", "like")
+
+# 范围操作符: 操作符 -> (是否下界, 是否包含边界)
+RANGE_OPERATORS = {
+    "gt": (True, False),
+    "ge": (True, True),
+    "lt": (False, False),
+    "le": (False, True),
+}
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+
+# ============ 谓词编译 ============
+
+def _like_pattern(pattern: str) -> "re.Pattern[str]":
+    """将SQL LIKE模式（%匹配任意串，_匹配单个字符）转换为正则，不区分大小写"""
+    parts = []
+    for char in pattern:
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+
+def _compile_filter(f: QueryFilter) -> Predicate:
+    """编译单个过滤条件"""
+    name, value, op = f.field, f.value, f.operator
+
+    if op == "eq":
+        return lambda item: item.get(name) == value
+    if op == "ne":
+        return lambda item: item.get(name) != value
+    if op in RANGE_OPERATORS:
+        # 范围比较只在同类型值之间成立，缺失字段与None不满足任何范围条件
+        bound = sort_key(value)
+        compare = {
+            "gt": lambda key: key > bound,
+            "ge": lambda key: key >= bound,
+            "lt": lambda key: key < bound,
+            "le": lambda key: key <= bound,
+        }[op]
+
+        def in_range(item: Dict[str, Any]) -> bool:
+            current = item.get(name)
+            if current is None:
+                return False
+            key = sort_key(current)
+            return key[0] == bound[0] and compare(key)
+        return in_range
+    if op == "in":
+        members = {index_value(v) for v in value}
+        return lambda item: index_value(item.get(name)) in members
+    if op == "like":
+        regex = _like_pattern(str(value))
+
+        def like(item: Dict[str, Any]) -> bool:
+            current = item.get(name)
+            return isinstance(current, str) and regex.fullmatch(current) is not None
+        return like
+
+    raise _unsupported_operator(f)
+
+
+def _unsupported_operator(f: QueryFilter) -> ValidationError:
+    """不支持的操作符错误"""
+    return ValidationError(
+        f"不支持的查询操作符: {f.operator}，可用操作符: {', '.join(SUPPORTED_OPERATORS)}",
+        ErrorCode.VALIDATION_INVALID_FORMAT,
+        field_name=f.field
+    )
+
+
+def compile_predicate(filters: Iterable[QueryFilter]) -> Predicate:
+    """
+    将过滤条件编译为单个谓词，记录只需遍历一次
+
+    Args:
+        filters: 过滤条件列表
+
+    Returns:
+        Predicate: 记录满足全部条件时返回True
+    """
+    predicates = [_compile_filter(f) for f in filters]
+    if not predicates:
+        return lambda item: True
+    if len(predicates) == 1:
+        return predicates[0]
+    return lambda item: all(predicate(item) for predicate in predicates)
+
+
+# ============ 查询计划 ============
+
+@dataclass
+class QueryPlan:
+    """查询计划"""
+    access: str  # "full_scan", "hash_lookup", "ordered_range"
+    estimated_rows: int
+    index: Optional[str] = None
+    index_sorted: bool = False
+    residual: List[QueryFilter] = field(default_factory=list)
+    keys: Callable[[], Iterator[str]] = field(default=lambda: iter(()), repr=False)
+
+    def describe(self) -> Dict[str, Any]:
+        """计划描述，用于explain输出"""
+        return {
+            "access": self.access,
+            "index": self.index,
+            "estimated_rows": self.estimated_rows,
+            "index_sorted": self.index_sorted,
+            "residual_filters": [
+                {"field": f.field, "operator": f.operator, "value": f.value}
+                for f in self.residual
+            ],
+        }
+
+
+@dataclass
+class QueryStats:
+    """查询执行统计"""
+    rows_scanned: int = 0
+    rows_returned: int = 0
+    sort: Optional[str] = None  # "index", "insertion", "heap", "full"
+
+
+class QueryPlanner:
+    """
+    基于内存集合与其索引的查询规划器
+
+    为每个可用的索引估算需要扫描的行数（哈希桶大小、有序索引区间长度），
+    选择扫描行数最少的访问路径；有序索引能直接按排序字段输出且所有条件都被
+    索引覆盖时，带limit的查询只需扫描 offset+limit 行。
+    """
+
+    def __init__(
+        self,
+        records: Dict[str, Dict[str, Any]],
+        indexes: Optional[CollectionIndexes] = None
+    ):
+        self.records = records
+        self.indexes = indexes
+
+    def plan(self, options: QueryOptions) -> QueryPlan:
+        """为查询选项生成查询计划"""
+        filters = list(options.filters or [])
+        for f in filters:
+            if f.operator not in SUPPORTED_OPERATORS:
+                raise _unsupported_operator(f)
+
+        stop = (options.offset or 0) + options.limit if options.limit else None
+        descending = options.sort_order == "desc"
+        records = self.records
+
+        candidates = [QueryPlan(
+            access="full_scan",
+            estimated_rows=len(records),
+            residual=filters,
+            keys=lambda: iter(records.keys()),
+        )]
+        if self.indexes:
+            candidates.extend(self._hash_plans(filters))
+            candidates.extend(self._ordered_plans(filters, options.sort_by, descending))
+
+        equal_fields = {f.field for f in filters if f.operator == "eq"}
+        for candidate in candidates:
+            if options.sort_by is None:
+                # 未指定排序时按插入顺序返回，只有全表扫描按这个顺序输出
+                candidate.index_sorted = candidate.access == "full_scan"
+            elif options.sort_by in equal_fields:
+                # 排序字段被等值条件固定时，任意顺序都已有序
+                candidate.index_sorted = True
+
+        def cost(candidate: QueryPlan) -> Tuple[int, bool]:
+            rows = candidate.estimated_rows
+            if candidate.index_sorted and not candidate.residual and stop is not None:
+                rows = min(rows, stop)
+            return rows, not candidate.index_sorted
+
+        return min(candidates, key=cost)
+
+    def execute(
+        self,
+        options: QueryOptions,
+        plan: Optional[QueryPlan] = None
+    ) -> Tuple[List[Dict[str, Any]], QueryStats]:
+        """
+        执行查询
+
+        Returns:
+            (结果记录列表, 执行统计)，结果为存储中的原始记录
+        """
+        plan = plan or self.plan(options)
+        stats = QueryStats()
+        predicate = compile_predicate(plan.residual)
+        records = self.records
+        start = options.offset or 0
+        stop = start + options.limit if options.limit else None
+
+        def matched() -> Iterator[Tuple[str, Dict[str, Any]]]:
+            for key in plan.keys():
+                item = records.get(key)
+                if item is None:
+                    continue
+                stats.rows_scanned += 1
+                if predicate(item):
+                    yield key, item
+
+        if plan.index_sorted:
+            stats.sort = "index" if options.sort_by else None
+            results = [item for _, item in itertools.islice(matched(), start, stop)]
+        elif options.sort_by is None:
+            # 索引按自身的顺序给出匹配的记录，按插入序号只对匹配的记录排序
+            stats.sort = "insertion"
+            found = dict(matched())
+            indexes = cast(CollectionIndexes, self.indexes)
+            results = [found[key] for key in indexes.in_insertion_order(found)][start:stop]
+        else:
+            sort_field = options.sort_by
+            item_key = lambda x: sort_key(x.get(sort_field))
+            descending = options.sort_order == "desc"
+            if stop is not None:
+                # 只需要前 offset+limit 条时用有界堆代替全量排序
+                stats.sort = "heap"
+                select = heapq.nlargest if descending else heapq.nsmallest
+                results = select(stop, (item for _, item in matched()), key=item_key)
+            else:
+                stats.sort = "full"
+                results = sorted(
+                    (item for _, item in matched()), key=item_key, reverse=descending
+                )
+            results = results[start:stop]
+
+        stats.rows_returned = len(results)
+        return results, stats
+
+    def keyset(
+        self,
+        options: QueryOptions,
+        after: Optional[Tuple[Any, str]] = None
+    ) -> List[str]:
+        """
+        按 (排序字段值, 记录键) 的全序返回全部匹配记录的键，用于流式查询
+
+        排序值相同的记录按键排序，顺序是确定的，因此可以从任意一条记录之后续读。
+
+        Args:
+            options: 查询选项，offset 只在没有续读位置时生效
+            after: 续读位置 (排序字段值, 记录键)，只返回排在它之后的记录
+
+        Returns:
+            List[str]: 按查询顺序排列的记录键
+        """
+        seek = self._keyset_seek(options, after)
+        if seek is not None:
+            return seek
+
+        plan = self.plan(QueryOptions(filters=options.filters))
+        predicate = compile_predicate(plan.residual)
+        records = self.records
+        sort_field = options.sort_by
+        entries = sorted(
+            (sort_key(records[key].get(sort_field)) if sort_field else (), key)
+            for key in plan.keys()
+            if key in records and predicate(records[key])
+        )
+
+        descending = options.sort_order == "desc"
+        if after is not None:
+            marker = (sort_key(after[0]) if sort_field else (), after[1])
+            if descending:
+                entries = entries[:bisect.bisect_left(entries, marker)]
+            else:
+                entries = entries[bisect.bisect_right(entries, marker):]
+        if descending:
+            entries.reverse()
+
+        keys = [key for _, key in entries]
+        if after is None and options.offset:
+            keys = keys[options.offset:]
+        if options.limit:
+            keys = keys[:options.limit]
+        return keys
+
+    # ============ 访问路径 ============
+
+    def _keyset_seek(
+        self,
+        options: QueryOptions,
+        after: Optional[Tuple[Any, str]]
+    ) -> Optional[List[str]]:
+        """
+        在 等值字段 + 排序字段 的有序索引上从续读位置直接遍历，没有这样的索引时为None
+
+        只遍历续读位置之后的索引项，带limit时代价与页大小成正比而与集合大小无关。
+        """
+        if not self.indexes or options.sort_by is None:
+            return None
+        equalities: Dict[str, QueryFilter] = {}
+        for f in options.filters or []:
+            if f.operator == "eq":
+                equalities.setdefault(f.field, f)
+
+        for fields, index in self.indexes.ordered.items():
+            if fields[-1] != options.sort_by or any(name not in equalities for name in fields[:-1]):
+                continue
+            used = [equalities[name] for name in fields[:-1]]
+            predicate = compile_predicate(
+                [f for f in options.filters or [] if all(f is not u for u in used)]
+            )
+            records = self.records
+            keys: Iterator[str] = (
+                key
+                for key in index.seek(
+                    [f.value for f in used], after, options.sort_order == "desc"
+                )
+                if key in records and predicate(records[key])
+            )
+            start = (options.offset or 0) if after is None else 0
+            stop = start + options.limit if options.limit else None
+            return list(itertools.islice(keys, start, stop))
+        return None
+
+    def _hash_plans(self, filters: List[QueryFilter]) -> List[QueryPlan]:
+        """哈希索引上的等值与in查找"""
+        plans = []
+        for f in filters:
+            index = self.indexes.get(f.field)
+            if index is None:
+                continue
+            # 哈希索引不包含缺失字段的记录，None值只能靠扫描判断
+            if f.operator == "eq" and f.value is not None:
+                values = [f.value]
+            elif f.operator == "in" and None not in f.value:
+                values = list(f.value)
+            else:
+                continue
+
+            buckets = [index.lookup(v) for v in values]
+            residual = [other for other in filters if other is not f]
+            plans.append(QueryPlan(
+                access="hash_lookup",
+                index=index.name,
+                estimated_rows=sum(len(bucket) for bucket in buckets),
+                residual=residual,
+                keys=lambda buckets=buckets: iter(dict.fromkeys(
+                    itertools.chain.from_iterable(buckets)
+                )),
+            ))
+        return plans
+
+    def _ordered_plans(
+        self,
+        filters: List[QueryFilter],
+        sort_by: Optional[str],
+        descending: bool
+    ) -> List[QueryPlan]:
+        """有序索引上的 等值前缀 + 范围 遍历，以及前导字段的in查找"""
+        equalities: Dict[str, QueryFilter] = {}
+        ranges: Dict[str, Dict[str, QueryFilter]] = {}
+        memberships: Dict[str, QueryFilter] = {}
+        for f in filters:
+            if f.operator == "eq":
+                equalities.setdefault(f.field, f)
+            elif f.operator in RANGE_OPERATORS and f.value is not None:
+                is_lower = RANGE_OPERATORS[f.operator][0]
+                ranges.setdefault(f.field, {}).setdefault("lower" if is_lower else "upper", f)
+            elif f.operator == "in":
+                memberships.setdefault(f.field, f)
+
+        plans = []
+        for fields, index in self.indexes.ordered.items():
+            used: List[QueryFilter] = []
+            prefix = []
+            for name in fields:
+                if name not in equalities:
+                    break
+                used.append(equalities[name])
+                prefix.append(equalities[name].value)
+
+            position = len(prefix)
+            next_field = fields[position] if position < len(fields) else None
+            bounds = ranges.get(next_field, {}) if next_field else {}
+            index_sorted = sort_by is not None and next_field == sort_by
+
+            if not prefix and not bounds:
+                if fields[0] in memberships:
+                    plans.append(self._ordered_in_plan(index, memberships[fields[0]], filters))
+                if not index_sorted:
+                    continue
+
+            lower = upper = None
+            if "lower" in bounds:
+                used.append(bounds["lower"])
+                lower = (bounds["lower"].value, RANGE_OPERATORS[bounds["lower"].operator][1])
+            if "upper" in bounds:
+                used.append(bounds["upper"])
+                upper = (bounds["upper"].value, RANGE_OPERATORS[bounds["upper"].operator][1])
+
+            lo, hi = index.bounds(prefix, lower, upper)
+            plans.append(QueryPlan(
+                access="ordered_range",
+                index=index.name,
+                estimated_rows=hi - lo,
+                index_sorted=index_sorted,
+                residual=[f for f in filters if all(f is not u for u in used)],
+                keys=lambda index=index, lo=lo, hi=hi, reverse=descending and index_sorted:
+                    index.scan(lo, hi, reverse),
+            ))
+        return plans
+
+    def _ordered_in_plan(self, index, membership: QueryFilter, filters: List[QueryFilter]) -> QueryPlan:
+        """有序索引前导字段上的in查找：对每个值做一次前缀遍历"""
+        values = list(membership.value)
+        return QueryPlan(
+            access="ordered_range",
+            index=index.name,
+            estimated_rows=sum(index.count_prefix([v]) for v in values),
+            residual=[f for f in filters if f is not membership],
+            keys=lambda: iter(dict.fromkeys(itertools.chain.from_iterable(
+                index.scan_prefix([v]) for v in values
+            ))),
+        )
+
+
+# ============ 续读令牌 ============
+
+def encode_continuation(sort_by: Optional[str], value: Any, key: str) -> str:
+    """
+    将一批结果最后一条记录的排序值与键编码为续读令牌
+
+    Args:
+        sort_by: 查询的排序字段
+        value: 最后一条记录的排序字段值
+        key: 最后一条记录的键
+
+    Returns:
+        str: URL安全的续读令牌
+    """
+    payload = json.dumps([sort_by, value, key], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_continuation(token: str, sort_by: Optional[str]) -> Tuple[Any, str]:
+    """
+    解析续读令牌
+
+    Args:
+        token: 续读令牌
+        sort_by: 本次查询的排序字段，必须与生成令牌的查询一致
+
+    Returns:
+        Tuple[Any, str]: (排序字段值, 记录键)
+    """
+    try:
+        token_sort_by, value, key = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except Exception:
+        raise ValidationError(
+            "无效的续读令牌", ErrorCode.VALIDATION_INVALID_FORMAT, field_name="continuation"
+        )
+    if token_sort_by != sort_by:
+        raise ValidationError(
+            f"续读令牌的排序字段({token_sort_by})与查询({sort_by})不一致",
+            ErrorCode.VALIDATION_INVALID_FORMAT,
+            field_name="continuation"
+        )
+    return value, key
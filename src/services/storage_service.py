@@ -3,39 +3,155 @@
 基于文件系统的数据持久化服务
 """
 
+import functools
 import json
 import os
 import shutil
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Any, cast
+from typing import (
+    AsyncIterator, Awaitable, Dict, List, Optional, Any, Callable, Set, Tuple, TypeVar, Union,
+    cast
+)
 from datetime import datetime
 import logging
 import asyncio
+import anyio
 from dataclasses import asdict
 
 from contracts.storage_service import (
     IStorageService, StorageConfig, StorageBackend, 
-    QueryOptions, QueryFilter
+    QueryOptions, QueryFilter, QueryBatch
 )
 from core.errors import (
-    SystemError, ConfigError, create_system_error, 
+    SystemError, ConfigError, BusinessError, ValidationError, create_system_error, 
     ErrorCode, ErrorContext
 )
+from .storage_journal import (
+    CollectionJournal, JOURNAL_SUFFIX, CHECKPOINT_SUFFIX,
+    put_entry, delete_entry, apply_entry, read_journal
+)
+from .storage_index import (
+    HashIndex, OrderedIndex, CollectionIndexes, index_from_definition
+)
+from .storage_aggregate import AggregateView, CollectionAggregates
+from .storage_cache import QueryCache
+from .storage_query import QueryPlanner, encode_continuation, decode_continuation
+from .storage_view import project
+from .storage_partition import MANIFEST_FILE, PartitionSpec, PartitionedCollection
+from .storage_format import (
+    FILE_FORMATS, COMPRESSIONS, DATA_SUFFIXES, RecordFileFormat,
+    find_record_file, list_record_files, read_records
+)
+from .storage_sync import SYNC_DIR, GENERATION_SUFFIX, CollectionGeneration, GenerationWatcher
+from .storage_backup import (
+    new_backup_dir, latest_backup, backup_schedule_base, link_or_copy, link_directory, sync_file,
+    sync_directory, write_backup_manifest, prune_backups
+)
+
+T = TypeVar('T')
+
+# 索引定义文件（不使用.json后缀，避免被当作集合加载）
+INDEX_DEFINITIONS_FILE = "indexes.meta"
+
+# 聚合视图定义文件
+AGGREGATE_DEFINITIONS_FILE = "aggregates.meta"
+
+# 定时备份的默认根目录（数据目录下）
+BACKUP_DIR = "backups"
+
+# 持久化模式
+DURABILITY_SYNC = "sync"
+DURABILITY_DEFERRED = "deferred"
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """当前线程中运行的asyncio事件循环，不在asyncio中运行时为None"""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
 
 
 class FileStorageService(IStorageService):
     """
     文件存储服务实现
-    使用JSON文件进行数据持久化
+    使用JSON文件进行数据持久化，file_format 可选紧凑的JSON Lines格式与压缩，
+    读取时兼容任意格式的已有文件，写入时转换为配置的格式
+    
+    启用日志模式(journal_enabled)后，写操作只追加到集合的日志文件，
+    由后台检查点任务定期将日志合并回集合文件。日志只作用于单文件集合，
+    分区集合的写入仍直接重写变更涉及的段文件。
+    
+    每个集合有独立的写锁，不同集合的写入互不等待；锁只保护内存修改，且内存修改
+    （包括整批变更）在两次await之间同步完成，读操作看到的总是完整应用的变更。
+    JSON编码与磁盘读写都在有界的I/O线程池中执行，同一集合的写盘按版本号合并、
+    按顺序进行，不阻塞事件循环。
+    
+    分区集合(partitions)按分区字段拆分为段文件，段在首次被访问时加载，
+    写入只重写变更涉及的段；已有的单文件集合在首次打开时自动迁移。
+    
+    lazy_loading 开启后单文件集合在首次被访问时才解析；配置 cache_budget_bytes 后
+    已加载的分区段按最近最少使用淘汰，内存中段的总字节数保持在预算之内。
+    
+    deferred持久化模式下写操作只修改内存并记录待持久化的变更，由后台刷盘任务
+    每隔 flush_interval 秒或累计 flush_max_pending 条变更时合并写盘；
+    需要确认落盘的调用方可以等待 flush()。刷盘任务运行在初始化时的asyncio事件循环中，
+    之后的写入发生在其他事件循环中（如每次操作各自 asyncio.run）或运行在trio中时，写入立即落盘。
+    
+    服务通过anyio同时支持asyncio与trio；检查点在asyncio中作为后台任务执行，
+    在trio中由触发它的写入在释放I/O锁后执行。
+    
+    auto_backup 开启时，距上一次备份超过 backup_interval 秒后的第一次写入创建一次增量备份，
+    不依赖后台任务，计时跨进程重启保持；
+    未变化的文件与上一次备份共享硬链接，只保留最新的 backup_retention 个备份。
+    
+    shared_access 开启时多个进程可以共享数据目录：写盘在集合的跨进程文件锁内进行，
+    发现其他进程写入过（集合代数变化）时先读取磁盘上的数据并叠加本进程未写盘的变更，
+    不会覆盖其他进程的写入；watchdog 监听到其他进程写盘后把集合标记为过期，
+    下一次访问该集合时只重新加载变化的集合或段。
     """
     
     def __init__(self, logger: Optional[logging.Logger] = None):
         self.logger = logger or logging.getLogger(__name__)
         self.config: Optional[StorageConfig] = None
         self.data_dir: Optional[Path] = None
+        self.file_format = RecordFileFormat()
         self.collections: Dict[str, Dict[str, Any]] = {}
+        self.journals: Dict[str, CollectionJournal] = {}
+        self.indexes: Dict[str, CollectionIndexes] = {}
+        self.aggregates: Dict[str, CollectionAggregates] = {}
+        self.query_cache: Optional[QueryCache] = None
+        self.partitions: Dict[str, PartitionedCollection] = {}
+        self._unloaded: Set[str] = set()
+        self._segment_cache: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._segment_pins: Dict[Tuple[str, str], int] = {}
+        self._checkpoint_tasks: Dict[str, asyncio.Task] = {}
+        self._checkpoints_due: Set[str] = set()
+        self._versions: Dict[str, int] = {}
+        self._synced: Dict[str, int] = {}
+        self._journal_buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._collection_locks: Dict[str, anyio.Lock] = {}
+        self._io_locks: Dict[str, anyio.Lock] = {}
+        self._generations: Dict[str, int] = {}
+        self._snapshots: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        self._pending_count = 0
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._next_backup_at: Optional[float] = None
+        self._backup_lock = anyio.Lock()
+        self._last_backup: Optional[Tuple[str, Dict[str, int]]] = None
+        self._sync_dir: Optional[Path] = None
+        self._sync_files: Dict[str, CollectionGeneration] = {}
+        self._known_generations: Dict[str, int] = {}
+        self._unsynced_keys: Dict[str, Set[str]] = {}
+        self._refresh_pending: Set[str] = set()  # 由监听线程写入
+        self._watcher: Optional[GenerationWatcher] = None
         self._initialized = False
-        self._lock = asyncio.Lock()
+        self._lock = anyio.Lock()  # 服务级操作：初始化、索引定义文件
     
     async def initialize(self, config: StorageConfig) -> bool:
         """
@@ -54,16 +170,75 @@ class FileStorageService(IStorageService):
                         f"不支持的存储后端: {config.backend}",
                         ErrorCode.CONFIG_VALUE_INVALID
                     )
+                if config.durability not in (DURABILITY_SYNC, DURABILITY_DEFERRED):
+                    raise ConfigError(
+                        f"不支持的持久化模式: {config.durability}",
+                        ErrorCode.CONFIG_VALUE_INVALID
+                    )
+                if config.file_format not in FILE_FORMATS or config.compression not in COMPRESSIONS:
+                    raise ConfigError(
+                        f"不支持的文件格式: {config.file_format}, 压缩: {config.compression}",
+                        ErrorCode.CONFIG_VALUE_INVALID
+                    )
                 
                 self.config = config
+                self.file_format = RecordFileFormat(config.file_format, config.compression)
                 self.data_dir = Path(config.connection_string)
                 
                 # 创建数据目录
                 self.data_dir.mkdir(parents=True, exist_ok=True)
                 
+                # 多进程共享时的代数文件目录
+                if config.shared_access:
+                    self._sync_dir = self.data_dir / SYNC_DIR
+                    self._sync_dir.mkdir(exist_ok=True)
+                
+                # 查询结果缓存
+                if config.query_cache_size > 0:
+                    self.query_cache = QueryCache(config.query_cache_size)
+                
+                # 序列化与磁盘I/O专用线程池
+                if config.io_workers > 0:
+                    self._io_executor = ThreadPoolExecutor(
+                        max_workers=config.io_workers,
+                        thread_name_prefix="storage-io"
+                    )
+                
                 # 加载现有数据
                 await self._load_all_collections()
                 
+                # 合并遗留日志并打开日志文件
+                await self._recover_journals()
+                
+                # 打开分区集合，迁移单文件集合
+                await self._open_partitions(list(config.partitions))
+                if config.journal_enabled and config.partitions:
+                    self.logger.warning(
+                        f"日志模式不适用于分区集合，以下集合仍直接写段文件: "
+                        f"{', '.join(sorted(config.partitions))}"
+                    )
+                
+                # 按持久化的索引定义重建索引
+                await self._load_index_definitions()
+                
+                # 登记聚合视图，首次读取时重建
+                await self._load_aggregate_definitions()
+                
+                # 启动后台刷盘任务
+                if config.durability == DURABILITY_DEFERRED and _running_loop() is not None:
+                    self._flush_requested = asyncio.Event()
+                    self._flush_task = asyncio.ensure_future(self._flush_loop())
+                
+                # 监听其他进程的写盘
+                if self._sync_dir is not None:
+                    self._watcher = GenerationWatcher(self._sync_dir, self._mark_stale)
+                    self._watcher.start()
+                
+                # 定时备份的下一次时间，按最新的已有备份计算，跨进程重启保持间隔
+                if config.auto_backup and config.backup_interval > 0:
+                    base = await self._run_io(backup_schedule_base, self._backup_root())
+                    self._next_backup_at = base + config.backup_interval
+                
                 self._initialized = True
                 self.logger.info(f"文件存储服务初始化成功: {self.data_dir}")
                 return True
@@ -92,8 +267,9 @@ class FileStorageService(IStorageService):
         if not self._initialized:
             raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
         
-        async with self._lock:
-            try:
+        try:
+            async with self._collection_lock(collection):
+                await self._ensure_loaded(collection, records=[data])
                 # 确保集合存在
                 if collection not in self.collections:
                     self.collections[collection] = {}
@@ -104,30 +280,30 @@ class FileStorageService(IStorageService):
                     key = str(uuid.uuid4())
                 
                 # 添加元数据
-                data_with_meta = {
-                    **data,
-                    "_id": key,
-                    "_created_at": datetime.now().isoformat(),
-                    "_updated_at": datetime.now().isoformat()
-                }
+                data_with_meta = self._new_record(key, data)
                 
                 # 存储到内存
-                self.collections[collection][key] = data_with_meta
-                
-                # 持久化到文件
-                await self._save_collection(collection)
-                
-                self.logger.debug(f"数据存储成功: {collection}/{key}")
-                return key
-                
-            except Exception as e:
-                self.logger.error(f"存储数据失败: {e}")
-                raise SystemError(f"存储数据失败: {str(e)}", ErrorCode.SYSTEM_INTERNAL_ERROR)
+                self._apply_change(collection, key, data_with_meta)
+                version = self._stage(collection, [put_entry(key, data_with_meta)])
+            
+            # 持久化（锁外进行）
+            await self._commit(collection, version)
+            
+            self.logger.debug(f"数据存储成功: {collection}/{key}")
+            return key
+            
+        except BusinessError:
+            raise
+        except Exception as e:
+            self.logger.error(f"存储数据失败: {e}")
+            raise SystemError(f"存储数据失败: {str(e)}", ErrorCode.SYSTEM_INTERNAL_ERROR)
     
     async def retrieve_data(
         self,
         collection: str,
-        key: str
+        key: str,
+        fields: Optional[List[str]] = None,
+        read_only: bool = False
     ) -> Optional[Dict[str, Any]]:
         """
         检索单条数据
@@ -135,6 +311,8 @@ class FileStorageService(IStorageService):
         Args:
             collection: 集合名称
             key: 数据唯一标识符
+            fields: 返回的字段，None表示全部字段
+            read_only: 是否返回只读视图（不复制记录）
             
         Returns:
             Dict[str, Any]或None: 检索到的数据
@@ -143,13 +321,14 @@ class FileStorageService(IStorageService):
             raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
         
         try:
+            await self._ensure_loaded(collection, keys=[key])
             if collection not in self.collections:
                 return None
             
             data = self.collections[collection].get(key)
             if data:
                 # 移除内部元数据
-                return {k: v for k, v in data.items() if not k.startswith('_')}
+                return cast(Dict[str, Any], project(data, fields, read_only))
             
             return None
             
@@ -165,9 +344,12 @@ class FileStorageService(IStorageService):
         """
         查询多条数据
         
+        启用 query_cache_size 时相同条件的查询直接返回缓存的记录，
+        只有条件与写入的新旧记录匹配时缓存项才失效。
+        
         Args:
             collection: 集合名称
-            options: 查询选项
+            options: 查询选项，可指定字段投影与只读视图
             
         Returns:
             List[Dict[str, Any]]: 查询结果列表
@@ -176,45 +358,126 @@ class FileStorageService(IStorageService):
             raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
         
         try:
-            if collection not in self.collections:
-                return []
-            
-            results = list(self.collections[collection].values())
-            
-            if options:
-                # 应用过滤器
-                if options.filters:
-                    for f in options.filters:
-                        if f.operator == "eq":
-                            results = [item for item in results if item.get(f.field) == f.value]
-                        # 可以根据需要添加其他操作符 (ne, gt, lt, etc.)
-                
-                # 应用排序
-                if options.sort_by:
-                    try:
-                        results.sort(
-                            key=lambda x: x.get(options.sort_by, 0), 
-                            reverse=options.sort_order == "desc"
-                        )
-                    except TypeError:
-                        # 处理混合类型排序问题
-                        results.sort(
-                            key=lambda x: str(x.get(options.sort_by, '')),
-                            reverse=options.sort_order == "desc"
-                        )
-
-                # 应用分页
-                start = options.offset if options.offset else 0
-                end = start + options.limit if options.limit else len(results)
-                results = results[start:end]
+            options = options or QueryOptions(filters=[])
+            await self._refresh_if_stale(collection)
+            cache = self.query_cache
+            results = cache.get(collection, options) if cache else None
+            if results is None:
+                await self._ensure_loaded(collection, filters=options.filters)
+                if collection not in self.collections:
+                    return []
+                
+                planner = QueryPlanner(self.collections[collection], self.indexes.get(collection))
+                results, _ = planner.execute(options)
+                # 与执行查询在同一段同步代码中，之后的写入都会检查这个缓存项
+                if cache:
+                    cache.put(collection, options, results)
             
             # 清理元数据
-            return [{k: v for k, v in item.items() if not k.startswith('_')} for item in results]
+            return [
+                cast(Dict[str, Any], project(item, options.fields, options.read_only))
+                for item in results
+            ]
             
+        except ValidationError:
+            raise
         except Exception as e:
             self.logger.error(f"查询数据失败: {e}")
             return []
     
+    async def iter_query(
+        self,
+        collection: str,
+        options: Optional[QueryOptions] = None,
+        batch_size: int = 100,
+        continuation: Optional[str] = None
+    ) -> AsyncIterator[QueryBatch]:
+        """
+        流式查询：按 (排序字段, 记录键) 的键集顺序分批返回结果
+        
+        开始时一次性确定匹配记录的键并保留这些记录的引用，之后每批只复制该批的记录，
+        迭代期间的写入不影响本次迭代；续读令牌记录每批最后一条的排序值与键。
+        有 等值字段 + 排序字段 的有序索引时从续读位置直接遍历索引，
+        带limit的分页代价与页大小成正比。
+        
+        Args:
+            collection: 集合名称
+            options: 查询选项，支持字段投影与只读视图
+            batch_size: 每批的记录数
+            continuation: 续读令牌，从生成它的那一批之后继续
+            
+        Yields:
+            QueryBatch: 一批结果及其续读令牌
+        """
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
+        if batch_size <= 0:
+            raise ValidationError(
+                "batch_size必须大于0", ErrorCode.VALIDATION_INVALID_FORMAT, field_name="batch_size"
+            )
+        
+        options = options or QueryOptions(filters=[])
+        after = decode_continuation(continuation, options.sort_by) if continuation else None
+        await self._refresh_if_stale(collection)
+        await self._ensure_loaded(collection, filters=options.filters)
+        current = self.collections.get(collection, {})
+        keys = QueryPlanner(current, self.indexes.get(collection)).keyset(options, after)
+        # 记录写入时整体替换而不原地修改，保留匹配记录的引用即是它们的快照
+        records = {key: current[key] for key in keys}
+        
+        sort_field = options.sort_by
+        for start in range(0, len(keys), batch_size):
+            chunk = keys[start:start + batch_size]
+            last = records[chunk[-1]]
+            token = None
+            if start + batch_size < len(keys):
+                token = encode_continuation(
+                    sort_field, last.get(sort_field) if sort_field else None, chunk[-1]
+                )
+            yield QueryBatch(
+                [
+                    cast(Dict[str, Any], project(records[key], options.fields, options.read_only))
+                    for key in chunk
+                ],
+                token
+            )
+            # 调用方连续消费时也让出事件循环
+            await anyio.sleep(0)
+    
+    async def explain(
+        self,
+        collection: str,
+        options: Optional[QueryOptions] = None
+    ) -> Dict[str, Any]:
+        """
+        执行查询并返回查询计划与实际扫描行数
+        
+        Args:
+            collection: 集合名称
+            options: 查询选项
+            
+        Returns:
+            Dict[str, Any]: 访问路径、使用的索引、预估与实际扫描行数、排序方式
+        """
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
+        
+        options = options or QueryOptions(filters=[])
+        await self._ensure_loaded(collection, filters=options.filters)
+        planner = QueryPlanner(
+            self.collections.get(collection, {}), self.indexes.get(collection)
+        )
+        plan = planner.plan(options)
+        _, stats = planner.execute(options, plan)
+        
+        return {
+            "collection": collection,
+            **plan.describe(),
+            "rows_scanned": stats.rows_scanned,
+            "rows_returned": stats.rows_returned,
+            "sort": stats.sort,
+        }
+    
     async def update_data(
         self,
         collection: str,
@@ -237,31 +500,75 @@ class FileStorageService(IStorageService):
         if not self._initialized:
             raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
         
-        async with self._lock:
-            try:
+        try:
+            async with self._collection_lock(collection):
+                # 更新可能把记录移到另一个分区段，目标段也需要加载
+                await self._ensure_loaded(collection, keys=[key], records=[data])
                 if collection not in self.collections or key not in self.collections[collection]:
                     return False
                 
-                if merge:
-                    # 合并数据
-                    existing_data = self.collections[collection][key]
-                    updated_data = {**existing_data, **data}
-                else:
-                    # 替换数据
-                    updated_data = {**data, "_id": key}
-                
-                updated_data["_updated_at"] = datetime.now().isoformat()
-                self.collections[collection][key] = updated_data
-                
-                # 持久化到文件
-                await self._save_collection(collection)
-                
-                self.logger.debug(f"数据更新成功: {collection}/{key}")
-                return True
+                updated_data = self._updated_record(
+                    self.collections[collection][key], key, data, merge
+                )
+                self._apply_change(collection, key, updated_data)
+                version = self._stage(collection, [put_entry(key, updated_data)])
+            
+            # 持久化（锁外进行）
+            await self._commit(collection, version)
+            
+            self.logger.debug(f"数据更新成功: {collection}/{key}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"更新数据失败: {e}")
+            return False
+    
+    async def increment_data(
+        self,
+        collection: str,
+        key: str,
+        increments: Dict[str, Union[int, float]],
+        data: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        原子地增加数值字段，并在同一次写入中合并其他字段
+        
+        新值在集合写锁内基于内存中的当前记录计算，与其他写入串行。
+        
+        Args:
+            collection: 集合名称
+            key: 数据唯一标识符
+            increments: 字段 -> 增量，缺少的字段从0开始
+            data: 同时合并写入的其他字段
+        
+        Returns:
+            Optional[Dict[str, Any]]: 更新后的数据，记录不存在或更新失败时为None
+        """
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
+        
+        try:
+            async with self._collection_lock(collection):
+                await self._ensure_loaded(collection, keys=[key], records=[data or {}])
+                if collection not in self.collections or key not in self.collections[collection]:
+                    return None
                 
-            except Exception as e:
-                self.logger.error(f"更新数据失败: {e}")
-                return False
+                existing = self.collections[collection][key]
+                changes = {**(data or {}), **self._incremented(existing, increments)}
+                updated_data = self._updated_record(existing, key, changes, True)
+                self._apply_change(collection, key, updated_data)
+                version = self._stage(collection, [put_entry(key, updated_data)])
+            
+            await self._commit(collection, version)
+            
+            self.logger.debug(f"数据增量更新成功: {collection}/{key}")
+            return cast(Dict[str, Any], project(updated_data))
+        
+        except BusinessError:
+            raise
+        except Exception as e:
+            self.logger.error(f"增量更新数据失败: {e}")
+            return None
     
     async def delete_data(
         self,
@@ -281,34 +588,41 @@ class FileStorageService(IStorageService):
         if not self._initialized:
             raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
         
-        async with self._lock:
-            try:
+        try:
+            async with self._collection_lock(collection):
+                await self._ensure_loaded(collection, keys=[key])
                 if collection not in self.collections or key not in self.collections[collection]:
                     return False
                 
-                del self.collections[collection][key]
-                
-                # 持久化到文件
-                await self._save_collection(collection)
-                
-                self.logger.debug(f"数据删除成功: {collection}/{key}")
-                return True
-                
-            except Exception as e:
-                self.logger.error(f"删除数据失败: {e}")
-                return False
+                self._apply_change(collection, key, None)
+                version = self._stage(collection, [delete_entry(key)])
+            
+            # 持久化（锁外进行）
+            await self._commit(collection, version)
+            
+            self.logger.debug(f"数据删除成功: {collection}/{key}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"删除数据失败: {e}")
+            return False
     
     async def bulk_insert(
         self,
         collection: str,
-        data_list: List[Dict[str, Any]]
+        data_list: List[Dict[str, Any]],
+        keys: Optional[List[str]] = None
     ) -> List[str]:
         """
         批量插入数据
         
+        全部记录在一次加锁内写入内存，并合并为一次持久化；
+        任一记录违反唯一索引时整批回滚。
+        
         Args:
             collection: 集合名称
             data_list: 数据列表
+            keys: 可选的唯一键列表，与data_list一一对应
             
         Returns:
             List[str]: 插入数据的唯一标识符列表
@@ -316,158 +630,624 @@ class FileStorageService(IStorageService):
         if not self._initialized:
             raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
         
-        async with self._lock:
-            try:
-                keys = []
-                
-                # 确保集合存在
-                if collection not in self.collections:
-                    self.collections[collection] = {}
-                
-                for data in data_list:
-                    key = await self.store_data(collection, data)
-                    keys.append(key)
-                
-                # 持久化到文件
-                await self._save_collection(collection)
-                
-                self.logger.debug(f"批量插入成功: {collection}, {len(keys)}条记录")
-                return keys
+        if keys is not None and len(keys) != len(data_list):
+            raise ValidationError(
+                f"键数量({len(keys)})与数据数量({len(data_list)})不一致",
+                ErrorCode.VALIDATION_INVALID_FORMAT,
+                field_name="keys"
+            )
+        
+        try:
+            async with self._collection_lock(collection):
+                await self._ensure_loaded(collection, records=data_list)
+                import uuid
+                changes = []
+                for i, data in enumerate(data_list):
+                    key = keys[i] if keys is not None else str(uuid.uuid4())
+                    changes.append((key, self._new_record(key, data)))
                 
-            except Exception as e:
-                self.logger.error(f"批量插入失败: {e}")
-                return []
+                version = self._apply_batch(collection, changes)
+            
+            await self._commit(collection, version)
+            
+            self.logger.debug(f"批量插入成功: {collection}, {len(changes)}条记录")
+            return [key for key, _ in changes]
+            
+        except BusinessError:
+            raise
+        except Exception as e:
+            self.logger.error(f"批量插入失败: {e}")
+            return []
     
-    async def create_index(
+    async def insert_and_increment(
         self,
         collection: str,
-        field: str,
-        unique: bool = False
-    ) -> bool:
+        data_list: List[Dict[str, Any]],
+        keys: List[str],
+        counter_collection: str,
+        counter_key: str,
+        increments: Dict[str, Union[int, float]],
+        data: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        批量插入数据，并原子地增加另一集合中一条记录的数值字段
+        
+        两个集合各自加锁并分别持久化：先插入数据，再增量更新计数记录。
+        
+        Returns:
+            Optional[Dict[str, Any]]: 更新后的计数记录，计数记录不存在时为None
+        """
+        if not await self.bulk_insert(collection, data_list, keys):
+            raise SystemError(f"批量插入失败: {collection}", ErrorCode.SYSTEM_INTERNAL_ERROR)
+        return await self.increment_data(counter_collection, counter_key, increments, data)
+    
+    async def get_many(
+        self,
+        collection: str,
+        keys: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
         """
-        创建索引 (文件存储暂不支持索引)
+        批量检索数据
         
         Args:
             collection: 集合名称
-            field: 字段名
-            unique: 是否唯一索引
+            keys: 数据唯一标识符列表
             
         Returns:
-            bool: 创建是否成功
+            Dict[str, Dict[str, Any]]: 唯一标识符 -> 数据，不存在的键不包含在结果中
         """
-        self.logger.warning("文件存储暂不支持索引功能")
-        return True  # 返回True以保持兼容性
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
+        
+        await self._ensure_loaded(collection, keys=keys)
+        records = self.collections.get(collection, {})
+        return {
+            key: {k: v for k, v in records[key].items() if not k.startswith('_')}
+            for key in keys
+            if key in records
+        }
     
-    async def backup_data(
+    async def update_many(
         self,
-        backup_path: str,
-        collections: Optional[List[str]] = None
-    ) -> bool:
+        collection: str,
+        updates: Dict[str, Dict[str, Any]],
+        merge: bool = True
+    ) -> int:
         """
-        备份数据
+        批量更新数据
         
         Args:
-            backup_path: 备份文件路径
-            collections: 要备份的集合列表，None表示全部
+            collection: 集合名称
+            updates: 唯一标识符 -> 更新的数据，不存在的键被忽略
+            merge: 是否合并现有数据
             
         Returns:
-            bool: 备份是否成功
+            int: 实际更新的记录数
         """
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
+        
         try:
-            backup_dir = Path(backup_path)
-            backup_dir.mkdir(parents=True, exist_ok=True)
-            
-            collections_to_backup = collections or list(self.collections.keys())
+            async with self._collection_lock(collection):
+                await self._ensure_loaded(
+                    collection, keys=list(updates), records=list(updates.values())
+                )
+                records = self.collections.get(collection, {})
+                changes = [
+                    (key, self._updated_record(records[key], key, data, merge))
+                    for key, data in updates.items()
+                    if key in records
+                ]
+                version = self._apply_batch(collection, changes)
             
-            for collection in collections_to_backup:
-                if collection in self.collections:
-                    data_dir = cast(Path, self.data_dir)
-                    source_file = data_dir / f"{collection}.json"
-                    target_file = backup_dir / f"{collection}.json"
-                    
-                    if source_file.exists():
-                        shutil.copy2(source_file, target_file)
+            await self._commit(collection, version)
             
-            self.logger.info(f"数据备份成功: {backup_path}")
-            return True
+            self.logger.debug(f"批量更新成功: {collection}, {len(changes)}条记录")
+            return len(changes)
             
         except Exception as e:
-            self.logger.error(f"数据备份失败: {e}")
-            return False
+            self.logger.error(f"批量更新失败: {e}")
+            return 0
     
-    async def restore_data(
+    async def delete_many(
         self,
-        backup_path: str,
-        collections: Optional[List[str]] = None
-    ) -> bool:
+        collection: str,
+        keys: List[str]
+    ) -> int:
         """
-        恢复数据
+        批量删除数据
         
         Args:
-            backup_path: 备份文件路径
-            collections: 要恢复的集合列表，None表示全部
+            collection: 集合名称
+            keys: 数据唯一标识符列表，不存在的键被忽略
             
         Returns:
-            bool: 恢复是否成功
+            int: 实际删除的记录数
         """
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
+        
         try:
-            backup_dir = Path(backup_path)
-            if not backup_dir.exists():
-                return False
+            async with self._collection_lock(collection):
+                await self._ensure_loaded(collection, keys=keys)
+                records = self.collections.get(collection, {})
+                changes = [(key, None) for key in dict.fromkeys(keys) if key in records]
+                version = self._apply_batch(collection, changes)
             
-            collections_to_restore = collections or [
-                f.stem for f in backup_dir.glob("*.json")
-            ]
-            
-            for collection in collections_to_restore:
-                data_dir = cast(Path, self.data_dir)
-                backup_file = backup_dir / f"{collection}.json"
-                target_file = data_dir / f"{collection}.json"
-                
-                if backup_file.exists():
-                    shutil.copy2(backup_file, target_file)
-            
-            # 重新加载数据
-            await self._load_all_collections()
+            await self._commit(collection, version)
             
-            self.logger.info(f"数据恢复成功: {backup_path}")
-            return True
+            self.logger.debug(f"批量删除成功: {collection}, {len(changes)}条记录")
+            return len(changes)
             
         except Exception as e:
-            self.logger.error(f"数据恢复失败: {e}")
-            return False
+            self.logger.error(f"批量删除失败: {e}")
+            return 0
     
-    async def get_collection_stats(
+    async def compact(
         self,
-        collection: str
-    ) -> Dict[str, Any]:
+        collection: str,
+        keys: List[str]
+    ) -> Dict[str, int]:
         """
-        获取集合统计信息
+        压缩集合：物理删除记录并重写集合文件
+        
+        删除之后立即把集合持久化（分区集合只重写涉及的段），日志模式下再把日志
+        合并回集合文件；新文件先写入临时文件再原子替换，压缩期间读写不受阻塞。
         
         Args:
             collection: 集合名称
+            keys: 要删除的数据唯一标识符列表，不存在的键被忽略
             
         Returns:
-            Dict[str, Any]: 统计信息
+            Dict[str, int]: records 删除的记录数，bytes 回收的磁盘字节数
         """
-        if collection not in self.collections:
-            return {"exists": False}
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
         
-        return {
-            "exists": True,
-            "count": len(self.collections[collection])
-        }
+        size_before = await self._run_io(self._collection_bytes, collection)
+        removed = await self.delete_many(collection, keys)
+        
+        version = self._versions.get(collection)
+        if version is not None:
+            await self._write_behind(collection, version)
+        if collection in self.journals:
+            # 等待进行中的检查点，再合并包含本次删除的日志
+            await self._wait_checkpoints(collection)
+            await self._checkpoint(collection)
+        
+        size_after = await self._run_io(self._collection_bytes, collection)
+        reclaimed = max(0, size_before - size_after)
+        self.logger.info(f"集合压缩完成: {collection}, 删除{removed}条记录, 回收{reclaimed}字节")
+        return {"records": removed, "bytes": reclaimed}
     
-    async def close(self) -> bool:
+    async def create_index(
+        self,
+        collection: str,
+        field: Union[str, List[str]],
+        unique: bool = False,
+        ordered: bool = False
+    ) -> bool:
         """
-        关闭存储服务连接
+        创建内存索引
         
+        索引在写入、更新、删除时同步维护，索引定义持久化到数据目录，
+        启动时按定义重建。query_data 会自动使用索引：等值条件走哈希索引或
+        有序索引的前导字段，等值前缀 + 排序字段 被有序索引覆盖时按索引顺序
+        遍历并在取够 limit 条后停止。
+        
+        Args:
+            collection: 集合名称
+            field: 字段名，传入字段列表时创建复合有序索引
+            unique: 是否唯一索引
+            ordered: 是否创建有序索引
+            
         Returns:
-            bool: 关闭是否成功
+            bool: 创建是否成功
+        """
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
+        
+        async with self._collection_lock(collection):
+            try:
+                await self._ensure_collection(collection)
+                indexes = self.indexes.setdefault(collection, CollectionIndexes())
+                if isinstance(field, str) and not ordered:
+                    existing = indexes.get(field)
+                    index = HashIndex(field, unique)
+                else:
+                    fields = [field] if isinstance(field, str) else list(field)
+                    existing = indexes.get_ordered(fields)
+                    index = OrderedIndex(fields, unique)
+                
+                if existing and existing.unique == unique:
+                    return True
+                
+                indexes.add_index(index, self.collections.get(collection, {}))
+                
+                # 索引定义文件由全部集合共享
+                async with self._lock:
+                    await self._save_index_definitions()
+                
+                self.logger.debug(f"索引创建成功: {collection}.{field}")
+                return True
+                
+            except Exception as e:
+                self.logger.error(f"创建索引失败 {collection}.{field}: {e}")
+                return False
+    
+    async def create_aggregate(
+        self,
+        collection: str,
+        name: str,
+        group_by: str,
+        fields: Optional[List[str]] = None
+    ) -> bool:
+        """
+        注册增量聚合视图
+        
+        视图在写入、更新、删除时同步维护，按组读取无需扫描集合；视图定义持久化到
+        数据目录，启动、恢复或合并其他进程的写入后在首次读取时从全部记录重建。
+        
+        Args:
+            collection: 集合名称
+            name: 视图名称
+            group_by: 分组字段
+            fields: 求和与最值的字段
+            
+        Returns:
+            bool: 注册是否成功
+        """
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
+        
+        async with self._collection_lock(collection):
+            try:
+                aggregates = self.aggregates.setdefault(collection, CollectionAggregates())
+                view = AggregateView(name, group_by, fields)
+                existing = aggregates.views.get(name)
+                if existing and existing.describe() == view.describe():
+                    return True
+                
+                aggregates.views[name] = view
+                aggregates.invalidate()
+                await self._build_aggregates(collection)
+                
+                async with self._lock:
+                    await self._save_aggregate_definitions()
+                
+                self.logger.debug(f"聚合视图创建成功: {collection}.{name}")
+                return True
+                
+            except Exception as e:
+                self.logger.error(f"创建聚合视图失败 {collection}.{name}: {e}")
+                return False
+    
+    async def get_aggregate(
+        self,
+        collection: str,
+        name: str,
+        groups: Optional[List[Any]] = None
+    ) -> Dict[Any, Dict[str, Any]]:
+        """
+        读取聚合视图，视图需要重建时先在集合写锁内重建
+        
+        Args:
+            collection: 集合名称
+            name: 视图名称
+            groups: 要读取的分组值，None表示全部分组
+            
+        Returns:
+            Dict[Any, Dict[str, Any]]: 分组值 -> 聚合值
+        """
+        if not self._initialized:
+            raise SystemError("存储服务未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
+        
+        await self._refresh_if_stale(collection)
+        aggregates = self.aggregates.get(collection)
+        if aggregates is None or name not in aggregates.views:
+            raise ValidationError(
+                f"聚合视图不存在: {collection}.{name}",
+                ErrorCode.VALIDATION_INVALID_FORMAT,
+                field_name="name"
+            )
+        if not aggregates.ready:
+            async with self._collection_lock(collection):
+                if not aggregates.ready:
+                    await self._build_aggregates(collection)
+        
+        view = aggregates.views[name]
+        if groups is None:
+            return view.groups()
+        result = {}
+        for group in groups:
+            stats = view.get(group)
+            if stats is not None:
+                result[group] = stats
+        return result
+    
+    async def backup_data(
+        self,
+        backup_path: str,
+        collections: Optional[List[str]] = None
+    ) -> bool:
+        """
+        备份数据
+        
+        每个集合各自取得一致的版本，数据文件以硬链接备份，备份期间写入不受阻塞。
+        
+        Args:
+            backup_path: 备份文件路径
+            collections: 要备份的集合列表，None表示全部
+            
+        Returns:
+            bool: 备份是否成功
+        """
+        try:
+            backup_dir = Path(backup_path)
+            backup_dir.mkdir(parents=True, exist_ok=True)
+            
+            await self._write_backup(backup_dir, collections or self._collection_names())
+            
+            self.logger.info(f"数据备份成功: {backup_path}")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"数据备份失败: {e}")
+            return False
+    
+    async def create_backup(self) -> Optional[str]:
+        """
+        在备份根目录下创建一次增量备份，并按 backup_retention 清理旧备份
+        
+        每个备份目录都是完整的，可以直接传给 restore_data；与上一次备份相比
+        未变化的文件以硬链接共享，只有变化的段和集合占用新的空间。
+        
+        Returns:
+            Optional[str]: 备份目录，备份失败时为None
+        """
+        async with self._backup_lock:
+            config = cast(StorageConfig, self.config)
+            root = self._backup_root()
+            backup_dir: Optional[Path] = None
+            try:
+                previous = await self._run_io(latest_backup, root)
+                backup_dir = await self._run_io(new_backup_dir, root)
+                manifest = await self._write_backup(
+                    backup_dir, self._collection_names(), previous
+                )
+                self._last_backup = (backup_dir.name, manifest["generations"])
+                
+                removed = await self._run_io(prune_backups, root, config.backup_retention)
+                self.logger.info(
+                    f"增量备份完成: {backup_dir}, 复制{manifest['copied_bytes']}字节, "
+                    f"清理{len(removed)}个旧备份"
+                )
+                return str(backup_dir)
+                
+            except Exception as e:
+                self.logger.error(f"增量备份失败: {e}")
+                if backup_dir is not None:
+                    await self._run_io(shutil.rmtree, backup_dir, True)
+                return None
+    
+    async def restore_data(
+        self,
+        backup_path: str,
+        collections: Optional[List[str]] = None
+    ) -> bool:
+        """
+        恢复数据
+        
+        只替换与备份不同的文件，并只重新加载发生变化的集合；
+        从增量备份恢复时，与数据目录共享硬链接的文件被直接跳过。
+        
+        Args:
+            backup_path: 备份文件路径
+            collections: 要恢复的集合列表，None表示全部
+            
+        Returns:
+            bool: 恢复是否成功
+        """
+        try:
+            backup_dir = Path(backup_path)
+            if not backup_dir.exists():
+                return False
+            
+            collections_to_restore = collections or sorted(
+                set(list_record_files(backup_dir))
+                | {f.name[:-len(JOURNAL_SUFFIX)] for f in backup_dir.glob(f"*{JOURNAL_SUFFIX}")}
+                | {f.parent.name for f in backup_dir.glob(f"*/{MANIFEST_FILE}")}
+            )
+            
+            await self.flush()
+            await self._wait_checkpoints()
+            
+            data_dir = cast(Path, self.data_dir)
+            
+            def copy_files() -> Set[str]:
+                changed = set()
+                for collection in collections_to_restore:
+                    has_records = find_record_file(backup_dir, collection) is not None
+                    backup_partition = backup_dir / collection
+                    if (backup_partition / MANIFEST_FILE).exists():
+                        if sync_directory(backup_partition, data_dir / collection):
+                            changed.add(collection)
+                    
+                    for file_name in self._collection_file_names(collection):
+                        backup_file = backup_dir / file_name
+                        target_file = data_dir / file_name
+                        is_data_file = file_name.endswith(tuple(DATA_SUFFIXES))
+                        
+                        if backup_file.exists():
+                            # 日志文件会被原地追加，必须复制
+                            if sync_file(backup_file, target_file, link=is_data_file):
+                                changed.add(collection)
+                        elif target_file.exists() and (has_records or not is_data_file):
+                            target_file.unlink()
+                            changed.add(collection)
+                return changed
+            
+            # 恢复期间阻止被恢复集合的写入
+            locks = [self._collection_lock(name) for name in sorted(collections_to_restore)]
+            for lock in locks:
+                await lock.acquire()
+            try:
+                # 丢弃当前日志，避免旧日志重放到恢复后的数据上；未变化的集合随后重新打开日志
+                for collection in collections_to_restore:
+                    journal = self.journals.pop(collection, None)
+                    if journal:
+                        journal.close()
+                
+                changed = sorted(await self._run_io(copy_files))
+                
+                # 丢弃变化集合的内存数据，分区集合重新打开后按需加载
+                reopened = [name for name in changed if name in self.partitions]
+                for collection in changed:
+                    self._forget_collection(collection)
+                
+                # 重新加载数据
+                await self._load_all_collections(changed)
+                await self._recover_journals()
+                await self._open_partitions(reopened)
+                self._rebuild_indexes()
+            finally:
+                for lock in locks:
+                    lock.release()
+            
+            self.logger.info(
+                f"数据恢复成功: {backup_path}, {len(changed)}/{len(collections_to_restore)}个集合有变化"
+            )
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"数据恢复失败: {e}")
+            return False
+    
+    async def get_collection_stats(
+        self,
+        collection: str
+    ) -> Dict[str, Any]:
+        """
+        获取集合统计信息
+        
+        注册了聚合视图时 aggregates 为 视图名称 -> 定义与分组数，
+        各组的聚合值通过 get_aggregate 读取。
+        
+        Args:
+            collection: 集合名称
+            
+        Returns:
+            Dict[str, Any]: 统计信息
+        """
+        await self._refresh_if_stale(collection)
+        partition = self.partitions.get(collection)
+        if partition is not None:
+            stats = {
+                "exists": True,
+                "count": partition.total_count(),
+                "partitions": len(partition.counts),
+                "loaded_partitions": len(partition.loaded),
+                "cached_bytes": sum(
+                    size for (name, _), size in self._segment_cache.items()
+                    if name == collection
+                ),
+            }
+        else:
+            await self._ensure_collection(collection)
+            if collection not in self.collections:
+                return {"exists": False}
+            stats = {
+                "exists": True,
+                "count": len(self.collections[collection])
+            }
+        
+        aggregates = self.aggregates.get(collection)
+        if aggregates:
+            stats["aggregates"] = {
+                name: {**view.describe(), "groups": len(view) if aggregates.ready else None}
+                for name, view in aggregates.views.items()
+            }
+        if self.query_cache:
+            stats["query_cache"] = self.query_cache.stats(collection)
+        return stats
+    
+    async def flush(self) -> bool:
+        """
+        持久化屏障：将所有集合持久化到当前版本
+        
+        写盘失败的集合保持未持久化状态，由下一次刷盘重试。
+        
+        Returns:
+            bool: 持久化是否成功
+        """
+        self._pending_count = 0
+        success = True
+        for collection, version in list(self._versions.items()):
+            try:
+                await self._write_behind(collection, version)
+            except Exception as e:
+                self.logger.error(f"刷盘失败 {collection}: {e}")
+                success = False
+        return success
+    
+    async def close(self) -> bool:
+        """
+        关闭存储服务连接
+        
+        Returns:
+            bool: 关闭是否成功
         """
         try:
             self._initialized = False
+            
+            # 停止监听其他进程
+            if self._watcher:
+                await anyio.to_thread.run_sync(self._watcher.stop)
+                self._watcher = None
+            self._refresh_pending.clear()
+            
+            # 停止后台刷盘任务并写出剩余变更
+            # 初始化时的事件循环已结束时，刷盘任务已随之结束
+            if self._flusher_running():
+                flush_task = cast(asyncio.Task, self._flush_task)
+                flush_task.cancel()
+                await asyncio.gather(flush_task, return_exceptions=True)
+            self._flush_task = None
+            await self.flush()
+            
+            # 等待进行中的检查点完成，日志内容已落盘无需额外合并
+            await self._wait_checkpoints()
+            self._checkpoints_due.clear()
+            for journal in self.journals.values():
+                journal.close()
+            self.journals.clear()
+            
+            if self._io_executor:
+                # 在其他线程中等待I/O线程退出，等待跨进程锁的线程可能需要事件循环继续运行
+                await anyio.to_thread.run_sync(
+                    functools.partial(self._io_executor.shutdown, wait=True)
+                )
+                self._io_executor = None
+            
             self.collections.clear()
+            self.indexes.clear()
+            self.aggregates.clear()
+            self.query_cache = None
+            self.partitions.clear()
+            self._unloaded.clear()
+            self._segment_cache.clear()
+            self._segment_pins.clear()
+            self._versions.clear()
+            self._synced.clear()
+            self._journal_buffers.clear()
+            self._generations.clear()
+            self._snapshots.clear()
+            self._last_backup = None
+            self._next_backup_at = None
+            self._sync_dir = None
+            self._sync_files.clear()
+            self._known_generations.clear()
+            self._unsynced_keys.clear()
             self.logger.info("文件存储服务已关闭")
             return True
             
@@ -486,41 +1266,1195 @@ class FileStorageService(IStorageService):
     
     # ============ 私有方法 ============
     
-    async def _load_all_collections(self):
-        """加载所有集合数据"""
+    async def _load_all_collections(self, names: Optional[List[str]] = None):
+        """
+        加载集合数据，并重放未合并的日志
+        
+        lazy_loading 开启时单文件集合只登记名称，首次被访问时才加载。
+        
+        Args:
+            names: 要加载的集合名称，None表示数据目录中的全部集合
+        """
         if not self.data_dir or not self.data_dir.exists():
             return
         
         data_dir = cast(Path, self.data_dir)
-        for file_path in data_dir.glob("*.json"):
-            collection_name = file_path.stem
+        found = set(list_record_files(data_dir))
+        for suffix in (CHECKPOINT_SUFFIX, JOURNAL_SUFFIX):
+            found.update(file_path.name[:-len(suffix)] for file_path in data_dir.glob(f"*{suffix}"))
+        if names is not None:
+            found &= set(names)
+        
+        config = self.config
+        for collection_name in sorted(found):
+            if config and config.lazy_loading and collection_name not in config.partitions:
+                self._unloaded.add(collection_name)
+                continue
+            await self._track_generation(collection_name)
+            self.collections[collection_name] = await self._read_collection(collection_name)
+        
+        # 集合被整体替换，已缓存的快照失效
+        self._snapshots.clear()
+    
+    async def _read_collection(self, collection: str) -> Dict[str, Any]:
+        """读取集合文件，并先后重放检查点期间轮转出的旧日志与当前日志"""
+        data_dir = cast(Path, self.data_dir)
+        records: Dict[str, Any] = {}
+        file_path = find_record_file(data_dir, collection)
+        if file_path is not None:
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.collections[collection_name] = data
-                
-                self.logger.debug(f"加载集合: {collection_name}")
-                
+                records = await self._run_io(read_records, file_path)
+                self.logger.debug(f"加载集合: {collection}")
             except Exception as e:
-                self.logger.error(f"加载集合失败 {collection_name}: {e}")
+                self.logger.error(f"加载集合失败 {collection}: {e}")
+        
+        for suffix in (CHECKPOINT_SUFFIX, JOURNAL_SUFFIX):
+            journal_path = data_dir / f"{collection}{suffix}"
+            if not journal_path.exists():
+                continue
+            entries = await self._run_io(
+                lambda path: list(read_journal(path, self.logger)), journal_path
+            )
+            for entry in entries:
+                apply_entry(records, entry)
+            
+            self.logger.debug(f"重放日志: {journal_path.name}, {len(entries)}条记录")
+        
+        return records
     
-    async def _save_collection(self, collection: str):
-        """保存集合到文件"""
-        if not self.data_dir:
-            raise SystemError("数据目录未初始化", ErrorCode.SYSTEM_INTERNAL_ERROR)
-
+    async def _recover_journals(self):
+        """
+        合并启动时遗留的日志
+        
+        存在检查点日志说明上次检查点未完成；未启用日志模式时遗留的日志也需要合并，
+        合并后集合文件已包含全部数据，可以安全删除日志。
+        """
+        partitioned = self.config.partitions if self.config else {}
+        for collection in list(self.collections.keys()):
+            # 分区集合的遗留日志已重放到内存，迁移为段文件时一并删除
+            if collection in self.journals or collection in partitioned:
+                continue
+            await self._recover_journal(collection)
+    
+    async def _recover_journal(self, collection: str):
+        """合并单个已加载集合的遗留日志，日志模式下打开日志文件"""
+        data_dir = cast(Path, self.data_dir)
+        journal_enabled = bool(self.config and self.config.journal_enabled)
+        
+        journal = CollectionJournal(data_dir / f"{collection}{JOURNAL_SUFFIX}")
+        has_checkpoint = journal.checkpoint_path.exists()
+        has_journal = journal.path.exists()
+        
+        if has_checkpoint or (has_journal and not journal_enabled):
+            await self._run_io(
+                self._write_collection_file, collection, self.collections[collection]
+            )
+            journal.checkpoint_path.unlink(missing_ok=True)
+            journal.path.unlink(missing_ok=True)
+            self.logger.info(f"已合并遗留日志: {collection}")
+        
+        if journal_enabled:
+            await self._run_io(journal.open)
+            self.journals[collection] = journal
+    
+    async def _open_partitions(self, collections: List[str]):
+        """
+        打开分区集合
+        
+        分区集合的数据不再整体加载，只读取清单；同名的单文件集合（及其遗留日志）
+        在这里迁移为段文件，迁移完成后删除原文件。
+        
+        Args:
+            collections: 要打开的分区集合名称
+        """
+        config = cast(StorageConfig, self.config)
+        data_dir = cast(Path, self.data_dir)
+        
+        for collection in collections:
+            spec = PartitionSpec(config.partitions[collection], config.partition_buckets)
+            partition = PartitionedCollection(data_dir / collection, spec, self.file_format)
+            await self._track_generation(collection)
+            await self._run_io(partition.open)
+            self.partitions[collection] = partition
+            
+            if collection in self._unloaded:
+                self._unloaded.discard(collection)
+                self.collections[collection] = await self._read_collection(collection)
+            flat_records = self.collections.pop(collection, None)
+            self.collections[collection] = {}
+            if not flat_records:
+                continue
+            
+            await self._ensure_loaded(collection, records=list(flat_records.values()))
+            version = self._apply_batch(collection, list(flat_records.items()))
+            if version is not None:
+                await self._write_behind(collection, version)
+            
+            def remove_flat_files():
+                for file_name in self._collection_file_names(collection):
+                    (data_dir / file_name).unlink(missing_ok=True)
+            
+            await self._run_io(remove_flat_files)
+            self.logger.info(
+                f"集合已迁移为分区存储: {collection}, {len(flat_records)}条记录, "
+                f"{len(partition.counts)}个分区"
+            )
+    
+    async def _ensure_collection(self, collection: str):
+        """
+        首次访问延迟加载的单文件集合时读取集合文件并合并遗留日志
+        
+        集合被其他进程写入过（监听线程标记为过期）时先合并其他进程的写入。
+        """
+        await self._refresh_if_stale(collection)
+        if collection not in self._unloaded:
+            return
+        await self._track_generation(collection)
+        records = await self._read_collection(collection)
+        if collection not in self._unloaded:
+            return
+        
+        self._unloaded.discard(collection)
+        self.collections[collection] = records
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        indexes = self.indexes.get(collection)
+        if indexes:
+            indexes.rebuild(records)
+        await self._recover_journal(collection)
+        self._invalidate_views(collection)
+    
+    async def _ensure_loaded(
+        self,
+        collection: str,
+        keys: Optional[List[str]] = None,
+        records: Optional[List[Dict[str, Any]]] = None,
+        filters: Optional[List[QueryFilter]] = None
+    ):
+        """
+        加载操作涉及的数据：延迟加载的集合整体加载，分区集合只加载涉及的段
+        
+        按键访问时依次加载其余的段直到找到全部的键；查询条件无法定位分区时加载全部段。
+        返回后调用方在下一次await之前使用数据，写操作在集合写锁内调用；
+        加载过程中用到的段不会被其他操作淘汰。
+        
+        Args:
+            collection: 集合名称
+            keys: 要访问的记录键
+            records: 要写入的记录，加载它们所属的段
+            filters: 查询条件，按分区字段定位段
+        """
+        await self._ensure_collection(collection)
+        partition = self.partitions.get(collection)
+        if partition is None or (partition.fully_loaded and records is None):
+            return
+        
+        spec = partition.spec
+        targets = [spec.segment_of(record) for record in records or []]
+        if keys is None and (filters is not None or records is None):
+            filter_segments = spec.segments_for_filters(filters or [])
+            if filter_segments is None:
+                targets = list(partition.counts) + targets
+            else:
+                targets.extend(filter_segments)
+        
+        loaded_records = self.collections.setdefault(collection, {})
+        pinned: List[Tuple[str, str]] = []
         try:
-            data_dir = cast(Path, self.data_dir)
-            file_path = data_dir / f"{collection}.json"
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(
-                    self.collections[collection],
-                    f,
-                    ensure_ascii=False,
-                    indent=2
+            # 写入涉及的段即使还没有记录也要登记为已加载，之后才能安全地只重写这些段
+            for segment in dict.fromkeys(targets):
+                pinned.append(self._pin_segment(collection, segment))
+                await self._load_segment(collection, partition, segment)
+            
+            if keys is not None:
+                for segment in list(partition.counts):
+                    if all(key in loaded_records for key in keys):
+                        break
+                    pinned.append(self._pin_segment(collection, segment))
+                    await self._load_segment(collection, partition, segment)
+                targets.extend(
+                    spec.segment_of(loaded_records[key]) for key in keys if key in loaded_records
+                )
+        finally:
+            for pin in pinned:
+                self._segment_pins[pin] -= 1
+                if not self._segment_pins[pin]:
+                    del self._segment_pins[pin]
+        
+        for segment in dict.fromkeys(targets):
+            if (collection, segment) in self._segment_cache:
+                self._segment_cache.move_to_end((collection, segment))
+        self._evict_segments({(collection, segment) for segment in targets})
+    
+    async def _load_segment(
+        self,
+        collection: str,
+        partition: PartitionedCollection,
+        segment: str
+    ):
+        """读取一个分区段并合并到内存，段已加载时直接返回"""
+        if segment in partition.loaded:
+            return
+        loaded, size = await self._run_io(partition.read_segment, segment)
+        if segment in partition.loaded or self.partitions.get(collection) is not partition:
+            return
+        
+        target = self.collections.setdefault(collection, {})
+        indexes = self.indexes.get(collection)
+        for key, record in loaded.items():
+            target[key] = record
+            if indexes:
+                indexes.replace(key, None, record)
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        partition.mark_loaded(segment, loaded.keys())
+        self._segment_cache[(collection, segment)] = size
+        
+        self.logger.debug(f"加载分区: {collection}/{segment}, {len(loaded)}条记录")
+    
+    def _pin_segment(self, collection: str, segment: str) -> Tuple[str, str]:
+        """标记段正在被使用，使用期间不会被淘汰"""
+        pin = (collection, segment)
+        self._segment_pins[pin] = self._segment_pins.get(pin, 0) + 1
+        return pin
+    
+    def _evict_segments(self, keep: Set[Tuple[str, str]]):
+        """
+        按最近最少使用淘汰分区段，直到已加载段的总字节数不超过 cache_budget_bytes
+        
+        只淘汰已持久化的段：集合有未写盘的变更时跳过整个集合。
+        
+        Args:
+            keep: 当前操作需要的段
+        """
+        budget = self.config.cache_budget_bytes if self.config else None
+        if not budget:
+            return
+        
+        total = sum(self._segment_cache.values())
+        for collection, segment in list(self._segment_cache):
+            if total <= budget:
+                break
+            pin = (collection, segment)
+            partition = self.partitions.get(collection)
+            if (
+                pin in keep or pin in self._segment_pins or partition is None
+                or segment in partition.dirty
+                or self._synced.get(collection, 0) < self._versions.get(collection, 0)
+            ):
+                continue
+            
+            records = self.collections.get(collection, {})
+            indexes = self.indexes.get(collection)
+            for key in partition.unload(segment):
+                record = records.pop(key, None)
+                if indexes and record is not None:
+                    indexes.replace(key, record, None)
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+            total -= self._segment_cache.pop(pin)
+            
+            self.logger.debug(f"淘汰分区: {collection}/{segment}")
+    
+    def _forget_collection(self, collection: str):
+        """丢弃集合的内存数据与分区状态，之后按磁盘内容重新加载"""
+        self.collections.pop(collection, None)
+        self._unloaded.discard(collection)
+        self.partitions.pop(collection, None)
+        self._known_generations.pop(collection, None)
+        self._invalidate_views(collection)
+        for pin in [pin for pin in self._segment_cache if pin[0] == collection]:
+            del self._segment_cache[pin]
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+    
+    def _apply_change(
+        self,
+        collection: str,
+        key: str,
+        record: Optional[Dict[str, Any]]
+    ):
+        """
+        在内存中应用单条记录变更并维护索引
+        
+        Args:
+            collection: 集合名称
+            key: 记录键
+            record: 新记录，None表示删除
+        """
+        records = self.collections.setdefault(collection, {})
+        indexes = self.indexes.get(collection)
+        if indexes and record is not None:
+            indexes.check(key, record)
+        
+        old = records.get(key)
+        if record is None:
+            records.pop(key, None)
+        else:
+            records[key] = record
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        
+        if indexes:
+            indexes.replace(key, old, record)
+        aggregates = self.aggregates.get(collection)
+        if aggregates:
+            aggregates.update(old, record)
+        if self.query_cache:
+            self.query_cache.invalidate(collection, old, record)
+        
+        partition = self.partitions.get(collection)
+        if partition is not None:
+            partition.track(key, old, record)
+    
+    def _apply_batch(
+        self,
+        collection: str,
+        changes: List[Tuple[str, Optional[Dict[str, Any]]]]
+    ) -> Optional[int]:
+        """
+        在内存中应用一批记录变更，并作为一次持久化记录
+        
+        任一变更失败（如违反唯一索引）时按相反顺序撤销已应用的变更，整批不生效。
+        
+        Args:
+            collection: 集合名称
+            changes: (记录键, 新记录) 列表，新记录为None表示删除
+            
+        Returns:
+            Optional[int]: 待持久化的集合版本号，没有变更时为None
+        """
+        if not changes:
+            return None
+        
+        records = self.collections.setdefault(collection, {})
+        applied: List[Tuple[str, Optional[Dict[str, Any]]]] = []
+        try:
+            for key, record in changes:
+                old = records.get(key)
+                self._apply_change(collection, key, record)
+                applied.append((key, old))
+        except Exception:
+            for key, old in reversed(applied):
+                self._apply_change(collection, key, old)
+            raise
+        
+        return self._stage(collection, [
+            put_entry(key, record) if record is not None else delete_entry(key)
+            for key, record in changes
+        ])
+    
+    def _new_record(self, key: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """为新记录添加元数据"""
+        now = datetime.now().isoformat()
+        return {**data, "_id": key, "_created_at": now, "_updated_at": now}
+    
+    def _updated_record(
+        self,
+        existing: Dict[str, Any],
+        key: str,
+        data: Dict[str, Any],
+        merge: bool
+    ) -> Dict[str, Any]:
+        """合并或替换现有记录，并刷新更新时间"""
+        if merge:
+            updated = {**existing, **data}
+        else:
+            updated = {**data, "_id": key}
+        updated["_updated_at"] = datetime.now().isoformat()
+        return updated
+    
+    def _incremented(
+        self,
+        existing: Dict[str, Any],
+        increments: Dict[str, Union[int, float]]
+    ) -> Dict[str, Any]:
+        """计算增量更新后的字段值，增量或当前值不是数值时拒绝"""
+        changes = {}
+        for field, amount in increments.items():
+            current = existing.get(field)
+            current = 0 if current is None else current
+            for value in (amount, current):
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    raise ValidationError(
+                        f"字段不能增量更新: {field}={value!r}",
+                        ErrorCode.VALIDATION_INVALID_FORMAT,
+                        field_name=field
+                    )
+            changes[field] = current + amount
+        return changes
+    
+    async def _load_index_definitions(self):
+        """读取索引定义并构建索引"""
+        data_dir = cast(Path, self.data_dir)
+        definitions_file = data_dir / INDEX_DEFINITIONS_FILE
+        if not definitions_file.exists():
+            return
+        
+        try:
+            definitions = await self._run_io(self._read_collection_file, definitions_file)
+        except Exception as e:
+            self.logger.error(f"读取索引定义失败: {e}")
+            return
+        
+        for collection, index_defs in definitions.items():
+            indexes = self.indexes.setdefault(collection, CollectionIndexes())
+            for index_def in index_defs:
+                try:
+                    indexes.add_index(
+                        index_from_definition(index_def),
+                        self.collections.get(collection, {})
+                    )
+                except Exception as e:
+                    self.logger.error(f"重建索引失败 {collection}: {index_def}: {e}")
+        
+        self.logger.debug(f"索引重建完成: {len(definitions)}个集合")
+    
+    async def _save_index_definitions(self):
+        """持久化索引定义"""
+        definitions = {
+            collection: indexes.describe()
+            for collection, indexes in self.indexes.items()
+            if indexes
+        }
+        await self._run_io(self._write_definitions, INDEX_DEFINITIONS_FILE, definitions)
+    
+    def _write_definitions(self, file_name: str, definitions: Dict[str, Any]):
+        """原子地写入索引或聚合视图定义文件"""
+        data_dir = cast(Path, self.data_dir)
+        tmp_path = data_dir / f"{file_name}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(definitions, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, data_dir / file_name)
+    
+    def _rebuild_indexes(self):
+        """用当前内存数据重建全部索引"""
+        for collection, indexes in self.indexes.items():
+            indexes.rebuild(self.collections.get(collection, {}))
+    
+    async def _load_aggregate_definitions(self):
+        """读取聚合视图定义，视图在首次读取时重建"""
+        data_dir = cast(Path, self.data_dir)
+        definitions_file = data_dir / AGGREGATE_DEFINITIONS_FILE
+        if not definitions_file.exists():
+            return
+        
+        try:
+            definitions = await self._run_io(self._read_collection_file, definitions_file)
+        except Exception as e:
+            self.logger.error(f"读取聚合视图定义失败: {e}")
+            return
+        
+        for collection, view_defs in definitions.items():
+            aggregates = self.aggregates.setdefault(collection, CollectionAggregates())
+            for view_def in view_defs:
+                view = AggregateView(view_def["name"], view_def["group_by"], view_def.get("fields"))
+                aggregates.views[view.name] = view
+    
+    async def _save_aggregate_definitions(self):
+        """持久化聚合视图定义"""
+        definitions = {
+            collection: aggregates.describe()
+            for collection, aggregates in self.aggregates.items()
+            if aggregates
+        }
+        await self._run_io(self._write_definitions, AGGREGATE_DEFINITIONS_FILE, definitions)
+    
+    async def _build_aggregates(self, collection: str):
+        """
+        从集合全部记录重建聚合视图，调用方必须持有集合写锁
+        
+        分区集合逐段计入：已加载的段使用内存中的记录，未加载的段读取后直接丢弃，
+        不占用段缓存。
+        """
+        await self._ensure_collection(collection)
+        aggregates = self.aggregates[collection]
+        epoch = aggregates.epoch
+        aggregates.reset()
+        
+        partition = self.partitions.get(collection)
+        records = self.collections.get(collection, {})
+        if partition is None:
+            aggregates.include(records.values())
+        else:
+            for segment in list(partition.counts):
+                if segment in partition.loaded:
+                    keys = partition.segment_keys.get(segment, {})
+                    aggregates.include(records[key] for key in keys if key in records)
+                else:
+                    segment_records, _ = await self._run_io(partition.read_segment, segment)
+                    aggregates.include(segment_records.values())
+        aggregates.mark_built(epoch)
+    
+    def _invalidate_views(self, collection: str):
+        """集合的内存数据被整体替换或重新读取后，丢弃缓存的查询结果，聚合视图在下一次读取前重建"""
+        aggregates = self.aggregates.get(collection)
+        if aggregates:
+            aggregates.invalidate()
+        if self.query_cache:
+            self.query_cache.clear(collection)
+    
+    def _stage(self, collection: str, entries: List[Dict[str, Any]]) -> Optional[int]:
+        """
+        记录集合的一次变更，在锁内、内存修改之后调用
+        
+        日志模式下暂存日志记录；deferred模式下累计变更数达到阈值时唤醒刷盘任务。
+        
+        Args:
+            collection: 集合名称
+            entries: 本次变更的日志记录
+            
+        Returns:
+            Optional[int]: 集合的新版本号，持久化到该版本即包含本次变更
+        """
+        config = self.config
+        version = self._versions.get(collection, 0) + 1
+        self._versions[collection] = version
+        
+        if config and config.journal_enabled and collection not in self.partitions:
+            self._journal_buffers.setdefault(collection, []).extend(entries)
+        
+        if self._sync_dir is not None:
+            self._unsynced_keys.setdefault(collection, set()).update(
+                entry["key"] for entry in entries
+            )
+        
+        if config and config.durability == DURABILITY_DEFERRED:
+            self._pending_count += len(entries)
+            if self._pending_count >= config.flush_max_pending and self._flusher_running():
+                cast(asyncio.Event, self._flush_requested).set()
+        
+        return version
+    
+    async def _commit(self, collection: str, version: Optional[int]):
+        """
+        sync模式下等待变更落盘，deferred模式下交给后台刷盘任务
+        
+        当前事件循环中没有运行中的刷盘任务时（启动它的事件循环已经结束），
+        deferred模式也立即写出全部待持久化的变更，不会让变更一直留在内存中。
+        到了定时备份的时间时由这次写入创建备份。
+        """
+        if version is None:
+            return
+        if self.config and self.config.durability == DURABILITY_DEFERRED:
+            if not self._flusher_running():
+                await self.flush()
+        else:
+            await self._write_behind(collection, version)
+        await self._backup_if_due()
+    
+    def _flusher_running(self) -> bool:
+        """后台刷盘任务是否在当前事件循环中运行"""
+        task = self._flush_task
+        return task is not None and not task.done() and task.get_loop() is _running_loop()
+    
+    async def _write_behind(self, collection: str, version: int):
+        """
+        将集合持久化到至少 version 版本
+        
+        同一集合的写盘在I/O锁内串行执行，排队期间已被之前的写盘覆盖的版本直接返回，
+        并发写入因此合并为一次写盘。分区集合只重写变更涉及的段，日志模式下追加暂存的
+        日志记录，否则写入集合快照；编码与磁盘I/O都在I/O线程池中进行，不持有存储锁。
+        """
+        async with self._io_lock(collection):
+            if self._synced.get(collection, 0) >= version:
+                return
+            await self._persist(collection)
+        
+        # 没有后台任务时由本次写盘执行到期的检查点
+        if collection in self._checkpoints_due:
+            self._checkpoints_due.discard(collection)
+            await self._checkpoint(collection)
+    
+    async def _persist(self, collection: str):
+        """
+        将集合持久化到当前版本，调用方必须持有集合的I/O锁
+        
+        共享数据目录时在跨进程锁内写盘，写盘前先合并其他进程的写入。
+        """
+        if self._sync_dir is None:
+            await self._write_changes(collection)
+            return
+        
+        async def write():
+            # 与写盘开始处取版本号在同一段同步代码中，之后暂存的变更留给下一次写盘
+            pending = self._unsynced_keys.pop(collection, set())
+            try:
+                await self._write_changes(collection)
+            except Exception:
+                self._unsynced_keys.setdefault(collection, set()).update(pending)
+                raise
+        
+        await self._exclusive(collection, write)
+    
+    async def _write_changes(self, collection: str):
+        """写出集合自上次持久化以来的变更"""
+        target = self._versions[collection]
+        
+        config = self.config
+        partition = self.partitions.get(collection)
+        if partition is not None:
+            dirty, partition.dirty = partition.dirty, set()
+            records = self.collections.get(collection, {})
+            segments = {
+                segment: {key: records[key] for key in partition.segment_keys.get(segment, {})}
+                for segment in dirty
+            }
+            try:
+                sizes = await self._run_io(
+                    partition.write_segments, segments, partition.manifest()
+                )
+            except Exception:
+                partition.dirty |= dirty
+                raise
+            for segment, size in sizes.items():
+                if (collection, segment) in self._segment_cache:
+                    self._segment_cache[(collection, segment)] = size
+        elif config and config.journal_enabled:
+            entries = self._journal_buffers.pop(collection, [])
+            journal = await self._open_journal(collection)
+            try:
+                await self._run_io(journal.append, entries)
+            except Exception:
+                self._journal_buffers[collection] = (
+                    entries + self._journal_buffers.get(collection, [])
                 )
+                raise
+            
+            if journal.record_count >= config.checkpoint_threshold:
+                self._schedule_checkpoint(collection)
+        else:
+            snapshot = self._snapshot(collection)
+            await self._run_io(self._write_collection_file, collection, snapshot)
+        
+        self._synced[collection] = target
+    
+    async def _open_journal(self, collection: str) -> CollectionJournal:
+        """获取集合的日志，不存在时创建"""
+        journal = self.journals.get(collection)
+        if journal is None:
+            data_dir = cast(Path, self.data_dir)
+            journal = CollectionJournal(data_dir / f"{collection}{JOURNAL_SUFFIX}")
+            await self._run_io(journal.open)
+            self.journals[collection] = journal
+        return journal
+    
+    def _collection_lock(self, collection: str) -> anyio.Lock:
+        """集合的写锁，不同集合的写入可以并发进行"""
+        lock = self._collection_locks.get(collection)
+        if lock is None:
+            lock = self._collection_locks[collection] = anyio.Lock()
+        return lock
+    
+    def _snapshot(self, collection: str) -> Dict[str, Any]:
+        """
+        集合的只读快照（写时复制）
+        
+        快照按集合的修改代数缓存，集合未被修改时重复读取不再复制；
+        需要跨越await遍历集合的读操作应使用快照，快照不能被修改。
+        """
+        generation = self._generations.get(collection, 0)
+        cached = self._snapshots.get(collection)
+        if cached is None or cached[0] != generation:
+            cached = (generation, dict(self.collections.get(collection, {})))
+            self._snapshots[collection] = cached
+        return cached[1]
+    
+    def _io_lock(self, collection: str) -> anyio.Lock:
+        """集合的I/O锁，保证同一集合的写盘顺序"""
+        lock = self._io_locks.get(collection)
+        if lock is None:
+            lock = self._io_locks[collection] = anyio.Lock()
+        return lock
+    
+    async def _run_io(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        在I/O线程池中执行阻塞的序列化与磁盘操作
+        
+        io_workers 为0时直接在事件循环线程中执行，仅用于对比测试。
+        """
+        if self.config and self.config.io_workers == 0:
+            return fn(*args)
+        return await self._wait_io(self._submit_io(fn, *args))
+    
+    def _submit_io(self, fn: Callable[..., T], *args: Any) -> "Future[T]":
+        """
+        立即把阻塞操作提交到I/O线程池
+        
+        与 _run_io 不同，提交不经过事件循环调度：等待方被取消、事件循环关闭前取消
+        全部任务都不会阻止已提交的操作执行，用于跨进程锁的获取与释放。
+        io_workers 为0时直接执行并返回已完成的future。
+        """
+        if self._io_executor is None:
+            future: "Future[T]" = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._io_executor.submit(fn, *args)
+    
+    async def _wait_io(self, future: "Future[T]", shield: bool = False) -> T:
+        """
+        等待已提交到I/O线程池的操作
+        
+        asyncio中直接等待future；trio没有等待线程池future的原语，由anyio工作线程阻塞等待，
+        等待方被取消时不再等待结果。shield 为True时等待方被取消也不会取消操作本身。
+        """
+        if _running_loop() is None:
+            return await anyio.to_thread.run_sync(future.result, abandon_on_cancel=True)
+        waiter = asyncio.wrap_future(future)
+        if shield:
+            return await asyncio.shield(waiter)
+        return await waiter
+    
+    async def _flush_loop(self):
+        """后台刷盘：每隔 flush_interval 秒或被待持久化变更数唤醒时刷盘"""
+        config = cast(StorageConfig, self.config)
+        event = cast(asyncio.Event, self._flush_requested)
+        while True:
+            try:
+                await asyncio.wait_for(event.wait(), timeout=config.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            event.clear()
+            await self.flush()
+    
+    def _schedule_checkpoint(self, collection: str):
+        """
+        调度后台检查点，同一集合同时只有一个检查点任务
+        
+        不在asyncio中运行时没有脱离调用方的后台任务，只记录检查点到期，
+        由本次写盘在释放I/O锁后执行。
+        """
+        if _running_loop() is None:
+            self._checkpoints_due.add(collection)
+            return
+        task = self._checkpoint_tasks.get(collection)
+        if task and not task.done():
+            return
+        self._checkpoint_tasks[collection] = asyncio.ensure_future(
+            self._checkpoint(collection)
+        )
+    
+    async def _checkpoint(self, collection: str):
+        """
+        将日志合并回集合文件
+        
+        在I/O锁内轮转日志并取集合快照（内存数据总是包含已写入日志的全部变更），
+        快照写盘期间新的写入继续追加到新日志。
+        """
+        try:
+            if self._sync_dir is not None:
+                async with self._io_lock(collection):
+                    await self._shared_checkpoint(collection)
+                return
+            
+            async with self._io_lock(collection):
+                journal = self.journals.get(collection)
+                if journal is None or journal.record_count == 0:
+                    return
+                checkpoint_path = await self._run_io(journal.rotate)
+                snapshot = self._snapshot(collection)
+            
+            await self._run_io(self._write_collection_file, collection, snapshot)
+            checkpoint_path.unlink(missing_ok=True)
+            
+            self.logger.debug(f"检查点完成: {collection}, {len(snapshot)}条记录")
             
         except Exception as e:
-            self.logger.error(f"保存集合失败 {collection}: {e}")
-            raise 
\ No newline at end of file
+            self.logger.error(f"检查点失败 {collection}: {e}")
+    
+    async def _shared_checkpoint(self, collection: str):
+        """
+        共享数据目录时的检查点，调用方必须持有集合的I/O锁
+        
+        轮转日志与写入集合文件都在跨进程锁内完成，其他进程看到代数变化后重新打开日志。
+        """
+        journal = self.journals.get(collection)
+        if journal is None or journal.record_count == 0:
+            return
+        
+        async def checkpoint():
+            # 合并其他进程的写入时日志会被关闭，留给下一次检查点
+            current = self.journals.get(collection)
+            if current is None:
+                return
+            checkpoint_path = await self._run_io(current.rotate)
+            snapshot = self._snapshot(collection)
+            await self._run_io(self._write_collection_file, collection, snapshot)
+            checkpoint_path.unlink(missing_ok=True)
+        
+        await self._exclusive(collection, checkpoint)
+    
+    async def _wait_checkpoints(self, collection: Optional[str] = None):
+        """
+        等待进行中的检查点任务
+        
+        Args:
+            collection: 只等待该集合的检查点，为None时等待全部集合
+        """
+        names = list(self._checkpoint_tasks) if collection is None else [collection]
+        loop = _running_loop()
+        tasks = []
+        for name in names:
+            task = self._checkpoint_tasks.pop(name, None)
+            # 已结束的事件循环中的任务已随之结束
+            if task is not None and not task.done() and task.get_loop() is loop:
+                tasks.append(task)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    
+    def _sync_file(self, collection: str) -> CollectionGeneration:
+        """集合的代数文件"""
+        sync = self._sync_files.get(collection)
+        if sync is None:
+            path = cast(Path, self._sync_dir) / f"{collection}{GENERATION_SUFFIX}"
+            sync = self._sync_files[collection] = CollectionGeneration(path)
+        return sync
+    
+    async def _track_generation(self, collection: str):
+        """在读取集合数据之前记录它的代数，之后代数变化说明其他进程写入过"""
+        if self._sync_dir is None:
+            return
+        self._known_generations[collection] = await self._run_io(
+            self._sync_file(collection).read
+        )
+    
+    async def _exclusive(
+        self,
+        collection: str,
+        action: Optional[Callable[[], Awaitable[None]]]
+    ):
+        """
+        在集合的跨进程锁内执行写盘，调用方必须持有集合的I/O锁
+        
+        代数与本进程已知的不同时先合并其他进程的写入；action 完成后递增代数，
+        action 为None时只合并。
+        
+        Args:
+            collection: 集合名称
+            action: 写盘操作
+        """
+        sync = self._sync_file(collection)
+        acquiring = self._submit_io(sync.acquire)
+        try:
+            generation = await self._wait_io(acquiring, shield=True)
+        except anyio.get_cancelled_exc_class():
+            # 等锁期间被取消时，I/O线程仍会拿到锁，拿到后在该线程中立即释放
+            def release_abandoned(done: "Future[int]"):
+                if not done.cancelled() and done.exception() is None:
+                    sync.release()
+            
+            acquiring.add_done_callback(release_abandoned)
+            raise
+        written: Optional[int] = None
+        try:
+            if generation != self._known_generations.get(collection, 0):
+                await self._merge_external(collection)
+                self._known_generations[collection] = generation
+            if action is not None:
+                await action()
+                written = generation + 1
+        finally:
+            # 释放锁立即提交到I/O线程，不能依赖之后被调度（可能被取消）的任务
+            await self._wait_io(self._submit_io(sync.release, written), shield=True)
+        if written is not None:
+            self._known_generations[collection] = written
+    
+    async def _merge_external(self, collection: str):
+        """
+        读取其他进程写入的集合数据，并叠加本进程尚未写盘的变更
+        
+        未加载的集合无需合并；分区集合只重新读取有未写盘变更或正在使用的段，
+        其余已加载的段直接丢弃，之后按需从磁盘加载。
+        """
+        if collection in self._unloaded:
+            return
+        partition = self.partitions.get(collection)
+        if partition is not None:
+            await self._merge_partition(collection, partition)
+            return
+        
+        # 其他进程可能已轮转日志，重新打开
+        journal = self.journals.pop(collection, None)
+        if journal:
+            journal.close()
+        
+        merged = await self._read_collection(collection)
+        
+        # 以下在两次await之间同步完成，期间暂存的变更都在 _unsynced_keys 中
+        records = self.collections.get(collection, {})
+        for key in self._unsynced_keys.get(collection, ()):
+            if key in records:
+                merged[key] = records[key]
+            else:
+                merged.pop(key, None)
+        self.collections[collection] = merged
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        indexes = self.indexes.get(collection)
+        if indexes:
+            indexes.rebuild(merged)
+        self._invalidate_views(collection)
+        
+        self.logger.debug(f"已合并其他进程的写入: {collection}, {len(merged)}条记录")
+    
+    async def _merge_partition(self, collection: str, partition: PartitionedCollection):
+        """合并其他进程对分区集合的写入"""
+        counts = await self._run_io(partition.read_manifest)
+        
+        def needs_reload(segment: str) -> bool:
+            return segment in partition.dirty or (collection, segment) in self._segment_pins
+        
+        # 读取期间可能有新的段被修改，直到需要重新读取的段都已读取
+        disk_segments: Dict[str, Dict[str, Any]] = {}
+        while True:
+            missing = [
+                segment for segment in partition.loaded
+                if needs_reload(segment) and segment not in disk_segments
+            ]
+            if not missing:
+                break
+            for segment in missing:
+                disk_segments[segment], _ = await self._run_io(partition.read_segment, segment)
+        
+        # 以下同步完成
+        pending = self._unsynced_keys.get(collection, set())
+        records = self.collections.setdefault(collection, {})
+        indexes = self.indexes.get(collection)
+        
+        def put(key: str, record: Optional[Dict[str, Any]]):
+            old = records.get(key)
+            if record is None:
+                records.pop(key, None)
+            else:
+                records[key] = record
+            if indexes:
+                indexes.replace(key, old, record)
+        
+        for segment in list(partition.loaded):
+            if segment in disk_segments:
+                continue
+            for key in partition.unload(segment):
+                put(key, None)
+            self._segment_cache.pop((collection, segment), None)
+        
+        for segment, disk_records in disk_segments.items():
+            if segment not in partition.loaded:
+                continue
+            current = list(partition.segment_keys.get(segment, {}))
+            for key in current:
+                if key not in pending and key not in disk_records:
+                    put(key, None)
+            for key, record in disk_records.items():
+                if key not in pending:
+                    put(key, record)
+            partition.mark_loaded(segment, [
+                *(key for key in current if key in pending and key in records),
+                *(key for key in disk_records if key not in pending),
+            ])
+        
+        # 未加载的段以磁盘清单为准
+        for segment in list(partition.counts):
+            if segment not in partition.loaded and segment not in counts:
+                del partition.counts[segment]
+        for segment, count in counts.items():
+            if segment not in partition.loaded:
+                partition.counts[segment] = count
+        self._generations[collection] = self._generations.get(collection, 0) + 1
+        self._invalidate_views(collection)
+        
+        self.logger.debug(
+            f"已合并其他进程的写入: {collection}, 重新读取{len(disk_segments)}个分区"
+        )
+    
+    def _mark_stale(self, collection: str):
+        """代数文件变化时由监听线程调用，只记录集合，下一次访问集合时重新加载"""
+        if self._initialized:
+            self._refresh_pending.add(collection)
+    
+    async def _refresh_if_stale(self, collection: str):
+        """集合被监听线程标记为过期时合并其他进程的写入"""
+        if collection in self._refresh_pending:
+            await self._refresh(collection)
+    
+    async def _refresh(self, collection: str):
+        """其他进程写盘后合并它们对集合的变更；本进程自己的写盘按代数过滤"""
+        while collection in self._refresh_pending:
+            self._refresh_pending.discard(collection)
+            try:
+                generation = await self._run_io(self._sync_file(collection).read)
+                if generation == self._known_generations.get(collection, 0):
+                    continue
+                
+                async with self._io_lock(collection):
+                    config = cast(StorageConfig, self.config)
+                    if config.lazy_loading and collection not in self.collections:
+                        # 其他进程新建的集合，首次访问时再加载
+                        self._unloaded.add(collection)
+                        self._invalidate_views(collection)
+                        continue
+                    # 其他进程新建的集合同样合并到（可能已有本进程写入的）内存集合
+                    await self._exclusive(collection, None)
+                
+            except Exception as e:
+                self.logger.error(f"重新加载集合失败 {collection}: {e}")
+    
+    async def _backup_if_due(self):
+        """auto_backup 开启且到了下一次备份的时间时创建增量备份，并行的写入不重复备份"""
+        due = self._next_backup_at
+        if due is None or time.time() < due:
+            return
+        config = cast(StorageConfig, self.config)
+        self._next_backup_at = time.time() + config.backup_interval
+        await self.create_backup()
+    
+    def _backup_root(self) -> Path:
+        """定时备份的根目录"""
+        config = cast(StorageConfig, self.config)
+        if config.backup_path:
+            return Path(config.backup_path)
+        return cast(Path, self.data_dir) / BACKUP_DIR
+    
+    def _collection_names(self) -> List[str]:
+        """全部集合名称，包括尚未加载的集合"""
+        return [*self.collections, *sorted(self._unloaded)]
+    
+    async def _write_backup(
+        self,
+        backup_dir: Path,
+        collections: List[str],
+        previous: Optional[Path] = None
+    ) -> Dict[str, Any]:
+        """
+        将集合备份到目录，最后写入备份清单
+        
+        每个集合在自己的I/O锁内先持久化到当前版本，再硬链接数据文件（只有目录操作），
+        因此备份中的每个集合都是某个版本的完整状态；数据文件总是整体替换写入，
+        之后的写盘不会改变已链接的文件。日志模式的集合备份内存快照，
+        与上一次备份相比修改代数未变化时直接链接上一次备份的文件。
+        
+        Args:
+            backup_dir: 备份目录
+            collections: 要备份的集合
+            previous: 上一次备份的目录，None表示完整备份
+            
+        Returns:
+            Dict[str, Any]: 备份清单
+        """
+        config = cast(StorageConfig, self.config)
+        previous_generations: Dict[str, int] = {}
+        if previous is not None and self._last_backup and self._last_backup[0] == previous.name:
+            previous_generations = self._last_backup[1]
+        
+        generations: Dict[str, int] = {}
+        copied = 0
+        for collection in collections:
+            partition = self.partitions.get(collection)
+            if partition is not None:
+                async with self._io_lock(collection):
+                    if self._synced.get(collection, 0) < self._versions.get(collection, 0):
+                        await self._persist(collection)
+                    copied += await self._run_io(
+                        link_directory, partition.directory, backup_dir / collection,
+                        previous / collection if previous else None
+                    )
+            elif config.journal_enabled and collection in self.collections:
+                # 日志文件会被原地追加，不能链接；快照在取得时即是一致的
+                generation = self._generations.get(collection, 0)
+                snapshot = self._snapshot(collection)
+                generations[collection] = generation
+                reuse = previous if previous_generations.get(collection) == generation else None
+                copied += await self._run_io(
+                    self._backup_snapshot, collection, snapshot, backup_dir, reuse
+                )
+            elif collection in self.collections or collection in self._unloaded:
+                async with self._io_lock(collection):
+                    if self._synced.get(collection, 0) < self._versions.get(collection, 0):
+                        await self._persist(collection)
+                    copied += await self._run_io(
+                        self._link_collection_files, collection, backup_dir, previous
+                    )
+        
+        manifest = {
+            "created_at": datetime.now().isoformat(),
+            "base": previous.name if previous else None,
+            "collections": list(collections),
+            "generations": generations,
+            "copied_bytes": copied,
+        }
+        await self._run_io(write_backup_manifest, backup_dir, manifest)
+        return manifest
+    
+    def _backup_snapshot(
+        self,
+        collection: str,
+        snapshot: Dict[str, Any],
+        backup_dir: Path,
+        previous: Optional[Path]
+    ) -> int:
+        """写出集合快照到备份目录，previous 中有同一版本的文件时直接链接，返回复制的字节数"""
+        self._remove_backup_files(collection, backup_dir)
+        previous_file = find_record_file(previous, collection) if previous else None
+        if previous_file is not None:
+            return link_or_copy(previous_file, backup_dir / previous_file.name)
+        return self.file_format.write(backup_dir, collection, snapshot)
+    
+    def _link_collection_files(
+        self,
+        collection: str,
+        backup_dir: Path,
+        previous: Optional[Path]
+    ) -> int:
+        """链接集合文件到备份目录，遗留的日志文件复制，返回复制的字节数"""
+        data_dir = cast(Path, self.data_dir)
+        self._remove_backup_files(collection, backup_dir)
+        copied = 0
+        for file_name in self._collection_file_names(collection):
+            source_file = data_dir / file_name
+            if not source_file.exists():
+                continue
+            if file_name.endswith(tuple(DATA_SUFFIXES)):
+                copied += link_or_copy(
+                    source_file, backup_dir / file_name,
+                    previous / file_name if previous else None
+                )
+            else:
+                shutil.copy2(source_file, backup_dir / file_name)
+                copied += source_file.stat().st_size
+        return copied
+    
+    def _remove_backup_files(self, collection: str, backup_dir: Path):
+        """删除备份目录中集合的旧文件，重复备份到同一目录时不残留其他格式的文件"""
+        for file_name in self._collection_file_names(collection):
+            (backup_dir / file_name).unlink(missing_ok=True)
+    
+    def _collection_bytes(self, collection: str) -> int:
+        """集合在数据目录中占用的字节数，包括日志与分区段"""
+        if self.data_dir is None:
+            return 0
+        paths = [self.data_dir / file_name for file_name in self._collection_file_names(collection)]
+        partition = self.partitions.get(collection)
+        if partition is not None and partition.directory.exists():
+            paths.extend(partition.directory.iterdir())
+        total = 0
+        for path in paths:
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                # 并发写盘的临时文件可能已被替换
+                continue
+        return total
+    
+    def _collection_file_names(self, collection: str) -> List[str]:
+        """集合在数据目录中对应的所有文件名，包括各种格式的集合文件"""
+        return [
+            *(f"{collection}{suffix}" for suffix in DATA_SUFFIXES),
+            f"{collection}{CHECKPOINT_SUFFIX}",
+            f"{collection}{JOURNAL_SUFFIX}",
+        ]
+    
+    @staticmethod
+    def _read_collection_file(file_path: Path) -> Dict[str, Any]:
+        """读取并解析JSON文件"""
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _write_collection_file(self, collection: str, records: Dict[str, Any]):
+        """按配置的格式原子地写入集合文件，并删除其他格式的旧文件"""
+        self.file_format.write(cast(Path, self.data_dir), collection, records)
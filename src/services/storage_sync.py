@@ -0,0 +1,155 @@
+"""
+多进程共享数据目录的协调
+每个集合在 .sync 目录下有一个代数文件：写盘的进程持有该文件上的 fcntl 排他锁，
+写盘完成后递增代数；其他进程用 watchdog 监听代数文件的变化，只重新加载变化的集合
+"""
+
+import os
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，代数仍然维护但不加锁
+    fcntl = None  # type: ignore
+
+try:
+    from watchdog.events import FileSystemEvent, FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # 没有 watchdog 时只在写盘前检查代数
+    FileSystemEventHandler = object  # type: ignore
+    Observer = None  # type: ignore
+
+# 代数文件所在目录（数据目录下）与后缀
+SYNC_DIR = ".sync"
+GENERATION_SUFFIX = ".gen"
+
+
+class CollectionGeneration:
+    """
+    集合的跨进程写锁与修改代数
+
+    acquire 与 release 是阻塞调用，应在I/O线程中执行；锁属于打开的文件，
+    因此可以在一个线程中获取、在另一个线程中释放。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def read(self) -> int:
+        """
+        读取当前代数，文件不存在时为0
+
+        不加锁、不等待正在写盘的进程：读到写入中途的值只会多触发一次刷新，
+        刷新本身在排他锁下重新读取代数。
+        """
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return 0
+        try:
+            return _read_generation(fd)
+        except ValueError:
+            return 0
+        finally:
+            os.close(fd)
+
+    def acquire(self) -> int:
+        """
+        获取排他锁，其他进程持有锁时等待
+
+        Returns:
+            int: 加锁时的代数
+        """
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            generation = _read_generation(fd)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return generation
+
+    def release(self, generation: Optional[int] = None) -> None:
+        """
+        释放排他锁
+
+        Args:
+            generation: 写入的新代数，None表示没有写盘、代数不变
+        """
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        try:
+            if generation is not None:
+                data = str(generation).encode("ascii")
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, data)
+                os.fsync(fd)
+        finally:
+            os.close(fd)  # 关闭文件同时释放锁
+
+
+class _GenerationEventHandler(FileSystemEventHandler):
+    """把代数文件的变化以集合名转交给回调"""
+
+    def __init__(self, callback: Callable[[str], None]):
+        super().__init__()
+        self.callback = callback
+
+    def on_any_event(self, event: "FileSystemEvent") -> None:
+        if event.is_directory or event.event_type not in ("created", "modified", "moved", "closed"):
+            return
+        path = Path(getattr(event, "dest_path", "") or event.src_path)
+        if path.suffix == GENERATION_SUFFIX:
+            self.callback(path.stem)
+
+
+class GenerationWatcher:
+    """
+    监听 .sync 目录中代数文件的变化
+
+    回调在监听线程中以集合名调用，不依赖任何事件循环，只应记录哪些集合变化了，
+    由调用方在下一次访问集合时处理；本进程自己的写盘同样会触发回调，
+    由调用方按已知代数过滤。
+    """
+
+    def __init__(self, directory: Path, callback: Callable[[str], None]):
+        self.directory = directory
+        self._handler = _GenerationEventHandler(callback)
+        self._observer = None
+
+    @property
+    def available(self) -> bool:
+        """watchdog 是否可用"""
+        return Observer is not None
+
+    def start(self) -> None:
+        """开始监听，watchdog 不可用时不做任何事"""
+        if Observer is None or self._observer is not None:
+            return
+        observer = Observer()
+        observer.schedule(self._handler, str(self.directory), recursive=False)
+        observer.daemon = True
+        observer.start()
+        self._observer = observer
+
+    def stop(self) -> None:
+        """停止监听并等待监听线程退出"""
+        observer, self._observer = self._observer, None
+        if observer is not None:
+            observer.stop()
+            observer.join()
+
+
+# ============ 私有函数 ============
+
+def _read_generation(fd: int) -> int:
+    """从文件开头读取代数"""
+    os.lseek(fd, 0, os.SEEK_SET)
+    data = os.read(fd, 32).strip()
+    return int(data) if data else 0
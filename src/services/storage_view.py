@@ -0,0 +1,67 @@
+"""
+记录只读视图
+直接引用存储中的记录，隐藏内部元数据字段并可限定可见字段，读取时不复制记录
+"""
+
+from typing import Any, Iterator, List, Mapping, Optional
+
+
+class RecordView(Mapping):
+    """
+    记录的只读视图
+
+    存储中的记录在写入后不再被原地修改（更新总是替换为新的记录），
+    因此视图始终对应取出时的记录版本，不会观察到之后的写入。
+    嵌套的字典与列表同样与存储共享，调用方不应修改。
+    """
+
+    __slots__ = ("_record", "_fields")
+
+    def __init__(self, record: Mapping[str, Any], fields: Optional[List[str]] = None):
+        self._record = record
+        self._fields = fields
+
+    def __getitem__(self, key: str) -> Any:
+        if not self._visible(key):
+            raise KeyError(key)
+        return self._record[key]
+
+    def __iter__(self) -> Iterator[str]:
+        if self._fields is not None:
+            return (key for key in self._fields if self._visible(key) and key in self._record)
+        return (key for key in self._record if not key.startswith("_"))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"RecordView({dict(self)!r})"
+
+    def _visible(self, key: str) -> bool:
+        """字段是否在视图中可见"""
+        if key.startswith("_"):
+            return False
+        return self._fields is None or key in self._fields
+
+
+def project(
+    record: Mapping[str, Any],
+    fields: Optional[List[str]] = None,
+    read_only: bool = False
+) -> Mapping[str, Any]:
+    """
+    按查询选项返回记录：只读视图，或去掉内部元数据（并按字段投影）的新字典
+
+    Args:
+        record: 存储中的记录
+        fields: 返回的字段，None表示全部字段
+        read_only: 是否返回只读视图
+
+    Returns:
+        Mapping[str, Any]: 只读视图或新字典
+    """
+    if read_only:
+        return RecordView(record, fields)
+    if fields is not None:
+        return {key: record[key] for key in fields if key in record and not key.startswith("_")}
+    return {key: value for key, value in record.items() if not key.startswith("_")}
@@ -11,9 +11,11 @@ from .compatibility import (
     initialize_openai_client,
     get_chatbot_response,
     manage_conversation_history,
-    check_environment
+    check_environment,
+    list_sessions,
+    close_openai_client
 )
-from .adapters import UIAdapter, get_global_adapter
+from .adapters import UIAdapter, get_global_adapter, shutdown_global_adapter
 
 __all__ = [
     # 主要接口
@@ -25,8 +27,11 @@ __all__ = [
     "get_chatbot_response",
     "manage_conversation_history",
     "check_environment",
+    "list_sessions",
+    "close_openai_client",
     
     # 适配器
     "UIAdapter",
-    "get_global_adapter"
+    "get_global_adapter",
+    "shutdown_global_adapter"
 ]
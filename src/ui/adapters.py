@@ -9,9 +9,9 @@ import logging
 import uuid
 
 from services.service_container import ServiceContainer, ServiceConfig
-from contracts.model_provider import ModelConfig
+from contracts.model_provider import ModelConfig, ModelResponse
 from contracts.message_handler import MessageContext
-from core.models import User, create_default_user
+from core.models import Message, User, create_default_user
 from core.errors import ChatBotError
 
 
@@ -110,43 +110,96 @@ class UIAdapter:
         if not processed_message.is_valid:
             return f"消息处理失败: {processed_message.error_message}"
 
+        # 用户消息在调用模型之前保存，模型调用失败时不会丢失；
+        # 会话计数在本轮结束时与助手回复一起写入一次
+        user_message = None
         if self.current_session_id:
-            await session_manager.add_message(
+            user_message = await session_manager.add_message(
                 self.current_session_id,
                 "user",
-                processed_message.content
+                processed_message.content,
+                count=False
             )
 
-        ai_messages = await message_handler.prepare_context_for_ai(
-            processed_message.content,
-            context
-        )
+        try:
+            ai_messages = await message_handler.prepare_context_for_ai(
+                processed_message.content,
+                context
+            )
+
+            provider = provider_registry.get_provider()
+            if provider:
+                model_config = ModelConfig(
+                    model_name="qwen3",
+                    provider="openai"
+                )
+                response = await provider.generate_response(ai_messages, model_config)
+                formatted_response = await message_handler.format_response(
+                    response.content,
+                    context
+                )
+        except Exception:
+            await self._count_unanswered(user_message)
+            raise
 
-        provider = provider_registry.get_provider()
         if not provider:
+            await self._count_unanswered(user_message)
             return "AI服务暂时不可用，请稍后重试。"
 
-        model_config = ModelConfig(
-            model_name="qwen3",
-            provider="openai"
-        )
-
-        response = await provider.generate_response(ai_messages, model_config)
-
-        formatted_response = await message_handler.format_response(
-            response.content,
-            context
-        )
-
-        if self.current_session_id:
-            await session_manager.add_message(
+        if self.current_session_id and user_message is not None:
+            # 助手回复与本轮的token用量一起计入会话
+            await session_manager.record_turn(
                 self.current_session_id,
-                "assistant",
-                formatted_response
+                user_message,
+                formatted_response,
+                _token_usage(response)
             )
         
         return formatted_response
 
+    async def _count_unanswered(self, user_message: Optional[Message]):
+        """本轮没有得到回复时，单独把已保存的用户消息计入会话"""
+        if self.current_session_id and user_message is not None:
+            assert self.container is not None, "服务容器未初始化"
+            await self.container.get_session_manager().count_messages(
+                self.current_session_id, [user_message]
+            )
+
+    async def list_sessions(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 20
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按游标分页列出当前用户的会话摘要，供会话列表滚动加载
+        
+        Returns:
+            Tuple[List[Dict[str, Any]], Optional[str]]: 会话摘要与下一页的游标
+        """
+        if not self._initialized:
+            await self.initialize()
+
+        assert self.container is not None, "服务容器未初始化"
+        session_manager = self.container.get_session_manager()
+        if session_manager is None or self.current_user is None:
+            return [], None
+
+        sessions, next_cursor = await session_manager.get_user_sessions_page(
+            self.current_user.user_id, limit, cursor
+        )
+        summaries = [
+            {
+                "session_id": session.session_id,
+                "title": session.title,
+                "message_count": session.message_count,
+                "last_message_at": session.last_message_at,
+                "created_at": session.created_at,
+                "is_current": session.session_id == self.current_session_id,
+            }
+            for session in sessions
+        ]
+        return summaries, next_cursor
+
     def manage_conversation_history(
         self,
         conversation_history: List[Dict[str, str]],
@@ -176,6 +229,15 @@ class UIAdapter:
 _global_adapter: Optional[UIAdapter] = None
 _initialization_lock: Optional[asyncio.Lock] = None
 
+def _token_usage(response: ModelResponse) -> Dict[str, int]:
+    """模型响应的token用量，提供者返回了输入与输出token时一并带上"""
+    usage = {"total_tokens": response.usage_tokens}
+    for name in ("prompt_tokens", "completion_tokens"):
+        if isinstance(response.metadata.get(name), int):
+            usage[name] = response.metadata[name]
+    return usage
+
+
 def _get_initialization_lock():
     """延迟创建初始化锁，避免在模块导入时创建事件循环"""
     global _initialization_lock
@@ -210,4 +272,13 @@ async def get_global_adapter(openai_api_key: Optional[str] = None) -> UIAdapter:
         if not _global_adapter._initialized:
             await _global_adapter.initialize()
 
-    return _global_adapter 
\ No newline at end of file
+    return _global_adapter
+
+
+async def shutdown_global_adapter():
+    """关闭全局UI适配器，写出存储中尚未落盘的数据"""
+    global _global_adapter
+    
+    if _global_adapter:
+        await _global_adapter.close()
+        _global_adapter = None
@@ -10,8 +10,11 @@ from .compatibility import (
     get_chatbot_response,
     manage_conversation_history,
     check_environment,
+    list_sessions,
+    close_openai_client,
     CLI_HELP_MESSAGE,
-    MAX_CONVERSATION_HISTORY
+    MAX_CONVERSATION_HISTORY,
+    SESSION_PAGE_SIZE
 )
 
 
@@ -34,7 +37,8 @@ def print_help():
 • clear, 清空          - 清空对话历史
 • help, 帮助           - 显示此帮助信息
 • status, 状态         - 显示系统状态
-• sessions, 会话       - 会话管理（开发中）
+• sessions, 会话       - 列出会话
+• more, 更多           - 加载下一页会话
 • debug, 调试          - 显示调试信息
 
 💡 提示：
@@ -68,6 +72,17 @@ def print_debug_info(conversation_history, client):
     print()
 
 
+def print_sessions(sessions, start):
+    """打印一页会话摘要"""
+    for number, session in enumerate(sessions, start):
+        marker = "👉" if session["is_current"] else "  "
+        last = session["last_message_at"] or session["created_at"]
+        print(
+            f"{marker} {number}. {session['title']} "
+            f"({session['message_count']}条消息, {last.strftime('%Y-%m-%d %H:%M')})"
+        )
+
+
 def run_cli_interface():
     """运行命令行界面 - 新架构版本"""
     
@@ -100,14 +115,27 @@ def run_cli_interface():
         print("❌ AI服务初始化失败")
         return
 
-    # 初始化对话历史
-    conversation_history = []
-    
     print("✅ 聊天机器人已启动！")
     print("📝 输入 'help' 或 '帮助' 查看可用命令")
     print("🚪 输入 'quit', 'exit' 或 '退出' 来结束对话\n")
 
-    # 主对话循环
+    # 主对话循环，退出时关闭服务写出未落盘的数据
+    try:
+        run_conversation_loop(client)
+    finally:
+        asyncio.run(close_openai_client())
+
+
+def run_conversation_loop(client):
+    """命令行对话循环，直到用户退出"""
+    import asyncio
+
+    # 初始化对话历史
+    conversation_history = []
+    # 会话列表的下一页游标与已显示的会话数
+    session_cursor = None
+    sessions_shown = 0
+
     while True:
         try:
             # 获取用户输入
@@ -139,13 +167,22 @@ def run_cli_interface():
                 print_debug_info(conversation_history, client)
                 continue
 
-            # 处理会话管理命令
-            if user_input.lower() in ["sessions", "会话"]:
-                print("📋 会话管理功能正在开发中...")
-                print("   • 会话列表")
-                print("   • 会话切换")
-                print("   • 会话删除")
-                print("   敬请期待！\n")
+            # 处理会话列表命令：首页，或按游标加载下一页
+            if user_input.lower() in ["sessions", "会话", "more", "更多"]:
+                if user_input.lower() in ["sessions", "会话"]:
+                    session_cursor, sessions_shown = None, 0
+                    print("\n📋 会话列表:")
+                elif session_cursor is None:
+                    print("📋 没有更多会话\n")
+                    continue
+                sessions, session_cursor = asyncio.run(
+                    list_sessions(client, session_cursor, SESSION_PAGE_SIZE)
+                )
+                print_sessions(sessions, sessions_shown + 1)
+                sessions_shown += len(sessions)
+                if session_cursor:
+                    print("💡 输入 'more' 或 '更多' 加载更多会话")
+                print()
                 continue
 
             # 处理空输入
@@ -214,6 +251,7 @@ def run_enhanced_cli_interface():
             import asyncio
             client = asyncio.run(initialize_openai_client())
             print_status(client)
+            asyncio.run(close_openai_client())
             return
     
     # 运行标准CLI界面
@@ -6,7 +6,7 @@
 import os
 from typing import List, Dict, Any, Optional, Tuple
 import asyncio
-from .adapters import get_global_adapter
+from .adapters import get_global_adapter, shutdown_global_adapter
 
 
 async def initialize_openai_client():
@@ -57,6 +57,18 @@ async def initialize_openai_client():
             return None
 
 
+async def close_openai_client():
+    """
+    关闭客户端（兼容性函数）
+    
+    界面退出前调用，关闭服务并写出尚未落盘的会话与消息
+    """
+    try:
+        await shutdown_global_adapter()
+    except Exception as e:
+        print(f"❌ 关闭服务失败: {e}")
+
+
 async def get_chatbot_response(client, user_input: str, conversation_history: List[Dict[str, str]]) -> str:
     """
     获取聊天机器人响应（兼容性函数）
@@ -80,6 +92,31 @@ async def get_chatbot_response(client, user_input: str, conversation_history: Li
         return f"获取响应失败: {str(e)}"
 
 
+async def list_sessions(
+    client,
+    cursor: Optional[str] = None,
+    limit: int = 20
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    分页列出会话（兼容性函数）
+    
+    Args:
+        client: 客户端对象（实际上是适配器）
+        cursor: 上一页返回的游标，None表示第一页
+        limit: 每页数量
+        
+    Returns:
+        Tuple[List[Dict[str, Any]], Optional[str]]: 会话摘要与下一页的游标，失败时为空列表
+    """
+    try:
+        if not client:
+            return [], None
+        return await client.list_sessions(cursor, limit)
+    except Exception as e:
+        print(f"❌ 获取会话列表失败: {e}")
+        return [], None
+
+
 def manage_conversation_history(
     conversation_history: List[Dict[str, str]],
     user_input: str,
@@ -134,6 +171,7 @@ class MockSettings:
     APP_TITLE = "🤖 智能聊天助手"
     APP_DESCRIPTION = "基于AI的智能对话系统，重构架构版本"
     MAX_CONVERSATION_HISTORY = 20
+    SESSION_PAGE_SIZE = 20
     CLI_HELP_MESSAGE = """
 💡 使用帮助：
 • 确保设置了 OPENAI_API_KEY 环境变量
@@ -146,4 +184,5 @@ class MockSettings:
 APP_TITLE = MockSettings.APP_TITLE
 APP_DESCRIPTION = MockSettings.APP_DESCRIPTION  
 MAX_CONVERSATION_HISTORY = MockSettings.MAX_CONVERSATION_HISTORY
+SESSION_PAGE_SIZE = MockSettings.SESSION_PAGE_SIZE
 CLI_HELP_MESSAGE = MockSettings.CLI_HELP_MESSAGE 
\ No newline at end of file
@@ -10,9 +10,12 @@ from .compatibility import (
     initialize_openai_client,
     get_chatbot_response,
     manage_conversation_history,
+    list_sessions,
+    close_openai_client,
     APP_TITLE,
     APP_DESCRIPTION,
-    MAX_CONVERSATION_HISTORY
+    MAX_CONVERSATION_HISTORY,
+    SESSION_PAGE_SIZE
 )
 
 # 配置日志以便在Streamlit中查看OpenAI日志
@@ -158,6 +161,7 @@ def run_streamlit_interface():
                     st.info("请确保设置了OPENAI_API_KEY环境变量")
                     st.stop()
                 st.session_state.client = client
+                register_shutdown()
                 # 静默初始化成功，不显示成功消息避免每次刷新都显示
         except Exception as e:
             st.error(f"初始化失败: {str(e)}")
@@ -281,6 +285,56 @@ def run_streamlit_interface():
         })
 
 
+_shutdown_registered = False
+
+
+def register_shutdown():
+    """Streamlit服务进程退出时关闭服务，写出尚未落盘的会话与消息（每个进程只注册一次）"""
+    global _shutdown_registered
+    if _shutdown_registered:
+        return
+    import asyncio
+    import atexit
+    atexit.register(lambda: asyncio.run(close_openai_client()))
+    _shutdown_registered = True
+
+
+def run_async(coro):
+    """在Streamlit脚本线程中运行协程，复用线程的事件循环"""
+    import asyncio
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    return loop.run_until_complete(coro)
+
+
+def render_session_list(client):
+    """会话列表：首屏加载一页，之后按游标逐页追加"""
+    if "session_list" not in st.session_state or st.button("🔄 刷新会话列表"):
+        st.session_state.session_list, st.session_state.session_cursor = run_async(
+            list_sessions(client, None, SESSION_PAGE_SIZE)
+        )
+    
+    if not st.session_state.session_list:
+        st.info("暂无会话")
+    for session in st.session_state.session_list:
+        last = session["last_message_at"] or session["created_at"]
+        marker = "👉 " if session["is_current"] else ""
+        st.write(
+            f"{marker}**{session['title']}** · {session['message_count']}条消息 · "
+            f"{last.strftime('%Y-%m-%d %H:%M')}"
+        )
+    
+    if st.session_state.session_cursor and st.button("⬇️ 加载更多"):
+        page, st.session_state.session_cursor = run_async(
+            list_sessions(client, st.session_state.session_cursor, SESSION_PAGE_SIZE)
+        )
+        st.session_state.session_list.extend(page)
+        st.rerun()
+
+
 def run_enhanced_streamlit_interface():
     """
     运行增强版Streamlit界面
@@ -304,11 +358,10 @@ def run_enhanced_streamlit_interface():
     
     with tab2:
         st.header("📊 会话管理")
-        st.info("会话管理功能正在开发中...")
-        
-        # 这里可以添加会话列表、切换等功能
-        if st.button("获取会话列表"):
-            st.write("功能开发中，敬请期待")
+        if "client" in st.session_state:
+            render_session_list(st.session_state.client)
+        else:
+            st.info("AI服务初始化后显示会话列表")
     
     with tab3:
         st.header("⚙️ 高级设置")
@@ -0,0 +1,483 @@
+"""
+会话管理器测试
+覆盖消息缓冲、会话缓存、计数、分页与保留策略等会话层行为
+"""
+
+import anyio
+import pytest
+from datetime import datetime, timedelta
+
+from contracts.storage_service import StorageConfig, StorageBackend
+from services.storage_service import FileStorageService
+from services.sqlite_storage_service import SqliteStorageService
+from services.session_manager import SessionManager
+from core.models import Message, SessionStatus
+from core.errors import ValidationError
+
+
+@pytest.fixture(params=["asyncio", "trio"])
+def anyio_backend(request):
+    """会话管理器与存储服务通过anyio同时支持asyncio与trio"""
+    return request.param
+
+
+async def create_storage(data_dir, **kwargs) -> FileStorageService:
+    """创建并初始化文件存储服务"""
+    storage = FileStorageService()
+    config = StorageConfig(
+        backend=StorageBackend.FILE,
+        connection_string=str(data_dir),
+        **kwargs
+    )
+    assert await storage.initialize(config)
+    return storage
+
+
+async def create_sqlite_storage(data_dir) -> SqliteStorageService:
+    """创建并初始化SQLite存储服务"""
+    storage = SqliteStorageService()
+    config = StorageConfig(
+        backend=StorageBackend.SQLITE,
+        connection_string=str(data_dir / "chatbot.db"),
+        max_connections=3
+    )
+    assert await storage.initialize(config)
+    return storage
+
+
+@pytest.mark.anyio
+class TestRecentMessages:
+    """会话最近消息缓冲测试"""
+
+    async def test_buffer_is_warmed_from_storage_and_appended(self, tmp_path):
+        """未缓冲的会话从存储预热，之后新增的消息直接追加"""
+        storage = await create_storage(tmp_path, partitions={"messages": "session_id"})
+        writer = SessionManager(storage)
+        session = await writer.create_session("u1")
+        for i in range(6):
+            await writer.add_message(session.session_id, "user", f"消息{i}")
+            await anyio.sleep(0.001)  # 保证时间戳有序
+
+        manager = SessionManager(storage, recent_messages=4)
+        recent = await manager.get_recent_messages(session.session_id, 3)
+        assert [m.content for m in recent] == ["消息3", "消息4", "消息5"]
+        await manager.add_message(session.session_id, "assistant", "回复")
+        recent = await manager.get_recent_messages(session.session_id)
+        assert [m.content for m in recent] == ["消息3", "消息4", "消息5", "回复"]
+        # 超出缓冲容量时查询存储
+        assert len(await manager.get_recent_messages(session.session_id, 10)) == 7
+        await storage.close()
+
+    async def test_messages_added_while_warming_are_kept(self, tmp_path):
+        """预热查询期间新增的消息不会丢失，最久未使用的会话被淘汰"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage, active_sessions=1)
+        first = await manager.create_session("u1")
+        await manager.add_message(first.session_id, "user", "旧消息")
+        second = await manager.create_session("u1")
+        assert list(manager._recent) == [second.session_id]
+
+        warmed = []
+
+        async def warm():
+            warmed.extend(await manager.get_recent_messages(first.session_id))
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(warm)
+            await anyio.sleep(0)
+            await manager.add_message(first.session_id, "user", "新消息")
+        assert [m.content for m in warmed] == ["旧消息", "新消息"]
+        recent = await manager.get_recent_messages(first.session_id)
+        assert [m.content for m in recent] == ["旧消息", "新消息"]
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestSessionCache:
+    """会话对象缓存与增量更新测试"""
+
+    async def test_update_writes_only_changed_fields(self, tmp_path):
+        """更新只写入变化的字段，缓存的会话对象同步更新"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage)
+        session = await manager.create_session("u1", "标题")
+        await manager.update_session(session.session_id, metadata={"pinned": True})
+
+        writes = []
+        update_data = storage.update_data
+
+        async def record_update(collection, key, data, merge=True):
+            writes.append(dict(data))
+            return await update_data(collection, key, data, merge)
+        storage.update_data = record_update
+
+        assert await manager.update_session(session.session_id, title="新标题", metadata={"tag": "a"})
+        assert set(writes[0]) == {"title", "metadata", "updated_at"}
+        cached = await manager.get_session(session.session_id)
+        assert (cached.title, cached.metadata) == ("新标题", {"pinned": True, "tag": "a"})
+
+        stored = await SessionManager(storage).get_session(session.session_id)
+        assert stored.to_dict() == cached.to_dict()
+        assert not await manager.update_session("missing", title="标题")
+        with pytest.raises(ValidationError):
+            await manager.patch_session(session.session_id, {"session_id": "other"})
+        await storage.close()
+
+    async def test_returned_session_does_not_share_cache(self, tmp_path):
+        """修改 get_session 返回的会话对象不影响之后从缓存读取的会话"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage)
+        created = await manager.create_session("u1", "标题")
+        await manager.patch_session(created.session_id, {"tags": ["工作"]})
+        created.title = "创建后修改"
+
+        session = await manager.get_session(created.session_id)
+        session.title = "未保存的标题"
+        session.message_count = 99
+        session.tags.append("个人")
+        session.model_config.temperature = 0.1
+
+        again = await manager.get_session(created.session_id)
+        assert again is not session
+        assert (again.title, again.message_count, again.tags) == ("标题", 0, ["工作"])
+        assert again.model_config.temperature != 0.1
+        await storage.close()
+
+    async def test_objects_from_read_only_queries_own_nested_data(self, tmp_path):
+        """由只读视图构造的会话与消息不与存储中的记录共享嵌套的字典与列表"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage)
+        session = await manager.create_session("u1")
+        await manager.patch_session(
+            session.session_id, {"tags": ["工作"], "metadata": {"pinned": True}}
+        )
+        message = Message(session_id=session.session_id, metadata={"source": "cli"})
+        await storage.store_data("messages", message.to_dict(), message.message_id)
+
+        listed = (await manager.get_user_sessions("u1"))[0]
+        listed.tags.append("个人")
+        listed.metadata["pinned"] = False
+        loaded = (await manager.get_session_messages(session.session_id))[0]
+        loaded.metadata["source"] = "web"
+
+        stored = await storage.retrieve_data("sessions", session.session_id)
+        assert (stored["tags"], stored["metadata"]) == (["工作"], {"pinned": True})
+        stored = await storage.retrieve_data("messages", message.message_id)
+        assert stored["metadata"] == {"source": "cli"}
+        await storage.close()
+
+    async def test_cache_is_bounded(self, tmp_path):
+        """超出活跃会话上限时淘汰最久未使用的会话对象，删除的会话不再命中"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage, active_sessions=2)
+        sessions = [await manager.create_session("u1") for _ in range(3)]
+        assert list(manager._sessions) == [s.session_id for s in sessions[1:]]
+        reloaded = await manager.get_session(sessions[0].session_id)
+        assert reloaded is not sessions[0] and reloaded.to_dict() == sessions[0].to_dict()
+        await manager.delete_session(reloaded.session_id)
+        assert await manager.get_session(reloaded.session_id) is None
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestSessionCounters:
+    """会话消息计数测试"""
+
+    @pytest.mark.parametrize("backend", ["file", "sqlite"])
+    async def test_concurrent_messages_are_counted(self, tmp_path, backend):
+        """并发添加的消息都计入会话，缓存的会话对象与存储一致"""
+        if backend == "file":
+            storage = await create_storage(tmp_path)
+        else:
+            storage = await create_sqlite_storage(tmp_path)
+        manager = SessionManager(storage)
+        session = await manager.create_session("u1")
+
+        async with anyio.create_task_group() as tg:
+            for i in range(10):
+                tg.start_soon(manager.add_message, session.session_id, "user", f"消息{i}")
+        _, reply = await manager.record_turn(
+            session.session_id, "问题", "回答",
+            {"prompt_tokens": 12, "completion_tokens": 30, "total_tokens": 42}
+        )
+        assert reply.token_count == 30
+
+        stored = await SessionManager(storage).get_session(session.session_id)
+        assert (stored.message_count, stored.total_tokens) == (12, 42)
+        assert stored.last_message_at == reply.timestamp
+        cached = await manager.get_session(session.session_id)
+        assert cached.to_dict() == stored.to_dict()
+        assert len(await manager.get_session_messages(session.session_id)) == 12
+        await storage.close()
+
+    @pytest.mark.parametrize("backend", ["file", "sqlite"])
+    async def test_turn_completes_saved_user_message(self, tmp_path, backend):
+        """用户消息先保存不计数，record_turn 只写入助手回复并一次计入整轮"""
+        if backend == "file":
+            storage = await create_storage(tmp_path)
+        else:
+            storage = await create_sqlite_storage(tmp_path)
+        manager = SessionManager(storage)
+        session = await manager.create_session("u1")
+        question = await manager.add_message(session.session_id, "user", "问题", count=False)
+        assert (await storage.retrieve_data("sessions", session.session_id))["message_count"] == 0
+
+        increments = []
+        increment = storage.increment_data
+
+        async def record_increment(*args, **kwargs):
+            increments.append(args[:2])
+            return await increment(*args, **kwargs)
+        storage.increment_data = record_increment
+
+        user, reply = await manager.record_turn(
+            session.session_id, question, "回答",
+            {"prompt_tokens": 12, "completion_tokens": 30, "total_tokens": 42}
+        )
+
+        assert user is question
+        assert reply.token_count == 30
+        assert len(increments) == (1 if backend == "file" else 0)
+        stored = await SessionManager(storage).get_session(session.session_id)
+        assert (stored.message_count, stored.total_tokens) == (2, 42)
+        messages = await manager.get_session_messages(session.session_id)
+        assert [m.content for m in messages] == ["问题", "回答"]
+        assert messages[1].token_count == 30
+        await storage.close()
+
+    async def test_saved_messages_counted_later(self, tmp_path):
+        """未计数保存的消息可以在之后单独计入会话"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage)
+        session = await manager.create_session("u1")
+        question = await manager.add_message(session.session_id, "user", "问题", count=False)
+
+        await manager.count_messages(session.session_id, [question])
+
+        stored = await SessionManager(storage).get_session(session.session_id)
+        assert stored.message_count == 1
+        assert stored.last_message_at == question.timestamp
+        assert (await manager.get_session(session.session_id)).message_count == 1
+        await storage.close()
+
+    async def test_sqlite_turn_is_one_transaction(self, tmp_path):
+        """SQLite 上消息写入与会话计数在同一个写事务中完成"""
+        storage = await create_sqlite_storage(tmp_path)
+        manager = SessionManager(storage)
+        session = await manager.create_session("u1")
+        question = await manager.add_message(session.session_id, "user", "问题", count=False)
+
+        transactions = []
+        run_write = storage._run_write
+
+        async def record_write(fn):
+            transactions.append(fn)
+            return await run_write(fn)
+        storage._run_write = record_write
+
+        await manager.record_turn(session.session_id, question, "回答", {"total_tokens": 5})
+        assert len(transactions) == 1
+        stored = await storage.retrieve_data("sessions", session.session_id)
+        assert (stored["message_count"], stored["total_tokens"]) == (2, 5)
+        await storage.close()
+
+    async def test_turn_is_one_write_per_collection(self, tmp_path):
+        """一轮对话只提交一次消息集合和一次会话集合"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage)
+        session = await manager.create_session("u1")
+        await manager.get_recent_messages(session.session_id)
+
+        commits = []
+        commit = storage._commit
+
+        async def record_commit(collection, version):
+            commits.append(collection)
+            await commit(collection, version)
+        storage._commit = record_commit
+
+        user, reply = await manager.record_turn(session.session_id, "问题", "回答")
+        assert commits == ["messages", "sessions"]
+        recent = await manager.get_recent_messages(session.session_id)
+        assert recent == [user, reply]
+        assert (await manager.get_session(session.session_id)).message_count == 2
+        assert await storage.increment_data("sessions", "missing", {"message_count": 1}) is None
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestSessionMessageDeletion:
+    """会话消息清空与级联删除测试"""
+
+    async def test_clear_and_delete_remove_only_session_messages(self, tmp_path):
+        """清空与删除会话一次批量删除该会话的消息，不影响其他会话"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage)
+        first = await manager.create_session("u1")
+        second = await manager.create_session("u1")
+        await manager.record_turn(first.session_id, "问题", "回答", {"total_tokens": 10})
+        await manager.add_message(first.session_id, "user", "追问")
+        await manager.record_turn(second.session_id, "问题", "回答")
+
+        deleted = []
+        delete_many = storage.delete_many
+
+        async def record_delete(collection, keys):
+            deleted.append((collection, len(keys)))
+            return await delete_many(collection, keys)
+        storage.delete_many = record_delete
+
+        assert await manager.clear_session_messages(first.session_id)
+        assert deleted == [("messages", 3)]
+        assert await manager.get_recent_messages(first.session_id) == []
+        cleared = await SessionManager(storage).get_session(first.session_id)
+        assert (cleared.message_count, cleared.total_tokens, cleared.last_message_at) == (0, 0, None)
+        assert len(await manager.get_session_messages(second.session_id)) == 2
+
+        assert await manager.delete_session(second.session_id)
+        assert deleted[-1] == ("messages", 2)
+        assert await manager.get_session(second.session_id) is None
+        assert await storage.query_data("messages") == []
+        await storage.close()
+
+    async def test_compaction_sweeps_orphaned_messages(self, tmp_path):
+        """压缩删除会话记录已不存在的孤立消息"""
+        storage = await create_storage(tmp_path, journal_enabled=True)
+        manager = SessionManager(storage)
+        kept = await manager.create_session("u1")
+        orphaned = await manager.create_session("u1")
+        await manager.record_turn(kept.session_id, "问题", "回答")
+        await manager.record_turn(orphaned.session_id, "问题", "回答")
+        # 模拟旧版本只删除会话记录
+        await storage.delete_data("sessions", orphaned.session_id)
+
+        result = await manager.compact_storage()
+        assert (result["orphaned_sessions"], result["messages"]) == (1, 2)
+        await storage.close()
+
+        storage = await create_storage(tmp_path, journal_enabled=True)
+        messages = await storage.query_data("messages")
+        assert {m["session_id"] for m in messages} == {kept.session_id}
+        assert (await SessionManager(storage).compact_storage())["orphaned_sessions"] == 0
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestSessionPagination:
+    """会话与消息游标分页测试"""
+
+    async def test_session_pages_follow_cursor(self, tmp_path):
+        """会话与消息按游标翻页不重复不遗漏，翻页期间的新会话不影响后续页"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage)
+        created = []
+        for i in range(5):
+            created.append(await manager.create_session("u1", f"会话{i}"))
+            await anyio.sleep(0.001)  # 保证创建时间有序
+        await manager.create_session("u2")
+
+        first, cursor = await manager.get_user_sessions_page("u1", 2)
+        await manager.create_session("u1", "翻页期间新建")
+        titles = [s.title for s in first]
+        while cursor:
+            page, cursor = await manager.get_user_sessions_page("u1", 2, cursor)
+            titles.extend(s.title for s in page)
+        assert titles == [f"会话{i}" for i in reversed(range(5))]
+
+        session_id = created[0].session_id
+        for i in range(3):
+            await manager.record_turn(session_id, f"问题{i}", f"回答{i}")
+        messages, cursor = await manager.get_session_messages_page(session_id, 4)
+        rest, last = await manager.get_session_messages_page(session_id, 4, cursor)
+        assert [m.content for m in messages + rest] == [
+            m.content for m in await manager.get_session_messages(session_id)
+        ]
+        assert len(rest) == 2 and last is None
+        with pytest.raises(ValidationError):
+            await manager.get_user_sessions_page("u1", 0)
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestSessionRetention:
+    """会话保留策略与定期压缩测试"""
+
+    async def test_session_retention(self, tmp_path):
+        """按会话状态的保留时长删除会话及其消息，并删除已标记删除的消息"""
+        storage = await create_storage(tmp_path, partitions={"messages": "session_id"})
+        manager = SessionManager(storage, retention={
+            SessionStatus.DELETED: timedelta(0),
+            SessionStatus.ARCHIVED: timedelta(days=30),
+        })
+        sessions = {}
+        for status, age in (("active", 100), ("deleted", 0), ("archived", 40), ("archived", 10)):
+            session = await manager.create_session("u1")
+            updated_at = (datetime.now() - timedelta(days=age, seconds=1)).isoformat()
+            await storage.update_data(
+                "sessions", session.session_id, {"status": status, "updated_at": updated_at}
+            )
+            await manager.add_message(session.session_id, "user", "你好")
+            sessions[(status, age)] = session.session_id
+        tombstone = await manager.add_message(sessions[("active", 100)], "user", "已删除")
+        await storage.update_data("messages", tombstone.message_id, {"is_deleted": True})
+
+        result = await manager.compact_storage()
+        assert (result["sessions"], result["messages"]) == (2, 3)
+        remaining = {s.session_id for s in await manager.get_user_sessions("u1")}
+        assert remaining == {sessions[("active", 100)], sessions[("archived", 10)]}
+        assert len(await manager.get_session_messages(sessions[("active", 100)])) == 1
+        assert await manager.get_session_messages(sessions[("deleted", 0)]) == []
+        await storage.close()
+
+    async def test_compaction_runs_when_interval_elapsed(self, tmp_path):
+        """压缩只在距上一次压缩超过间隔后由新建会话触发，间隔跨实例保持"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage, compaction_interval=3600)
+        first = await manager.create_session("u1")
+        await manager.close()
+        await manager.patch_session(first.session_id, {"status": "deleted"})
+        assert await manager.compact_if_due() is None
+
+        # 新的实例（如下一次启动）在间隔内不压缩
+        manager = SessionManager(storage, compaction_interval=3600)
+        await manager.create_session("u1")
+        await manager.close()
+        assert await manager.get_session(first.session_id) is not None
+
+        result = await manager.compact_if_due(datetime.now() + timedelta(hours=2))
+        assert result is not None and result["sessions"] == 1
+        assert await manager.get_session(first.session_id) is None
+        assert await manager.compact_if_due(datetime.now() + timedelta(hours=2)) is None
+        await storage.close()
+
+    @pytest.mark.parametrize("anyio_backend", ["asyncio"])
+    async def test_compaction_runs_in_background(self, tmp_path):
+        """到期的压缩在后台运行，新建会话不等待它，同一时间只有一个压缩任务"""
+        storage = await create_storage(tmp_path)
+        manager = SessionManager(storage, compaction_interval=3600)
+        collection, key = SessionManager.COMPACTION_RECORD
+        last_run = datetime.now() - timedelta(hours=2)
+        await storage.store_data(collection, {"last_run": last_run.isoformat()}, key)
+
+        started, release = anyio.Event(), anyio.Event()
+        runs = []
+        compact_storage = manager.compact_storage
+
+        async def blocked_compaction(now=None):
+            runs.append(now)
+            started.set()
+            await release.wait()
+            return await compact_storage(now)
+        manager.compact_storage = blocked_compaction
+
+        with anyio.fail_after(1):
+            await manager.create_session("u1")
+            await started.wait()
+            await manager.create_session("u1")
+        release.set()
+        await manager.close()
+
+        assert len(runs) == 1
+        record = await storage.retrieve_data(collection, key)
+        assert datetime.fromisoformat(record["last_run"]) > last_run
+        await storage.close()
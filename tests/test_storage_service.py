@@ -0,0 +1,1324 @@
+"""
+文件存储服务测试
+覆盖日志模式、索引与查询等存储层行为
+"""
+
+import asyncio
+import fcntl
+import os
+import time
+import anyio
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from contracts.storage_service import (
+    StorageConfig, StorageBackend, QueryOptions, QueryFilter
+)
+from services.storage_service import FileStorageService
+from services.sqlite_storage_service import SqliteStorageService
+from services.memory_storage_service import MemoryStorageService
+from services.storage_format import RecordFileFormat, convert_directory
+from services.storage_backup import list_backups, read_backup_manifest
+from services.storage_sync import SYNC_DIR, GENERATION_SUFFIX
+from services.service_container import ServiceContainer, ServiceConfig
+from config.settings import DEFAULT_CONFIG
+from core.errors import BusinessError, ValidationError
+
+
+@pytest.fixture(params=["asyncio", "trio"])
+def anyio_backend(request):
+    """存储服务通过anyio同时支持asyncio与trio"""
+    return request.param
+
+
+async def create_storage(data_dir, **kwargs) -> FileStorageService:
+    """创建并初始化文件存储服务"""
+    storage = FileStorageService()
+    config = StorageConfig(
+        backend=StorageBackend.FILE,
+        connection_string=str(data_dir),
+        **kwargs
+    )
+    assert await storage.initialize(config)
+    return storage
+
+
+@pytest.mark.anyio
+class TestJournal:
+    """日志模式测试"""
+
+    async def test_writes_append_to_journal(self, tmp_path):
+        """日志模式下写入只追加日志，不生成集合文件"""
+        storage = await create_storage(tmp_path, journal_enabled=True)
+
+        await storage.store_data("messages", {"content": "你好"}, "m1")
+        await storage.update_data("messages", "m1", {"content": "再见"})
+
+        assert (tmp_path / "messages.wal").exists()
+        assert not (tmp_path / "messages.json").exists()
+        await storage.close()
+
+    async def test_replay_after_unclean_shutdown(self, tmp_path):
+        """未正常关闭时重新初始化可以从日志恢复全部写入"""
+        storage = await create_storage(tmp_path, journal_enabled=True)
+        for i in range(5):
+            await storage.store_data("messages", {"index": i}, f"m{i}")
+        await storage.delete_data("messages", "m0")
+        await storage.update_data("messages", "m1", {"edited": True})
+
+        reopened = await create_storage(tmp_path, journal_enabled=True)
+        assert (await reopened.get_collection_stats("messages"))["count"] == 4
+        assert await reopened.retrieve_data("messages", "m0") is None
+        assert await reopened.retrieve_data("messages", "m1") == {"index": 1, "edited": True}
+
+        await reopened.close()
+        await storage.close()
+
+    async def test_checkpoint_folds_journal(self, tmp_path):
+        """日志达到阈值后后台检查点将其合并回集合文件"""
+        storage = await create_storage(
+            tmp_path, journal_enabled=True, checkpoint_threshold=3
+        )
+        for i in range(3):
+            await storage.store_data("sessions", {"index": i}, f"s{i}")
+        await storage._wait_checkpoints()
+
+        assert (tmp_path / "sessions.json").exists()
+        assert storage.journals["sessions"].record_count == 0
+        await storage.close()
+
+        plain = await create_storage(tmp_path)
+        assert (await plain.get_collection_stats("sessions"))["count"] == 3
+        await plain.close()
+
+    async def test_disabling_journal_merges_leftover_log(self, tmp_path):
+        """关闭日志模式后启动时合并遗留日志"""
+        storage = await create_storage(tmp_path, journal_enabled=True)
+        await storage.store_data("messages", {"content": "遗留"}, "m1")
+        await storage.close()
+
+        plain = await create_storage(tmp_path)
+        assert not (tmp_path / "messages.wal").exists()
+        assert await plain.retrieve_data("messages", "m1") == {"content": "遗留"}
+        await plain.close()
+
+    async def test_journal_enabled_from_database_config(self, tmp_path):
+        """database 配置开启日志模式，分区集合不经过日志"""
+        database = {**DEFAULT_CONFIG["database"], "journal_enabled": True, "checkpoint_threshold": 5}
+        container = ServiceContainer(ServiceConfig(storage_path=str(tmp_path), database=database))
+        assert await container.initialize()
+        storage = container.get_storage_service()
+        assert (storage.config.journal_enabled, storage.config.checkpoint_threshold) == (True, 5)
+
+        await storage.store_data("sessions", {"title": "会话"}, "s1")
+        await storage.store_data("messages", {"session_id": "s1", "content": "你好"}, "m1")
+
+        assert (tmp_path / "sessions.wal").exists()
+        assert not (tmp_path / "messages.wal").exists()
+        await container.shutdown()
+
+
+@pytest.mark.anyio
+class TestIndexes:
+    """二级索引测试"""
+
+    async def test_index_maintained_on_writes(self, tmp_path):
+        """索引在写入、更新、删除后保持一致"""
+        storage = await create_storage(tmp_path)
+        assert await storage.create_index("messages", "session_id")
+
+        await storage.store_data("messages", {"session_id": "a"}, "m1")
+        await storage.store_data("messages", {"session_id": "b"}, "m2")
+        await storage.update_data("messages", "m2", {"session_id": "a"})
+        await storage.delete_data("messages", "m1")
+
+        index = storage.indexes["messages"].get("session_id")
+        assert list(index.lookup("a")) == ["m2"]
+        assert list(index.lookup("b")) == []
+        await storage.close()
+
+    async def test_query_uses_index(self, tmp_path):
+        """等值查询通过索引返回与全量扫描相同的结果"""
+        storage = await create_storage(tmp_path)
+        for i in range(10):
+            await storage.store_data(
+                "messages", {"session_id": f"s{i % 3}", "seq": i}, f"m{i}"
+            )
+        options = QueryOptions(
+            filters=[QueryFilter(field="session_id", operator="eq", value="s1")],
+            sort_by="seq"
+        )
+        scanned = await storage.query_data("messages", options)
+
+        await storage.create_index("messages", "session_id")
+        indexed = await storage.query_data("messages", options)
+
+        assert indexed == scanned
+        assert [item["seq"] for item in indexed] == [1, 4, 7]
+        await storage.close()
+
+    async def test_index_definitions_survive_restart(self, tmp_path):
+        """索引定义持久化，重启后按定义重建"""
+        storage = await create_storage(tmp_path)
+        await storage.create_index("sessions", "user_id")
+        await storage.store_data("sessions", {"user_id": "u1"}, "s1")
+        await storage.close()
+
+        reopened = await create_storage(tmp_path)
+        index = reopened.indexes["sessions"].get("user_id")
+        assert list(index.lookup("u1")) == ["s1"]
+        await reopened.close()
+
+    async def test_unique_index_rejects_duplicates(self, tmp_path):
+        """唯一索引拒绝重复值"""
+        storage = await create_storage(tmp_path)
+        await storage.create_index("users", "email", unique=True)
+        await storage.store_data("users", {"email": "a@example.com"}, "u1")
+
+        with pytest.raises(BusinessError):
+            await storage.store_data("users", {"email": "a@example.com"}, "u2")
+        assert await storage.retrieve_data("users", "u2") is None
+        await storage.close()
+
+    async def test_ordered_index_serves_sorted_limit(self, tmp_path):
+        """复合有序索引按排序字段返回分页结果，与全量排序一致"""
+        storage = await create_storage(tmp_path)
+        for i in range(30):
+            await storage.store_data(
+                "sessions",
+                {"user_id": f"u{i % 2}", "created_at": f"2025-01-{i + 1:02d}"},
+                f"s{i}"
+            )
+        options = QueryOptions(
+            filters=[QueryFilter(field="user_id", operator="eq", value="u1")],
+            sort_by="created_at",
+            sort_order="desc",
+            limit=5,
+            offset=2
+        )
+        expected = await storage.query_data("sessions", options)
+
+        assert await storage.create_index("sessions", ["user_id", "created_at"])
+        indexed = await storage.query_data("sessions", options)
+
+        assert indexed == expected
+        assert [item["created_at"] for item in indexed] == [
+            "2025-01-26", "2025-01-24", "2025-01-22", "2025-01-20", "2025-01-18"
+        ]
+        await storage.close()
+
+    async def test_top_k_handles_mixed_types(self, tmp_path):
+        """无索引时有界堆排序可以处理混合类型与缺失字段"""
+        storage = await create_storage(tmp_path)
+        for key, value in [("a", 3), ("b", "x"), ("c", None), ("d", 1)]:
+            await storage.store_data("items", {"rank": value}, key)
+        await storage.store_data("items", {}, "e")
+
+        options = QueryOptions(filters=[], sort_by="rank", limit=3)
+        results = await storage.query_data("items", options)
+
+        assert [item.get("rank") for item in results] == [None, None, 1]
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestQueryPlanner:
+    """查询规划器测试"""
+
+    async def _seed(self, tmp_path) -> FileStorageService:
+        storage = await create_storage(tmp_path)
+        for i in range(20):
+            await storage.store_data(
+                "messages",
+                {
+                    "session_id": f"s{i % 4}",
+                    "seq": i,
+                    "role": "user" if i % 2 == 0 else "assistant",
+                    "content": f"消息 Hello {i}",
+                },
+                f"m{i}"
+            )
+        return storage
+
+    async def test_all_operators(self, tmp_path):
+        """支持全部过滤操作符"""
+        storage = await self._seed(tmp_path)
+
+        async def seqs(*filters):
+            options = QueryOptions(filters=list(filters), sort_by="seq")
+            return [item["seq"] for item in await storage.query_data("messages", options)]
+
+        assert await seqs(QueryFilter("seq", "gt", 17)) == [18, 19]
+        assert await seqs(QueryFilter("seq", "ge", 18)) == [18, 19]
+        assert await seqs(QueryFilter("seq", "lt", 2)) == [0, 1]
+        assert await seqs(QueryFilter("seq", "le", 1)) == [0, 1]
+        assert await seqs(QueryFilter("seq", "in", [3, 5, 99])) == [3, 5]
+        assert await seqs(
+            QueryFilter("session_id", "eq", "s1"), QueryFilter("role", "ne", "user")
+        ) == [1, 5, 9, 13, 17]
+        assert await seqs(QueryFilter("content", "like", "%hello 1_")) == list(range(10, 20))
+        await storage.close()
+
+    async def test_unsupported_operator_is_rejected(self, tmp_path):
+        """不支持的操作符直接报错而不是被忽略"""
+        storage = await self._seed(tmp_path)
+        with pytest.raises(ValidationError):
+            await storage.query_data(
+                "messages", QueryOptions(filters=[QueryFilter("seq", "between", 1)])
+            )
+        await storage.close()
+
+    async def test_index_paths_match_full_scan(self, tmp_path):
+        """索引访问路径与全量扫描结果一致"""
+        storage = await self._seed(tmp_path)
+        queries = [
+            QueryOptions(
+                filters=[QueryFilter("session_id", "eq", "s2"), QueryFilter("seq", "ge", 6)],
+                sort_by="seq", sort_order="desc"
+            ),
+            QueryOptions(filters=[QueryFilter("session_id", "in", ["s0", "s3"])], sort_by="seq"),
+            QueryOptions(filters=[QueryFilter("seq", "lt", 7)], sort_by="seq", limit=3, offset=1),
+        ]
+        expected = [await storage.query_data("messages", q) for q in queries]
+
+        await storage.create_index("messages", ["session_id", "seq"])
+        await storage.create_index("messages", "seq", ordered=True)
+        actual = [await storage.query_data("messages", q) for q in queries]
+
+        assert actual == expected
+        await storage.close()
+
+    async def test_unsorted_index_results_keep_insertion_order(self, tmp_path):
+        """未指定排序时，经索引查询的结果与全量扫描一样按插入顺序返回"""
+        storage = await self._seed(tmp_path)
+        queries = [
+            QueryOptions(filters=[QueryFilter("role", "ge", "b")]),
+            QueryOptions(filters=[QueryFilter("role", "in", ["user"])], limit=3, offset=2),
+        ]
+        expected = [await storage.query_data("messages", q) for q in queries]
+        assert [item["seq"] for item in expected[0]] == list(range(0, 20, 2))
+
+        await storage.create_index("messages", "role", ordered=True)
+        assert [await storage.query_data("messages", q) for q in queries] == expected
+        plan = await storage.explain("messages", queries[0])
+        assert plan["access"] != "full_scan" and plan["sort"] == "insertion"
+        assert plan["rows_scanned"] == 10
+
+        # 删除后重新写入的记录排在最后，与集合中键的顺序一致
+        first = await storage.retrieve_data("messages", "m0")
+        await storage.delete_data("messages", "m0")
+        await storage.store_data("messages", first, "m0")
+        results = await storage.query_data("messages", queries[0])
+        assert [item["seq"] for item in results] == list(range(2, 20, 2)) + [0]
+        await storage.close()
+
+    async def test_explain_reports_plan_and_rows_scanned(self, tmp_path):
+        """explain报告使用的索引与实际扫描行数"""
+        storage = await self._seed(tmp_path)
+        options = QueryOptions(
+            filters=[QueryFilter("session_id", "eq", "s1")],
+            sort_by="seq", sort_order="desc", limit=2
+        )
+
+        full = await storage.explain("messages", options)
+        assert full["access"] == "full_scan"
+        assert full["rows_scanned"] == 20
+        assert full["sort"] == "heap"
+
+        await storage.create_index("messages", ["session_id", "seq"])
+        indexed = await storage.explain("messages", options)
+        assert indexed["access"] == "ordered_range"
+        assert indexed["index"] == "ordered(session_id, seq)"
+        assert indexed["rows_scanned"] == 2
+        assert indexed["rows_returned"] == 2
+        assert indexed["sort"] == "index"
+        await storage.close()
+
+
+    async def test_projection_and_read_only_views(self, tmp_path):
+        """字段投影只返回指定字段，只读视图直接引用存储中的记录"""
+        storage = await self._seed(tmp_path)
+        options = QueryOptions(
+            filters=[QueryFilter("session_id", "eq", "s1")], sort_by="seq", fields=["seq", "role"]
+        )
+        assert await storage.query_data("messages", options) == [
+            {"seq": seq, "role": "assistant"} for seq in (1, 5, 9, 13, 17)
+        ]
+
+        options.read_only = True
+        views = await storage.query_data("messages", options)
+        assert views == [{"seq": seq, "role": "assistant"} for seq in (1, 5, 9, 13, 17)]
+        with pytest.raises(TypeError):
+            views[0]["seq"] = 0
+
+        view = await storage.retrieve_data("messages", "m1", read_only=True)
+        assert "_id" not in view and view["content"] == "消息 Hello 1"
+        await storage.update_data("messages", "m1", {"content": "已修改"})
+        assert view["content"] == "消息 Hello 1"
+        assert await storage.retrieve_data("messages", "m1", fields=["content"]) == {
+            "content": "已修改"
+        }
+        await storage.close()
+
+
+    async def test_iter_query_batches_and_continuation(self, tmp_path):
+        """流式查询按批返回，续读令牌从中断处继续，顺序与query_data一致"""
+        storage = await self._seed(tmp_path)
+        await storage.store_data("messages", {"session_id": "s9", "content": "无序号"}, "m-none")
+        options = QueryOptions(filters=[QueryFilter("seq", "ne", 3)], sort_by="role",
+                               sort_order="desc", fields=["seq"])
+        expected = [item.get("seq") for item in await storage.query_data("messages", options)]
+
+        batches = [batch async for batch in storage.iter_query("messages", options, batch_size=6)]
+        assert [len(b.records) for b in batches] == [6, 6, 6, 2]
+        assert [b.continuation is None for b in batches] == [False, False, False, True]
+        streamed = [item.get("seq") for b in batches for item in b.records]
+        assert sorted(streamed, key=str) == sorted(expected, key=str)
+
+        # 中途停止后用令牌续读，得到剩余的结果
+        async for batch in storage.iter_query("messages", options, batch_size=6):
+            token = batch.continuation
+            break
+        rest = [
+            item.get("seq")
+            async for batch in storage.iter_query("messages", options, 6, token)
+            for item in batch.records
+        ]
+        assert rest == streamed[6:]
+
+        with pytest.raises(ValidationError):
+            async for _ in storage.iter_query("messages", QueryOptions(filters=[]), 6, token):
+                pass
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestBulkOperations:
+    """批量操作测试"""
+
+    async def test_bulk_insert_persists_once(self, tmp_path, monkeypatch):
+        """批量插入在一次加锁内完成，并且只持久化一次"""
+        storage = await create_storage(tmp_path)
+        saves = []
+        original = storage._write_collection_file
+        monkeypatch.setattr(
+            storage, "_write_collection_file",
+            lambda collection, records: (saves.append(collection), original(collection, records))
+        )
+
+        with anyio.fail_after(5):
+            keys = await storage.bulk_insert("messages", [{"index": i} for i in range(50)])
+
+        assert len(keys) == 50
+        assert saves == ["messages"]
+        reopened = await create_storage(tmp_path)
+        assert (await reopened.get_collection_stats("messages"))["count"] == 50
+        await storage.close()
+
+    async def test_bulk_insert_rolls_back_on_unique_conflict(self, tmp_path):
+        """任一记录违反唯一索引时整批不生效"""
+        storage = await create_storage(tmp_path)
+        await storage.create_index("users", "email", unique=True)
+        await storage.store_data("users", {"email": "a@example.com"}, "u0")
+
+        with pytest.raises(BusinessError):
+            await storage.bulk_insert(
+                "users",
+                [{"email": "b@example.com"}, {"email": "a@example.com"}],
+                keys=["u1", "u2"]
+            )
+
+        assert (await storage.get_collection_stats("users"))["count"] == 1
+        await storage.store_data("users", {"email": "b@example.com"}, "u3")
+        await storage.close()
+
+    async def test_get_update_delete_many(self, tmp_path):
+        """多键读取、更新与删除，日志模式下每批只追加一次"""
+        storage = await create_storage(tmp_path, journal_enabled=True)
+        await storage.create_index("messages", "session_id")
+        await storage.bulk_insert(
+            "messages", [{"session_id": "s1", "n": i} for i in range(4)],
+            keys=[f"m{i}" for i in range(4)]
+        )
+
+        found = await storage.get_many("messages", ["m0", "m2", "missing"])
+        assert found == {"m0": {"session_id": "s1", "n": 0}, "m2": {"session_id": "s1", "n": 2}}
+
+        assert await storage.update_many(
+            "messages", {"m0": {"session_id": "s2"}, "missing": {"n": 9}}
+        ) == 1
+        assert await storage.delete_many("messages", ["m1", "m2", "missing"]) == 2
+
+        remaining = await storage.query_data(
+            "messages", QueryOptions(filters=[QueryFilter("session_id", "eq", "s1")])
+        )
+        assert [item["n"] for item in remaining] == [3]
+        assert storage.journals["messages"].record_count == 4 + 1 + 2
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestBackgroundIO:
+    """I/O线程池测试"""
+
+    async def test_writes_run_off_event_loop_and_coalesce(self, tmp_path, monkeypatch):
+        """集合文件在I/O线程中写入，并发写入合并为更少的写盘"""
+        import threading
+
+        storage = await create_storage(tmp_path)
+        threads = []
+        original = storage._write_collection_file
+
+        def record_thread(collection, records):
+            threads.append(threading.current_thread().name)
+            original(collection, records)
+
+        monkeypatch.setattr(storage, "_write_collection_file", record_thread)
+
+        async with anyio.create_task_group() as tg:
+            for i in range(20):
+                tg.start_soon(storage.store_data, "messages", {"index": i}, f"m{i}")
+
+        assert threads and all(name.startswith("storage-io") for name in threads)
+        assert len(threads) < 20
+        reopened = await create_storage(tmp_path)
+        assert (await reopened.get_collection_stats("messages"))["count"] == 20
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestConcurrency:
+    """集合级写锁与快照读测试"""
+
+    async def test_collections_are_locked_independently(self, tmp_path):
+        """一个集合的写锁被占用时，其他集合的写入不受影响"""
+        storage = await create_storage(tmp_path)
+
+        held, released = anyio.Event(), anyio.Event()
+
+        async def hold():
+            async with storage._collection_lock("messages"):
+                held.set()
+                await released.wait()
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(hold)
+            await held.wait()
+            with anyio.fail_after(1):
+                await storage.store_data("sessions", {"title": "新会话"}, "s1")
+            with pytest.raises(TimeoutError):
+                with anyio.fail_after(0.05):
+                    await storage.store_data("messages", {"content": "hi"})
+            released.set()
+
+        assert await storage.retrieve_data("sessions", "s1") == {"title": "新会话"}
+        await storage.close()
+
+    async def test_reads_never_see_partial_batches(self, tmp_path):
+        """并发查询只能看到整批变更之前或之后的状态，快照按修改代数复用"""
+        storage = await create_storage(tmp_path)
+        await storage.create_index("messages", "session_id")
+        counts = []
+
+        async def reader():
+            for _ in range(20):
+                results = await storage.query_data(
+                    "messages", QueryOptions(filters=[QueryFilter("session_id", "eq", "s1")])
+                )
+                counts.append(len(results))
+                await anyio.sleep(0)
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(reader)
+            tg.start_soon(storage.bulk_insert, "messages", [{"session_id": "s1"} for _ in range(500)])
+            tg.start_soon(reader)
+        assert set(counts) <= {0, 500}
+
+        snapshot = storage._snapshot("messages")
+        assert storage._snapshot("messages") is snapshot
+        await storage.store_data("messages", {"session_id": "s2"}, "late")
+        assert "late" in storage._snapshot("messages")
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestGroupCommit:
+    """deferred持久化模式测试"""
+
+    @pytest.mark.parametrize("anyio_backend", ["asyncio"])
+    async def test_writes_are_deferred_until_flush(self, tmp_path):
+        """写入只修改内存，flush后一次性落盘"""
+        storage = await create_storage(tmp_path, durability="deferred", flush_interval=60)
+        for i in range(3):
+            await storage.store_data("messages", {"index": i}, f"m{i}")
+
+        assert await storage.retrieve_data("messages", "m2") == {"index": 2}
+        assert not (tmp_path / "messages.json").exists()
+
+        assert await storage.flush()
+        reopened = await create_storage(tmp_path)
+        assert (await reopened.get_collection_stats("messages"))["count"] == 3
+        await storage.close()
+
+    @pytest.mark.parametrize("anyio_backend", ["asyncio"])
+    async def test_pending_threshold_wakes_flusher(self, tmp_path):
+        """累计变更数达到阈值时后台任务立即刷盘"""
+        storage = await create_storage(
+            tmp_path, durability="deferred", flush_interval=60, flush_max_pending=5,
+            journal_enabled=True
+        )
+        for i in range(5):
+            await storage.store_data("messages", {"index": i}, f"m{i}")
+
+        for _ in range(50):
+            if (tmp_path / "messages.wal").exists():
+                break
+            await anyio.sleep(0.01)
+        assert storage.journals["messages"].record_count == 5
+        await storage.close()
+
+    @pytest.mark.parametrize("anyio_backend", ["trio"])
+    async def test_writes_persist_without_asyncio(self, tmp_path):
+        """后台刷盘任务只在asyncio中运行，trio中的写入立即落盘"""
+        storage = await create_storage(tmp_path, durability="deferred", flush_interval=60)
+        await storage.store_data("messages", {"content": "你好"}, "m1")
+
+        assert storage._flush_task is None
+        assert (tmp_path / "messages.json").exists()
+        await storage.close()
+
+    async def test_close_flushes_pending_writes(self, tmp_path):
+        """关闭服务时写出剩余变更"""
+        storage = await create_storage(tmp_path, durability="deferred", flush_interval=60)
+        await storage.store_data("messages", {"content": "最后一条"}, "m1")
+        await storage.close()
+
+        reopened = await create_storage(tmp_path)
+        assert await reopened.retrieve_data("messages", "m1") == {"content": "最后一条"}
+
+    async def test_writes_persist_after_init_loop_ends(self, tmp_path, anyio_backend):
+        """初始化所在的事件循环结束后（如每次操作各自asyncio.run），写入立即落盘"""
+        storage = FileStorageService()
+        config = StorageConfig(
+            backend=StorageBackend.FILE, connection_string=str(tmp_path),
+            durability="deferred", flush_interval=60
+        )
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(anyio.run, storage.initialize, config, backend=anyio_backend).result()
+
+        await storage.store_data("sessions", {"title": "新会话"}, "s1")
+        await storage.store_data("messages", {"content": "你好"}, "m1")
+
+        reopened = await create_storage(tmp_path)
+        assert await reopened.retrieve_data("sessions", "s1") == {"title": "新会话"}
+        assert await reopened.retrieve_data("messages", "m1") == {"content": "你好"}
+        await reopened.close()
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestSqliteStorage:
+    """SQLite存储后端测试"""
+
+    async def _create(self, tmp_path) -> SqliteStorageService:
+        storage = SqliteStorageService()
+        config = StorageConfig(
+            backend=StorageBackend.SQLITE,
+            connection_string=str(tmp_path / "chatbot.db"),
+            max_connections=3
+        )
+        assert await storage.initialize(config)
+        return storage
+
+    async def test_crud_and_wal_mode(self, tmp_path):
+        """基本读写并以WAL模式运行"""
+        storage = await self._create(tmp_path)
+        await storage.store_data("sessions", {"user_id": "u1", "title": "标题"}, "s1")
+        assert await storage.update_data("sessions", "s1", {"title": "新标题"})
+        assert await storage.retrieve_data("sessions", "s1") == {
+            "user_id": "u1", "title": "新标题"
+        }
+        assert await storage.delete_data("sessions", "s1")
+        assert await storage.retrieve_data("sessions", "s1") is None
+        assert (tmp_path / "chatbot.db-wal").exists()
+        await storage.close()
+
+    async def test_query_uses_real_index(self, tmp_path):
+        """查询语义与文件存储一致，并使用表达式索引"""
+        storage = await self._create(tmp_path)
+        for i in range(10):
+            await storage.store_data(
+                "messages", {"session_id": f"s{i % 2}", "seq": i}, f"m{i}"
+            )
+        assert await storage.create_index("messages", ["session_id", "seq"])
+
+        options = QueryOptions(
+            filters=[QueryFilter("session_id", "eq", "s1"), QueryFilter("seq", "gt", 2)],
+            sort_by="seq", sort_order="desc", limit=2
+        )
+        results = await storage.query_data("messages", options)
+        assert [item["seq"] for item in results] == [9, 7]
+
+        plan = await storage.explain("messages", options)
+        assert plan["access"] == "index"
+        await storage.close()
+
+    async def test_batch_operations(self, tmp_path):
+        """批量操作在单个事务中完成"""
+        storage = await self._create(tmp_path)
+        keys = await storage.bulk_insert(
+            "messages", [{"n": i} for i in range(3)], keys=["m0", "m1", "m2"]
+        )
+        assert keys == ["m0", "m1", "m2"]
+
+        assert await storage.update_many("messages", {"m0": {"edited": True}, "missing": {}}) == 1
+        assert await storage.delete_many("messages", ["m1", "missing"]) == 1
+        assert await storage.get_many("messages", ["m0", "m1", "m2"]) == {
+            "m0": {"n": 0, "edited": True}, "m2": {"n": 2}
+        }
+        await storage.close()
+
+    async def test_backup_and_restore(self, tmp_path):
+        """在线备份与恢复"""
+        storage = await self._create(tmp_path)
+        await storage.store_data("sessions", {"title": "保留"}, "s1")
+        assert await storage.backup_data(str(tmp_path / "backup"))
+
+        await storage.delete_data("sessions", "s1")
+        assert await storage.restore_data(str(tmp_path / "backup"), ["sessions"])
+        assert await storage.retrieve_data("sessions", "s1") == {"title": "保留"}
+        await storage.close()
+
+
+    async def test_projection_in_sql(self, tmp_path):
+        """字段投影在SQLite中完成，布尔值与嵌套值保持原样"""
+        storage = await self._create(tmp_path)
+        await storage.store_data(
+            "sessions", {"title": "会话", "pinned": True, "tags": ["a"], "body": "x" * 100}, "s1"
+        )
+        options = QueryOptions(filters=[], fields=["title", "pinned", "tags", "missing"])
+        assert await storage.query_data("sessions", options) == [
+            {"title": "会话", "pinned": True, "tags": ["a"]}
+        ]
+        assert await storage.retrieve_data("sessions", "s1", fields=["pinned"]) == {"pinned": True}
+        await storage.close()
+
+
+    async def test_iter_query_keyset_order_matches_file_storage(self, tmp_path):
+        """键集续读在排序值相同与缺失时与文件存储顺序一致"""
+        sqlite = await self._create(tmp_path)
+        file_storage = await create_storage(tmp_path / "files")
+        for i in range(25):
+            data = {"group": i % 3 if i % 5 else None, "seq": i}
+            for storage in (sqlite, file_storage):
+                await storage.store_data("events", data, f"e{i:02d}")
+
+        for order in ("asc", "desc"):
+            options = QueryOptions(filters=[QueryFilter("seq", "ge", 2)], sort_by="group",
+                                   sort_order=order, offset=1)
+            orders = []
+            for storage in (sqlite, file_storage):
+                keys = []
+                token = None
+                while True:
+                    batches = [b async for b in storage.iter_query("events", options, 4, token)]
+                    keys.extend(item["seq"] for item in batches[0].records)
+                    token = batches[0].continuation
+                    if token is None:
+                        break
+                orders.append(keys)
+            assert orders[0] == orders[1] and len(orders[0]) == 22
+        await sqlite.close()
+        await file_storage.close()
+
+
+@pytest.mark.anyio
+class TestMemoryStorage:
+    """内存存储后端测试"""
+
+    async def _create(self, **kwargs) -> MemoryStorageService:
+        storage = MemoryStorageService()
+        config = StorageConfig(backend=StorageBackend.MEMORY, connection_string="", **kwargs)
+        assert await storage.initialize(config)
+        return storage
+
+    async def test_query_semantics_match_file_storage(self, tmp_path):
+        """索引与查询行为与文件存储一致，且不写任何文件"""
+        storage = await self._create()
+        await storage.create_index("messages", ["session_id", "seq"])
+        for i in range(10):
+            await storage.store_data("messages", {"session_id": f"s{i % 2}", "seq": i}, f"m{i}")
+
+        options = QueryOptions(
+            filters=[QueryFilter("session_id", "eq", "s1")],
+            sort_by="seq", sort_order="desc", limit=2
+        )
+        assert [item["seq"] for item in await storage.query_data("messages", options)] == [9, 7]
+        assert (await storage.explain("messages", options))["rows_scanned"] == 2
+        assert list(tmp_path.iterdir()) == []
+        await storage.close()
+
+    async def test_lru_eviction_keeps_indexes_consistent(self):
+        """超出记录上限时淘汰最久未使用的记录，并同步移出索引"""
+        storage = await self._create(max_records=3)
+        await storage.create_index("sessions", "user_id")
+        for i in range(3):
+            await storage.store_data("sessions", {"user_id": "u1"}, f"s{i}")
+
+        # 读取s0使其成为最近使用，写入s3时淘汰s1
+        assert await storage.retrieve_data("sessions", "s0") is not None
+        await storage.store_data("sessions", {"user_id": "u1"}, "s3")
+
+        assert await storage.retrieve_data("sessions", "s1") is None
+        results = await storage.query_data(
+            "sessions", QueryOptions(filters=[QueryFilter("user_id", "eq", "u1")])
+        )
+        assert len(results) == 3
+        assert storage.evicted_count == 1
+        await storage.close()
+
+    async def test_get_many_refreshes_recency(self):
+        """批量读取同样刷新记录的使用时间"""
+        storage = await self._create(max_records=3)
+        for i in range(3):
+            await storage.store_data("sessions", {"index": i}, f"s{i}")
+
+        assert set(await storage.get_many("sessions", ["s0", "missing"])) == {"s0"}
+        await storage.store_data("sessions", {"index": 3}, "s3")
+
+        assert await storage.retrieve_data("sessions", "s0") is not None
+        assert await storage.retrieve_data("sessions", "s1") is None
+        await storage.close()
+
+    async def test_backup_restore_roundtrip(self, tmp_path):
+        """内存快照按配置的文件格式备份为集合文件并恢复"""
+        storage = await self._create(file_format="jsonl", compression="zlib")
+        await storage.store_data("sessions", {"title": "保留"}, "s1")
+        assert await storage.backup_data(str(tmp_path))
+        assert [p.name for p in tmp_path.iterdir()] == ["sessions.jsonl.z"]
+
+        await storage.delete_data("sessions", "s1")
+        assert await storage.restore_data(str(tmp_path))
+        assert await storage.retrieve_data("sessions", "s1") == {"title": "保留"}
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestPartitions:
+    """分区集合测试"""
+
+    PARTITIONS = {"messages": "session_id"}
+
+    async def test_flat_collection_is_migrated(self, tmp_path):
+        """已有的单文件集合在首次打开时迁移为段文件"""
+        storage = await create_storage(tmp_path)
+        for i in range(6):
+            await storage.store_data("messages", {"session_id": f"s{i % 3}", "index": i}, f"m{i}")
+        await storage.close()
+
+        storage = await create_storage(tmp_path, partitions=self.PARTITIONS)
+        assert not (tmp_path / "messages.json").exists()
+        assert (tmp_path / "messages" / "manifest.json").exists()
+        assert len(list((tmp_path / "messages").glob("*.json"))) == 4
+        stats = await storage.get_collection_stats("messages")
+        assert (stats["count"], stats["partitions"], stats["loaded_partitions"]) == (6, 3, 3)
+        await storage.close()
+
+    async def test_query_loads_only_its_partition(self, tmp_path):
+        """按分区字段查询只加载对应的段"""
+        storage = await create_storage(tmp_path, partitions=self.PARTITIONS)
+        for i in range(9):
+            await storage.store_data("messages", {"session_id": f"s{i % 3}", "index": i}, f"m{i}")
+        await storage.close()
+
+        storage = await create_storage(tmp_path, partitions=self.PARTITIONS)
+        results = await storage.query_data("messages", QueryOptions(
+            filters=[QueryFilter("session_id", "eq", "s1")], sort_by="index"
+        ))
+        assert [r["index"] for r in results] == [1, 4, 7]
+        stats = await storage.get_collection_stats("messages")
+        assert stats["count"] == 9 and stats["loaded_partitions"] == 1
+
+        # 按键访问未加载的记录时依次加载其余的段直到找到
+        assert await storage.retrieve_data("messages", "m0") == {"session_id": "s0", "index": 0}
+        assert (await storage.get_collection_stats("messages"))["loaded_partitions"] > 1
+        await storage.close()
+
+    async def test_append_rewrites_only_its_segment(self, tmp_path):
+        """追加消息只重写所在的段与清单"""
+        storage = await create_storage(tmp_path, partitions=self.PARTITIONS)
+        await storage.store_data("messages", {"session_id": "s1"}, "m1")
+        await storage.store_data("messages", {"session_id": "s2"}, "m2")
+        segments = {p.name: p.stat().st_mtime_ns for p in (tmp_path / "messages").glob("*.json")}
+        await storage.close()
+
+        storage = await create_storage(tmp_path, partitions=self.PARTITIONS)
+        await anyio.sleep(0.01)
+        await storage.store_data("messages", {"session_id": "s1"}, "m3")
+        changed = {
+            p.name for p in (tmp_path / "messages").glob("*.json")
+            if p.stat().st_mtime_ns != segments.get(p.name)
+        }
+        assert len(changed) == 2 and "manifest.json" in changed
+        assert (await storage.get_collection_stats("messages"))["count"] == 3
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestLazyLoading:
+    """延迟加载与分区段缓存测试"""
+
+    async def test_untouched_collections_are_not_parsed(self, tmp_path):
+        """延迟加载模式下未访问的集合不被解析"""
+        storage = await create_storage(tmp_path)
+        await storage.store_data("sessions", {"title": "会话"}, "s1")
+        await storage.store_data("settings", {"theme": "dark"}, "t1")
+        await storage.close()
+
+        storage = await create_storage(tmp_path, lazy_loading=True)
+        assert storage.collections == {}
+        assert await storage.retrieve_data("sessions", "s1") == {"title": "会话"}
+        assert set(storage.collections) == {"sessions"}
+
+        assert await storage.backup_data(str(tmp_path / "backup"))
+        assert (tmp_path / "backup" / "settings.json").exists()
+        await storage.close()
+
+    async def test_segment_cache_stays_within_budget(self, tmp_path):
+        """超出字节预算时淘汰最久未使用的段，淘汰的段再次访问时重新加载"""
+        partitions = {"messages": "session_id"}
+        storage = await create_storage(tmp_path, partitions=partitions)
+        for i in range(20):
+            await storage.store_data(
+                "messages", {"session_id": f"s{i % 4}", "content": "x" * 200}, f"m{i}"
+            )
+        await storage.create_index("messages", "session_id")
+        await storage.close()
+
+        segment_size = max(p.stat().st_size for p in (tmp_path / "messages").glob("*.json"))
+        storage = await create_storage(
+            tmp_path, partitions=partitions, cache_budget_bytes=segment_size * 2
+        )
+        for session_id in ("s0", "s1", "s2", "s3", "s0"):
+            results = await storage.query_data("messages", QueryOptions(
+                filters=[QueryFilter("session_id", "eq", session_id)]
+            ))
+            assert len(results) == 5
+            stats = await storage.get_collection_stats("messages")
+            assert stats["cached_bytes"] <= segment_size * 2
+            assert stats["count"] == 20
+
+        assert stats["loaded_partitions"] == 2
+        assert len(storage.collections["messages"]) == 10
+        assert await storage.retrieve_data("messages", "m1") is not None
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestIncrementalBackup:
+    """增量备份测试"""
+
+    async def test_unchanged_files_are_shared_between_backups(self, tmp_path):
+        """未变化的段与集合与上一次备份共享硬链接，超出保留数量的旧备份被清理"""
+        storage = await create_storage(
+            tmp_path / "data", partitions={"messages": "session_id"}, journal_enabled=True,
+            backup_path=str(tmp_path / "backups"), backup_retention=2
+        )
+        await storage.store_data("sessions", {"title": "会话"}, "s1")
+        await storage.store_data("messages", {"session_id": "s1", "content": "a"}, "m1")
+        await storage.store_data("messages", {"session_id": "s2", "content": "b"}, "m2")
+        first = Path(await storage.create_backup())
+
+        await storage.store_data("messages", {"session_id": "s1", "content": "c"}, "m3")
+        second = Path(await storage.create_backup())
+        assert read_backup_manifest(second)["base"] == first.name
+
+        def inodes(backup):
+            return {
+                p.relative_to(backup).as_posix(): p.stat().st_ino
+                for p in backup.glob("**/*.json")
+            }
+        before, after = inodes(first), inodes(second)
+        assert before["sessions.json"] == after["sessions.json"]
+        unchanged = [name for name in after if before.get(name) == after[name]]
+        assert len(unchanged) == 2  # 会话集合与 s2 的段
+
+        await storage.create_backup()
+        assert list_backups(tmp_path / "backups")[0] == second
+        await storage.close()
+
+    async def test_restore_reloads_only_changed_collections(self, tmp_path):
+        """恢复只替换变化的文件，未变化的集合保持已加载的状态"""
+        storage = await create_storage(
+            tmp_path / "data", partitions={"messages": "session_id"},
+            backup_path=str(tmp_path / "backups")
+        )
+        await storage.store_data("sessions", {"title": "原标题"}, "s1")
+        await storage.store_data("messages", {"session_id": "s1"}, "m1")
+        backup = await storage.create_backup()
+
+        await storage.update_data("sessions", "s1", {"title": "新标题"})
+        partition = storage.partitions["messages"]
+        assert await storage.restore_data(backup)
+
+        assert await storage.retrieve_data("sessions", "s1") == {"title": "原标题"}
+        assert storage.partitions["messages"] is partition
+        assert await storage.retrieve_data("messages", "m1") == {"session_id": "s1"}
+        await storage.close()
+
+    async def test_scheduled_backup(self, tmp_path, anyio_backend):
+        """auto_backup 开启时，间隔到达后的第一次写入创建备份，不依赖初始化所在的事件循环"""
+        storage = FileStorageService()
+        config = StorageConfig(
+            backend=StorageBackend.FILE, connection_string=str(tmp_path),
+            auto_backup=True, backup_interval=60
+        )
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(anyio.run, storage.initialize, config, backend=anyio_backend).result()
+        await storage.store_data("sessions", {"title": "会话"}, "s1")
+        assert not list_backups(tmp_path / "backups")
+
+        storage._next_backup_at = time.time()  # 间隔已到
+        await storage.store_data("sessions", {"title": "会话"}, "s2")
+        await storage.store_data("sessions", {"title": "会话"}, "s3")
+        backups = list_backups(tmp_path / "backups")
+        assert len(backups) == 1 and (backups[-1] / "sessions.json").exists()
+        await storage.close()
+
+        # 重启后按最新备份的时间继续计时
+        reopened = await create_storage(tmp_path, auto_backup=True, backup_interval=60)
+        await reopened.store_data("sessions", {"title": "会话"}, "s4")
+        assert list_backups(tmp_path / "backups") == backups
+        await reopened.close()
+
+
+@pytest.mark.anyio
+class TestCompaction:
+    """墓碑压缩测试"""
+
+    async def test_compact_merges_journal_and_reports_reclaimed_bytes(self, tmp_path):
+        """压缩物理删除记录，日志合并回集合文件后回收空间"""
+        storage = await create_storage(tmp_path, journal_enabled=True)
+        await storage.bulk_insert(
+            "messages", [{"content": "x" * 100} for _ in range(10)], [f"m{i}" for i in range(10)]
+        )
+        result = await storage.compact("messages", [f"m{i}" for i in range(5)] + ["missing"])
+        assert result["records"] == 5 and result["bytes"] > 0
+        assert not (tmp_path / "messages.wal").stat().st_size
+        await storage.close()
+
+        storage = await create_storage(tmp_path)
+        assert (await storage.get_collection_stats("messages"))["count"] == 5
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestSharedAccess:
+    """多进程共享数据目录测试（两个服务实例模拟两个进程）"""
+
+    async def wait_for(self, condition, timeout=3.0):
+        """等待监听线程送达其他进程的写盘通知"""
+        for _ in range(int(timeout / 0.05)):
+            if await condition():
+                return True
+            await anyio.sleep(0.05)
+        return False
+
+    @pytest.mark.parametrize("options", [
+        {},
+        {"journal_enabled": True},
+        {"partitions": {"messages": "session_id"}},
+    ])
+    async def test_concurrent_writers_do_not_lose_updates(self, tmp_path, options):
+        """两个进程交替写同一集合，后写盘的一方合并而不是覆盖先写盘的一方"""
+        first = await create_storage(tmp_path, shared_access=True, **options)
+        second = await create_storage(tmp_path, shared_access=True, **options)
+        for i in range(5):
+            await first.store_data("messages", {"session_id": "s1", "n": i}, f"a{i}")
+            await second.store_data("messages", {"session_id": "s1", "n": i}, f"b{i}")
+        await second.delete_data("messages", "a0")
+        await first.close()
+        await second.close()
+
+        storage = await create_storage(tmp_path, **options)
+        results = await storage.query_data("messages", QueryOptions(filters=[]))
+        assert len(results) == 9
+        assert await storage.retrieve_data("messages", "a0") is None
+        await storage.close()
+
+    async def test_changes_are_picked_up_by_other_process(self, tmp_path):
+        """其他进程写盘后，下一次访问时只重新加载变化的集合"""
+        first = await create_storage(tmp_path, shared_access=True)
+        await first.store_data("settings", {"theme": "light"}, "t1")
+        second = await create_storage(tmp_path, shared_access=True)
+        await second.store_data("sessions", {"title": "会话"}, "s1")
+        sessions = second.collections["sessions"]
+
+        await first.update_data("settings", "t1", {"theme": "dark"})
+        await first.store_data("notes", {"text": "新集合"}, "n1")
+
+        async def updated():
+            record = await second.retrieve_data("settings", "t1")
+            return record["theme"] == "dark"
+        assert await self.wait_for(updated)
+        assert await second.retrieve_data("notes", "n1") == {"text": "新集合"}
+        assert second.collections["sessions"] is sessions
+        await first.close()
+        await second.close()
+
+    async def test_iter_query_picks_up_other_process(self, tmp_path):
+        """流式查询与普通查询一样，开始前合并其他进程的写入"""
+        first = await create_storage(tmp_path, shared_access=True)
+        second = await create_storage(tmp_path, shared_access=True)
+        await second.store_data("messages", {"n": 0}, "m0")
+
+        await first.store_data("messages", {"n": 1}, "m1")
+
+        async def streamed():
+            keys = []
+            async for batch in second.iter_query("messages", batch_size=1):
+                keys.extend(record["n"] for record in batch.records)
+            return sorted(keys) == [0, 1]
+        assert await self.wait_for(streamed)
+        await first.close()
+        await second.close()
+
+    async def test_changes_are_picked_up_after_init_loop_ends(self, tmp_path, anyio_backend):
+        """初始化所在的事件循环结束后（如每次操作各自asyncio.run）仍能合并其他进程的写入"""
+        first = await create_storage(tmp_path, shared_access=True)
+        await first.store_data("settings", {"theme": "light"}, "t1")
+        second = FileStorageService()
+        config = StorageConfig(
+            backend=StorageBackend.FILE, connection_string=str(tmp_path), shared_access=True
+        )
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(anyio.run, second.initialize, config, backend=anyio_backend).result()
+        assert await second.retrieve_data("settings", "t1") == {"theme": "light"}
+
+        await first.update_data("settings", "t1", {"theme": "dark"})
+
+        async def updated():
+            record = await second.retrieve_data("settings", "t1")
+            return record["theme"] == "dark"
+        assert await self.wait_for(updated)
+        await first.close()
+        await second.close()
+
+    @pytest.mark.parametrize("anyio_backend", ["asyncio"])
+    async def test_lock_released_when_pending_tasks_are_cancelled(self, tmp_path):
+        """事件循环关闭前取消全部任务时，写盘完成的一方仍释放跨进程锁"""
+        storage = await create_storage(tmp_path, shared_access=True)
+        await storage.store_data("sessions", {"title": "会话"}, "s1")
+        existing = asyncio.all_tasks()
+        loop = asyncio.get_running_loop()
+
+        def cancel_new_tasks():
+            for task in asyncio.all_tasks() - existing:
+                task.cancel()
+
+        async def write():
+            # 写盘结束后、释放锁之前，模拟测试运行器取消尚未完成的任务
+            loop.call_soon(cancel_new_tasks)
+
+        holder = asyncio.ensure_future(storage._exclusive("sessions", write))
+        await asyncio.gather(holder, return_exceptions=True)
+
+        def locked() -> bool:
+            fd = os.open(tmp_path / SYNC_DIR / f"sessions{GENERATION_SUFFIX}", os.O_RDWR)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return False
+            except BlockingIOError:
+                return True
+            finally:
+                os.close(fd)
+
+        async def released():
+            return not locked()
+        assert await self.wait_for(released)
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestFileFormat:
+    """文件格式测试"""
+
+    async def test_existing_json_is_rewritten_in_configured_format(self, tmp_path):
+        """已有的JSON集合可以读取，下一次写入时转换为配置的格式"""
+        storage = await create_storage(tmp_path)
+        await storage.store_data("sessions", {"title": "旧格式"}, "s1")
+        await storage.close()
+
+        storage = await create_storage(tmp_path, file_format="jsonl", compression="zlib")
+        assert await storage.retrieve_data("sessions", "s1") == {"title": "旧格式"}
+        await storage.store_data("sessions", {"title": "新格式"}, "s2")
+        await storage.close()
+
+        assert not (tmp_path / "sessions.json").exists()
+        assert (tmp_path / "sessions.jsonl.z").exists()
+        storage = await create_storage(tmp_path)
+        assert (await storage.get_collection_stats("sessions"))["count"] == 2
+        await storage.close()
+
+    async def test_convert_directory(self, tmp_path):
+        """转换工具同时转换单文件集合与分区段，数据保持不变"""
+        storage = await create_storage(tmp_path, partitions={"messages": "session_id"})
+        await storage.store_data("sessions", {"title": "会话"}, "s1")
+        for i in range(4):
+            await storage.store_data("messages", {"session_id": f"s{i % 2}"}, f"m{i}")
+        await storage.close()
+
+        assert convert_directory(tmp_path, RecordFileFormat("jsonl", "lzma")) == 3
+        assert [p.name for p in tmp_path.glob("**/*.json")] == ["manifest.json"]
+
+        storage = await create_storage(tmp_path, partitions={"messages": "session_id"})
+        assert await storage.retrieve_data("sessions", "s1") == {"title": "会话"}
+        assert (await storage.get_collection_stats("messages"))["count"] == 4
+        assert await storage.retrieve_data("messages", "m3") == {"session_id": "s1"}
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestAggregates:
+    """增量聚合视图测试"""
+
+    async def _write_messages(self, storage):
+        for i in range(12):
+            await storage.store_data(
+                "messages", {"session_id": f"s{i % 3}", "tokens": i, "role": "user"}, f"m{i}"
+            )
+        await storage.update_data("messages", "m0", {"tokens": 100})
+        await storage.update_data("messages", "m1", {"session_id": "s0"})
+        await storage.delete_many("messages", ["m3", "m11"])
+
+    @pytest.mark.parametrize("options", [
+        {},
+        {"partitions": {"messages": "session_id"}, "cache_budget_bytes": 1},
+    ])
+    async def test_incremental_views_match_rebuild(self, tmp_path, options):
+        """写入时增量维护的结果与重启后从全部记录重建的结果一致"""
+        storage = await create_storage(tmp_path, **options)
+        assert await storage.create_aggregate("messages", "by_session", "session_id", ["tokens"])
+        await self._write_messages(storage)
+
+        s0 = await storage.get_aggregate("messages", "by_session", ["s0"])
+        assert s0 == {"s0": {
+            "count": 4, "sum": {"tokens": 100 + 1 + 6 + 9},
+            "min": {"tokens": 1}, "max": {"tokens": 100},
+        }}
+        incremental = await storage.get_aggregate("messages", "by_session")
+        assert set(incremental) == {"s0", "s1", "s2"}
+        stats = await storage.get_collection_stats("messages")
+        assert stats["aggregates"]["by_session"]["groups"] == 3
+        await storage.close()
+
+        storage = await create_storage(tmp_path, **options)
+        assert await storage.get_aggregate("messages", "by_session") == incremental
+        await storage.close()
+
+    async def test_sqlite_matches_file_storage(self, tmp_path):
+        """SQLite后端按索引计算的结果与文件存储一致，视图定义在重启后保留"""
+        file_storage = await create_storage(tmp_path / "files")
+        sqlite = await TestSqliteStorage()._create(tmp_path)
+        for storage in (file_storage, sqlite):
+            assert await storage.create_aggregate("messages", "by_session", "session_id", ["tokens"])
+            await self._write_messages(storage)
+        expected = await file_storage.get_aggregate("messages", "by_session")
+        assert await sqlite.get_aggregate("messages", "by_session") == expected
+        await sqlite.close()
+        await file_storage.close()
+
+        sqlite = await TestSqliteStorage()._create(tmp_path)
+        assert await sqlite.get_aggregate("messages", "by_session", ["s1", "missing"]) == {
+            "s1": expected["s1"]
+        }
+        assert "messages" in sqlite._tables and "_aggregate_views" not in sqlite._tables
+        await sqlite.close()
+
+
+@pytest.mark.anyio
+class TestQueryCache:
+    """查询结果缓存测试"""
+
+    def _session_query(self, user_id, **kwargs):
+        return QueryOptions(
+            filters=[QueryFilter("user_id", "eq", user_id)], sort_by="created", **kwargs
+        )
+
+    async def test_writes_invalidate_only_matching_queries(self, tmp_path):
+        """写入只失效条件与新旧记录匹配的缓存项"""
+        storage = await create_storage(tmp_path, query_cache_size=8)
+        for i in range(4):
+            await storage.store_data("sessions", {"user_id": f"u{i % 2}", "created": i}, f"s{i}")
+
+        results = await storage.query_data("sessions", self._session_query("u0"))
+        assert [r["created"] for r in results] == [0, 2]
+        await storage.query_data("sessions", self._session_query("u1"))
+        assert await storage.query_data("sessions", self._session_query("u0", fields=["created"])) == [
+            {"created": 0}, {"created": 2}
+        ]
+        assert storage.query_cache.stats("sessions") == {"hits": 1, "misses": 2, "entries": 2}
+
+        # u1 的写入不影响 u0 的缓存项
+        await storage.store_data("sessions", {"user_id": "u1", "created": 9}, "s9")
+        await storage.query_data("sessions", self._session_query("u0"))
+        assert storage.query_cache.stats("sessions")["hits"] == 2
+        results = await storage.query_data("sessions", self._session_query("u1"))
+        assert [r["created"] for r in results] == [1, 3, 9]
+
+        # 记录移出条件时旧记录匹配，缓存项失效
+        await storage.update_data("sessions", "s0", {"user_id": "u1"})
+        results = await storage.query_data("sessions", self._session_query("u0"))
+        assert [r["created"] for r in results] == [2]
+        await storage.close()
+
+    async def test_lru_bound(self, tmp_path):
+        """超出条目上限时淘汰最久未使用的缓存项"""
+        storage = await create_storage(tmp_path, query_cache_size=2)
+        await storage.store_data("sessions", {"user_id": "u0", "created": 0}, "s0")
+        for user_id in ("u0", "u1", "u0", "u2", "u1"):
+            await storage.query_data("sessions", self._session_query(user_id))
+        assert storage.query_cache.stats("sessions") == {"hits": 1, "misses": 4, "entries": 2}
+        assert (await storage.get_collection_stats("sessions"))["query_cache"]["entries"] == 2
+        await storage.close()
+
+
+@pytest.mark.anyio
+class TestKeysetPagination:
+    """游标分页测试"""
+
+    async def test_index_seek_matches_sorted_keyset(self, tmp_path):
+        """有序索引上从游标直接遍历与全量排序的结果一致，包括排序值相同与缺失的记录"""
+        indexed = await create_storage(tmp_path / "indexed")
+        plain = await create_storage(tmp_path / "plain")
+        assert await indexed.create_index("events", ["kind", "seq"])
+        for i in range(30):
+            data = {"kind": "ab"[i % 2], "seq": i // 4 if i % 7 else None, "n": i}
+            for storage in (indexed, plain):
+                await storage.store_data("events", data, f"e{i:02d}")
+
+        seeks = []
+        index = indexed.indexes["events"].get_ordered(["kind", "seq"])
+        seek = index.seek
+        index.seek = lambda *args: seeks.append(args) or seek(*args)
+
+        for order in ("asc", "desc"):
+            options = QueryOptions(
+                filters=[QueryFilter("kind", "eq", "a"), QueryFilter("n", "ne", 8)],
+                sort_by="seq", sort_order=order, offset=2
+            )
+            pages = []
+            for storage in (indexed, plain):
+                keys, token = [], None
+                while True:
+                    batches = [b async for b in storage.iter_query("events", options, 4, token)]
+                    keys.extend(item["n"] for item in batches[0].records)
+                    token = batches[0].continuation
+                    if token is None:
+                        break
+                pages.append(keys)
+            assert pages[0] == pages[1] and len(pages[0]) == 12
+        assert len(seeks) == 6
+        await indexed.close()
+        await plain.close()
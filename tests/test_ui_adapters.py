@@ -0,0 +1,90 @@
+"""
+UI适配器测试
+覆盖一轮对话中消息的保存顺序
+"""
+
+import pytest
+
+from contracts.model_provider import ModelResponse
+from services.service_container import ServiceContainer, ServiceConfig
+from ui.adapters import UIAdapter
+from core.models import create_default_user
+
+
+class StubProvider:
+    """返回固定回复或抛出异常的模型提供者"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+
+    async def generate_response(self, messages, config):
+        if self.error:
+            raise self.error
+        return ModelResponse(
+            content="回答", usage_tokens=42, model="stub", finish_reason="stop",
+            metadata={"prompt_tokens": 12, "completion_tokens": 30}
+        )
+
+
+async def create_adapter(tmp_path, monkeypatch, provider: StubProvider) -> UIAdapter:
+    """创建使用临时数据目录与指定模型提供者的UI适配器"""
+    adapter = UIAdapter()
+    adapter.container = ServiceContainer(ServiceConfig(storage_path=str(tmp_path)))
+    assert await adapter.container.initialize()
+    registry = adapter.container.get_model_provider_registry()
+    monkeypatch.setattr(registry, "get_provider", lambda name=None: provider)
+
+    adapter.current_user = create_default_user()
+    session = await adapter.container.get_session_manager().create_session(
+        adapter.current_user.user_id, "默认会话"
+    )
+    adapter.current_session_id = session.session_id
+    adapter._initialized = True
+    return adapter
+
+
+@pytest.mark.anyio
+class TestChatbotResponse:
+    """对话响应与消息保存测试"""
+
+    async def test_turn_saves_both_messages_and_counters(self, tmp_path, monkeypatch):
+        """一轮对话保存用户消息与助手回复，会话计数包含本轮token用量"""
+        adapter = await create_adapter(tmp_path, monkeypatch, StubProvider())
+        session_manager = adapter.container.get_session_manager()
+
+        storage = adapter.container.get_storage_service()
+        commits = []
+        commit = storage._commit
+
+        async def record_commit(collection, version):
+            if collection != "maintenance":  # 新建会话触发的后台压缩检查
+                commits.append(collection)
+            await commit(collection, version)
+        storage._commit = record_commit
+
+        reply = await adapter.get_chatbot_response("你好", [])
+
+        # 用户消息、助手回复各写一次消息集合，会话计数只写一次
+        assert commits == ["messages", "messages", "sessions"]
+        messages = await session_manager.get_session_messages(adapter.current_session_id)
+        assert [m.content for m in messages] == ["你好", reply]
+        assert messages[1].token_count == 30
+        session = await session_manager.get_session(adapter.current_session_id)
+        assert (session.message_count, session.total_tokens) == (2, 42)
+        await adapter.close()
+
+    async def test_user_message_kept_when_provider_fails(self, tmp_path, monkeypatch):
+        """模型调用失败时用户消息已经保存，不会丢失"""
+        adapter = await create_adapter(
+            tmp_path, monkeypatch, StubProvider(RuntimeError("模型不可用"))
+        )
+        session_manager = adapter.container.get_session_manager()
+
+        with pytest.raises(RuntimeError):
+            await adapter.get_chatbot_response("你好", [])
+
+        messages = await session_manager.get_session_messages(adapter.current_session_id)
+        assert [(m.role.value, m.content) for m in messages] == [("user", "你好")]
+        session = await session_manager.get_session(adapter.current_session_id)
+        assert session.message_count == 1
+        await adapter.close()